@@ -0,0 +1,212 @@
+import json
+import threading
+from datetime import datetime
+
+from local_store import connect
+
+LEDGER_DB = "ledger.sqlite3"
+
+# حالات المقال في السجل وتسمياتها في ملفات Excel
+STATUS_LABELS = {
+    "generated": "تم التوليد",
+    "published": "تم النشر",
+    "failed": "فشل",
+}
+
+_COLUMNS = (
+    "keyword", "title", "word_count", "domain", "language", "status", "batch_id",
+    "created_at", "timings", "prompt_tokens", "completion_tokens", "file_paths", "wordpress",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    keyword TEXT NOT NULL,
+    title TEXT,
+    word_count INTEGER DEFAULT 0,
+    domain TEXT,
+    language TEXT,
+    status TEXT NOT NULL,
+    batch_id TEXT,
+    created_at TEXT NOT NULL,
+    timings TEXT,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    file_paths TEXT,
+    wordpress TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_articles_keyword ON articles(keyword);
+CREATE INDEX IF NOT EXISTS idx_articles_created_at ON articles(created_at);
+CREATE INDEX IF NOT EXISTS idx_articles_status_created ON articles(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_articles_batch ON articles(batch_id);
+"""
+
+
+def _db():
+    return connect(LEDGER_DB, _SCHEMA)
+
+
+def make_ledger_row(article, keyword, metadata=None, status="generated", **extra):
+    """تحويل المقال وبياناته الوصفية إلى صف في السجل."""
+    metadata = metadata or {}
+    usage = article.get("usage") or {}
+    row = {
+        "keyword": keyword,
+        "title": article.get("title", keyword),
+        "word_count": article.get("word_count", 0),
+        "domain": metadata.get("target_domain", ""),
+        "language": metadata.get("language", "العربية"),
+        "status": status,
+        "batch_id": None,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "timings": None,
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "file_paths": None,
+        "wordpress": None,
+    }
+    row.update(extra)
+    return row
+
+
+def record_articles(rows):
+    """إضافة عدة صفوف في معاملة واحدة (batched transaction). يعيد عدد الصفوف."""
+    values = []
+    for row in rows:
+        values.append(tuple(
+            json.dumps(row.get(c), ensure_ascii=False) if c in ("timings", "file_paths") and row.get(c) is not None
+            else row.get(c)
+            for c in _COLUMNS
+        ))
+    if not values:
+        return 0
+    db = _db()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.executemany(
+            f"INSERT INTO articles ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)})",
+            values,
+        )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+    return len(values)
+
+
+def record_article(article, keyword, metadata=None, status="generated", **extra):
+    """إضافة مقال واحد إلى السجل."""
+    return record_articles([make_ledger_row(article, keyword, metadata, status, **extra)])
+
+
+class LedgerBuffer:
+    """
+    تجميع صفوف السجل في الذاكرة وكتابتها دفعة واحدة كل batch_size صف،
+    لتقليل عدد المعاملات عند تشغيل الحملات الكبيرة. آمن للاستخدام من عدة threads.
+    """
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self._rows = []
+        self._lock = threading.Lock()
+
+    def add(self, row):
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) < self.batch_size:
+                return
+            rows, self._rows = self._rows, []
+        record_articles(rows)
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        record_articles(rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+
+def _where(keyword=None, status=None, since=None, until=None, domain=None, batch_id=None):
+    clauses, params = [], []
+    for column, value in (("keyword", keyword), ("status", status), ("domain", domain), ("batch_id", batch_id)):
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if since:
+        clauses.append("created_at >= ?")
+        params.append(since)
+    if until:
+        clauses.append("created_at < ?")
+        params.append(until)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def query_articles(keyword=None, status=None, since=None, until=None, domain=None, batch_id=None, limit=None):
+    """
+    استعلام السجل عبر الفهارس حسب الكلمة المفتاحية أو الحالة أو التاريخ (ISO).
+    الأحدث أولاً.
+    """
+    where, params = _where(keyword, status, since, until, domain, batch_id)
+    sql = f"SELECT * FROM articles{where} ORDER BY created_at DESC, id DESC"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    rows = []
+    for row in _db().execute(sql, params):
+        row = dict(row)
+        for column in ("timings", "file_paths"):
+            if row[column]:
+                row[column] = json.loads(row[column])
+        rows.append(row)
+    return rows
+
+
+def ledger_summary(since=None, until=None):
+    """ملخص سريع للتقارير: عدد المقالات ومتوسط الطول لكل حالة."""
+    where, params = _where(since=since, until=until)
+    return {
+        row["status"]: {"count": row["count"], "avg_words": round(row["avg_words"] or 0)}
+        for row in _db().execute(
+            f"SELECT status, COUNT(*) AS count, AVG(word_count) AS avg_words FROM articles{where} GROUP BY status",
+            params,
+        )
+    }
+
+
+_EXCEL_COLUMNS = (
+    ("الكلمة المفتاحية", lambda row: row["keyword"]),
+    ("العنوان", lambda row: row["title"]),
+    ("عدد الكلمات", lambda row: row["word_count"]),
+    ("التاريخ", lambda row: row["created_at"].replace("T", " ")),
+    ("الحالة", lambda row: STATUS_LABELS.get(row["status"], row["status"])),
+    ("الدومين المستهدف", lambda row: row["domain"]),
+    ("اللغة", lambda row: row["language"]),
+    ("رموز الطلب", lambda row: row["prompt_tokens"]),
+    ("رموز الإكمال", lambda row: row["completion_tokens"]),
+)
+
+
+def export_ledger_to_excel(file_path=None, **filters):
+    """
+    تصدير السجل (أو جزء منه حسب الفلاتر) إلى مصنف Excel موحد عند الطلب.
+    يُكتب المصنف مباشرة بـ openpyxl في وضع الكتابة فقط (دون pandas) صفاً صفاً.
+    """
+    from openpyxl import Workbook
+
+    if file_path is None:
+        file_path = f"/tmp/articles_ledger_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    try:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("المقالات")
+        sheet.append([title for title, _ in _EXCEL_COLUMNS])
+        for row in query_articles(**filters):
+            sheet.append([value(row) for _, value in _EXCEL_COLUMNS])
+        workbook.save(file_path)
+        return file_path
+    except Exception as e:
+        print(f"خطأ في حفظ Excel: {e}")
+        return None
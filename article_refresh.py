@@ -0,0 +1,360 @@
+"""
+تحديث تدريجي للمقالات المنشورة.
+
+تُحفظ كل نسخة من المقال مقسمة إلى أجزاء (المقدمة، أقسام H2، الأسئلة الشائعة، الخاتمة،
+Meta Description) مع بصمة لمدخلات كل جزء. عند التحديث تُقارن المدخلات الجديدة
+(المخطط، نصوص الربط، الكلمات المرتبطة، عناوين المنافسين) بالنسخة السابقة، ولا يُعاد توليد
+إلا الأجزاء التي تغيرت مدخلاتها أو تجاوز عمرها max_age_days، ثم تُركَّب في نفس بنية
+generate_content_sections ويُحدَّث نفس المقال على WordPress.
+"""
+import hashlib
+import json
+import re
+import time
+from datetime import datetime
+
+from local_store import connect
+from content_generator import (
+    plan_article, build_section_tasks, run_section_tasks, assemble_article,
+    generate_content_sections, extract_meta_description, _INTRO_OUTRO_RE, _FAQ_RE,
+)
+from heading_analysis import normalize_heading
+from wordpress_handler import publish_to_wordpress, site_credentials
+
+VERSIONS_DB = "versions.sqlite3"
+FIXED_PARTS = ("intro", "faq", "closing", "meta")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS article_versions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    keyword TEXT NOT NULL,
+    domain TEXT NOT NULL DEFAULT '',
+    version INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    post_id INTEGER,
+    common_headings TEXT,
+    data TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+"""
+
+# النسخ مفهرسة بالموقع والكلمة المفتاحية: نفس الكلمة على دومينين مقالان مستقلان
+_INDEXES = """
+DROP INDEX IF EXISTS idx_versions_keyword;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_versions_site ON article_versions(domain, keyword, version);
+"""
+_migrated = False
+
+_H2_RE = re.compile(r'<h2[^>]*>(.*?)</h2>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+_CLOSING_RE = re.compile(r'^(ال)?(خاتمة|خلاصة)|^conclusion', re.IGNORECASE)
+_META_PARAGRAPH_RE = re.compile(r'<p>\s*<strong>\s*Meta Description:?\s*</strong>.*?</p>', re.IGNORECASE | re.DOTALL)
+
+
+def _db():
+    global _migrated
+    db = connect(VERSIONS_DB, _SCHEMA)
+    if not _migrated:
+        # قواعد أُنشئت قبل إضافة الدومين إلى مفتاح النسخ
+        columns = {row["name"] for row in db.execute("PRAGMA table_info(article_versions)")}
+        if "domain" not in columns:
+            db.execute("ALTER TABLE article_versions ADD COLUMN domain TEXT NOT NULL DEFAULT ''")
+        db.executescript(_INDEXES)
+        _migrated = True
+    return db
+
+
+def _site(domain):
+    return (domain or "").strip().rstrip("/").lower()
+
+
+def _fingerprint(*values):
+    payload = json.dumps(values, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _part_fingerprints(data, plan):
+    """بصمة مدخلات كل جزء: يتغير الجزء فقط إذا تغيرت البيانات التي يعتمد عليها طلبه."""
+    base = (data['main_keyword'], data.get('language'))
+    faq = plan["faq"]["subheadings"] if plan["faq"] else []
+    fingerprints = {
+        "intro": _fingerprint(base, plan["title"]),
+        "meta": _fingerprint(base, plan["title"]),
+        "closing": _fingerprint(base, data.get('target_domain')),
+        "faq": _fingerprint(base, faq),
+    }
+    for section in plan["sections"]:
+        section["fingerprint"] = _fingerprint(
+            base, section["heading"], section["subheadings"], section["anchors"], section["related"]
+        )
+    return fingerprints
+
+
+def split_article_html(html):
+    """
+    تقسيم مقال HTML موجود (من أي وضع توليد) إلى أجزاء:
+    {"intro", "faq", "closing", "meta", "sections": {العنوان الموحد: محتوى القسم}}.
+    """
+    html = html or ""
+    meta = extract_meta_description(html)
+    html = _META_PARAGRAPH_RE.sub("", html)
+    matches = list(_H2_RE.finditer(html))
+    prefix = html[:matches[0].start()] if matches else html
+    prefix = re.sub(r'<h1[^>]*>.*?</h1>', '', prefix, flags=re.IGNORECASE | re.DOTALL)
+    prefix = re.sub(r'<nav[^>]*>.*?</nav>', '', prefix, flags=re.IGNORECASE | re.DOTALL)
+    parts = {"intro": prefix.strip(), "faq": "", "closing": "", "meta": meta, "sections": {}}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(html)
+        heading = _TAG_RE.sub("", match.group(1)).strip()
+        if _FAQ_RE.search(heading):
+            parts["faq"] = html[match.start():end].strip()
+        elif _CLOSING_RE.match(heading):
+            parts["closing"] = html[match.start():end].strip()
+        elif _INTRO_OUTRO_RE.match(heading):
+            parts["intro"] = (parts["intro"] + "\n" + html[match.end():end].strip()).strip()
+        else:
+            parts["sections"][normalize_heading(heading)] = html[match.end():end].strip()
+    return parts
+
+
+def _save(keyword, data, record, common_headings=None, post_id=None):
+    domain = _site(data.get("target_domain"))
+    db = _db()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        row = db.execute(
+            "SELECT COALESCE(MAX(version), 0) FROM article_versions WHERE domain = ? AND keyword = ?", (domain, keyword)
+        ).fetchone()
+        version = row[0] + 1
+        db.execute(
+            "INSERT INTO article_versions (keyword, domain, version, created_at, post_id, common_headings, data, record) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                keyword, domain, version, datetime.now().isoformat(timespec="seconds"), post_id,
+                json.dumps(common_headings or [], ensure_ascii=False),
+                json.dumps(data, ensure_ascii=False), json.dumps(record, ensure_ascii=False),
+            ),
+        )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+    return version
+
+
+def save_version(keyword, data, article, common_headings=None, post_id=None):
+    """
+    حفظ مقال مولَّد كنسخة جديدة يمكن تحديثها لاحقاً. data هي مدخلات التوليد
+    (نفس بنية generate_content). الأقسام التي لا تطابق المخطط تُعاد كتابتها عند أول تحديث.
+    """
+    plan = plan_article(data)
+    fingerprints = _part_fingerprints(data, plan)
+    split = split_article_html(article.get("html"))
+    split["meta"] = article.get("meta_description") or split["meta"]
+    now = time.time()
+    record = {
+        "title": plan["title"],
+        "parts": {name: split[name] for name in FIXED_PARTS},
+        "fingerprints": {name: fingerprints[name] if split[name] else None for name in FIXED_PARTS},
+        "updated_at": {name: now for name in FIXED_PARTS},
+        "sections": [],
+    }
+    for section in plan["sections"]:
+        body = split["sections"].get(normalize_heading(section["heading"]))
+        if body:
+            record["sections"].append(dict(section, html=body, updated_at=now))
+    return _save(keyword, data, record, common_headings, post_id)
+
+
+def load_latest_version(keyword, domain=None):
+    """آخر نسخة محفوظة لكلمة مفتاحية على دومين معين، أو None."""
+    row = _db().execute(
+        "SELECT * FROM article_versions WHERE domain = ? AND keyword = ? ORDER BY version DESC LIMIT 1",
+        (_site(domain), keyword),
+    ).fetchone()
+    if row is None:
+        return None
+    version = dict(row)
+    for field in ("common_headings", "data", "record"):
+        version[field] = json.loads(version[field])
+    return version
+
+
+def has_versions(keyword, domain=None):
+    return _db().execute(
+        "SELECT 1 FROM article_versions WHERE domain = ? AND keyword = ? LIMIT 1", (_site(domain), keyword)
+    ).fetchone() is not None
+
+
+def set_post_id(keyword, version, post_id, domain=None):
+    _db().execute(
+        "UPDATE article_versions SET post_id = ? WHERE domain = ? AND keyword = ? AND version = ?",
+        (post_id, _site(domain), keyword, version),
+    )
+
+
+def diff_analysis(old_headings, new_headings):
+    """العناوين الشائعة التي ظهرت أو اختفت بين تحليلين (بعد التوحيد)."""
+    old = {normalize_heading(h): h for h in old_headings or []}
+    new = {normalize_heading(h): h for h in new_headings or []}
+    return {
+        "added": [h for key, h in new.items() if key not in old],
+        "removed": [h for key, h in old.items() if key not in new],
+    }
+
+
+def _extend_outline(outline, plan, headings):
+    """إضافة العناوين الشائعة الجديدة غير المغطاة كأقسام H2 في نهاية المخطط."""
+    covered = {normalize_heading(s["heading"]) for s in plan["sections"]}
+    missing = [
+        h for h in headings
+        if normalize_heading(h) not in covered and not _FAQ_RE.search(h) and not _INTRO_OUTRO_RE.match(h)
+    ]
+    if not missing:
+        return outline, []
+    return outline.rstrip() + "\n" + "\n".join(f"## {h}" for h in missing), missing
+
+
+def _keep_assignments(plan, previous_sections):
+    """
+    إبقاء نص الربط والكلمة المرتبطة في قسمها السابق إن كان القسم ما زال موجوداً،
+    وتوزيع الجديد منها على أقل الأقسام حملاً؛ فلا تتغير أقسام لم يتغير ما يخصها.
+    """
+    if not plan["sections"]:
+        return
+    index = {normalize_heading(s["heading"]): i for i, s in enumerate(plan["sections"])}
+    for field, key in (("anchors", lambda a: (a["text"], a["url"])), ("related", lambda r: r)):
+        items = [item for section in plan["sections"] for item in section[field]]
+        owner = {}
+        for previous in previous_sections:
+            target = index.get(normalize_heading(previous["heading"]))
+            if target is not None:
+                for item in previous.get(field, []):
+                    owner.setdefault(key(item), target)
+        for section in plan["sections"]:
+            section[field] = []
+        for item in items:
+            target = owner.get(key(item))
+            if target is None:
+                target = min(range(len(plan["sections"])), key=lambda i: len(plan["sections"][i][field]))
+            plan["sections"][target][field].append(item)
+
+
+def refresh_article(keyword, data, analysis=None, max_age_days=None, api_key=None,
+                    force_refresh=False, wordpress=None, max_workers=8):
+    """
+    تحديث مقال محفوظ سابقاً بإعادة توليد الأجزاء المتأثرة فقط.
+    data: مدخلات التوليد الجديدة (المخطط، نصوص الربط، ...). analysis: تحليل منافسين جديد (اختياري)؛
+    العناوين الشائعة الجديدة فيه تُضاف كأقسام. wordpress: {"url"} لتحديث نفس المقال؛ بيانات الاعتماد
+    تُؤخذ عند التنفيذ من site_credentials ما لم تُمرَّر "user" و"password" صراحة.
+    النسخ السابقة تُطابق بالكلمة المفتاحية ودومين data['target_domain'].
+    يعيد {"article", "version", "regenerated", "reused", "analysis_diff", "wordpress"}.
+    """
+    common_headings = (analysis or {}).get("common_headings")
+    previous = load_latest_version(keyword, data.get("target_domain"))
+    if previous is None or not plan_article(data)["sections"]:
+        # لا توجد نسخة سابقة (أو مخطط بلا أقسام): توليد كامل وحفظه كنسخة جديدة
+        article = generate_content_sections(data, api_key, max_workers=max_workers, force_refresh=force_refresh)
+        if not article.get("word_count"):
+            return {"article": article, "version": None, "regenerated": ["*"], "reused": [], "analysis_diff": None, "wordpress": None}
+        version = save_version(keyword, data, article, common_headings)
+        return _finish(keyword, data, article, version, None, ["*"], [], None, wordpress)
+
+    record = previous["record"]
+    analysis_diff = None
+    if common_headings is not None:
+        analysis_diff = diff_analysis(previous["common_headings"], common_headings)
+        data = dict(data)
+        data["outline"], analysis_diff["new_sections"] = _extend_outline(
+            data.get("outline", ""), plan_article(data), analysis_diff["added"]
+        )
+    else:
+        common_headings = previous["common_headings"]
+
+    plan = plan_article(data)
+    _keep_assignments(plan, record["sections"])
+    fingerprints = _part_fingerprints(data, plan)
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+    previous_sections = {normalize_heading(s["heading"]): s for s in record["sections"]}
+
+    parts, regenerated, reused = {}, [], []
+    for name in FIXED_PARTS:
+        stale = cutoff is not None and record["updated_at"].get(name, 0) < cutoff
+        if record["fingerprints"].get(name) == fingerprints[name] and record["parts"].get(name) and not stale:
+            parts[name] = record["parts"][name]
+            reused.append(name)
+        else:
+            regenerated.append(name)
+    for i, section in enumerate(plan["sections"]):
+        name = f"section-{i + 1}"
+        old = previous_sections.get(normalize_heading(section["heading"]))
+        stale = cutoff is not None and old is not None and old.get("updated_at", 0) < cutoff
+        if old and old.get("fingerprint") == section["fingerprint"] and old.get("html") and not stale:
+            parts[name] = old["html"]
+            reused.append(name)
+        else:
+            regenerated.append(name)
+
+    tasks = build_section_tasks(data, plan)
+    try:
+        parts.update(run_section_tasks(
+            data, {name: tasks[name] for name in regenerated}, max_workers=max_workers, force_refresh=force_refresh
+        ))
+    except Exception as e:
+        article = {
+            "html": f"<p>خطأ في تحديث المقال: {str(e)}</p>",
+            "word_count": 0,
+            "title": keyword,
+            "meta_description": ""
+        }
+        return {"article": article, "version": None, "regenerated": regenerated, "reused": reused,
+                "analysis_diff": analysis_diff, "wordpress": None}
+
+    article = assemble_article(data, plan, parts)
+
+    now = time.time()
+    new_record = {
+        "title": plan["title"],
+        "parts": {name: parts[name] for name in FIXED_PARTS},
+        "fingerprints": {name: fingerprints[name] for name in FIXED_PARTS},
+        "updated_at": {name: now if name in regenerated else record["updated_at"].get(name, now) for name in FIXED_PARTS},
+        "sections": [],
+    }
+    for i, section in enumerate(plan["sections"]):
+        name = f"section-{i + 1}"
+        old = previous_sections.get(normalize_heading(section["heading"])) or {}
+        new_record["sections"].append(dict(
+            section,
+            html=parts[name],
+            updated_at=now if name in regenerated else old.get("updated_at", now),
+        ))
+    version = _save(keyword, data, new_record, common_headings, previous["post_id"])
+    return _finish(keyword, data, article, version, previous["post_id"], regenerated, reused, analysis_diff, wordpress)
+
+
+def _finish(keyword, data, article, version, post_id, regenerated, reused, analysis_diff, wordpress):
+    result = {
+        "article": article,
+        "version": version,
+        "regenerated": regenerated,
+        "reused": reused,
+        "analysis_diff": analysis_diff,
+        "wordpress": None,
+    }
+    if wordpress:
+        # تحديث نفس المقال (بالمعرّف المحفوظ أو بالـ slug) بدلاً من إنشاء مسودة جديدة، مع إبقاء حالته
+        if wordpress.get("user") and wordpress.get("password"):
+            user, password = wordpress["user"], wordpress["password"]
+        else:
+            try:
+                user, password = site_credentials(wordpress["url"])
+            except RuntimeError as e:
+                result["wordpress"] = {"ok": False, "action": None, "id": post_id, "link": None, "error": str(e)}
+                return result
+        published = publish_to_wordpress(
+            wordpress["url"], user, password, article, status=wordpress.get("status"), post_id=post_id,
+        )
+        if published["ok"] and published["id"]:
+            set_post_id(keyword, version, published["id"], data.get("target_domain"))
+        result["wordpress"] = published
+    return result
@@ -0,0 +1,260 @@
+"""
+طبقة الشبكة غير المتزامنة: حلقة أحداث (event loop) واحدة مشتركة في thread خلفي، وعملاء دائمون عليها.
+
+كل الطلبات الخارجية (النماذج عبر AsyncOpenAI، صفحات المنافسين، WordPress) تُنفَّذ كـ coroutines
+على نفس الحلقة، فتبقى مئات الطلبات معلقة في وقت واحد دون thread لكل طلب. الواجهة والعمال
+(threads عادية) يستدعون النسخ المتزامنة التي تنتظر النتيجة عبر run_sync، والكود غير المتزامن
+يستخدم النسخ a* مباشرة مع asyncio.gather.
+
+    from async_network import run_sync
+    pages = run_sync(afetch_pages_conditional(urls))
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import contextlib
+import contextvars
+import os
+import threading
+from urllib.parse import urlsplit
+
+# حدود عميل HTTP المشترك
+MAX_CONNECTIONS = int(os.environ.get("SEO_MAX_CONNECTIONS", "256"))
+MAX_KEEPALIVE = 64
+KEEPALIVE_EXPIRY = 30
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 60
+# إعادة المحاولة عند 429/5xx وأخطاء الاتصال في request()
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+MAX_BACKOFF = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# الطرق التي لا يغير تكرارها النتيجة؛ غيرها (مثل POST) لا يُعاد إلا بطلب صريح من المستدعي
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+USER_AGENT = "Mozilla/5.0 (compatible; SEOAutomationBot/1.0)"
+
+_loop = None
+_thread = None
+_http_client = None
+_llm_clients = {}
+_host_slots = {}
+_lock = threading.Lock()
+
+
+def get_loop():
+    """حلقة الأحداث المشتركة؛ تُنشأ مع thread تشغيلها عند أول استخدام."""
+    global _loop, _thread
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            _thread = threading.Thread(target=run, name="async-network", daemon=True)
+            _thread.start()
+            ready.wait()
+            _loop = loop
+        return _loop
+
+
+def in_loop_thread():
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def submit(coro):
+    """
+    جدولة coroutine على الحلقة المشتركة من أي thread؛ يعيد concurrent.futures.Future.
+    تُنسخ متغيرات السياق (llm_routing، article_context) من الـ thread المستدعي إلى المهمة.
+    """
+    loop = get_loop()
+    context = contextvars.copy_context()
+    future = concurrent.futures.Future()
+
+    def done(task):
+        if task.cancelled():
+            future.set_exception(concurrent.futures.CancelledError())
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def start():
+        if not future.set_running_or_notify_cancel():
+            coro.close()
+            return
+        loop.create_task(coro, context=context).add_done_callback(done)
+
+    loop.call_soon_threadsafe(start)
+    return future
+
+
+def run_sync(coro, timeout=None):
+    """تنفيذ coroutine على الحلقة المشتركة وانتظار نتيجتها (النسخ المتزامنة للواجهة والعمال)."""
+    if in_loop_thread():
+        coro.close()
+        raise RuntimeError("run_sync لا تُستدعى من داخل حلقة الأحداث المشتركة؛ استخدم await")
+    return submit(coro).result(timeout)
+
+
+def pool_context():
+    """
+    سياق multiprocessing لمجموعات العمليات (ProcessPoolExecutor): forkserver حيث يتوفر.
+    fork مباشرة من عملية فيها thread الحلقة المشتركة قد يورث العملية الجديدة قفلاً مغلقاً فتتوقف.
+    """
+    import multiprocessing
+
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else methods[0])
+
+
+def get_http_client():
+    """
+    عميل HTTP غير متزامن دائم (keep-alive ومجمع اتصالات واحد) مشترك بين كل الطلبات.
+    يُستدعى من داخل الحلقة المشتركة فقط.
+    """
+    global _http_client
+    if _http_client is None:
+        # httpx (عميل HTTP الذي تعتمد عليه حزمة openai أصلاً) يُستورد عند أول طلب فقط
+        import httpx
+
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+        )
+    return _http_client
+
+
+def get_async_openai(name, **options):
+    """
+    عميل AsyncOpenAI دائم باسم (مثل "openai" أو "gemini") على الحلقة المشتركة.
+    options تُمرَّر عند الإنشاء الأول فقط (api_key، base_url، ...).
+    """
+    client = _llm_clients.get(name)
+    if client is None:
+        from openai import AsyncOpenAI
+
+        # إعادة المحاولة عند 429 يتولاها rate_limiter حتى يتكيف المعدل المشترك
+        client = _llm_clients[name] = AsyncOpenAI(max_retries=0, **options)
+    return client
+
+
+@contextlib.asynccontextmanager
+async def host_slot(url, limit):
+    """
+    حد لعدد الطلبات المتزامنة لكل موقع (حتى لا يُغرق موقع واحد بمئات الاتصالات).
+    يُحذف Semaphore الموقع عند خروج آخر طلب عليه، فلا يكبر القاموس مع آلاف المواقع
+    في العمليات الطويلة. يُستخدم من داخل الحلقة المشتركة فقط.
+    """
+    key = (urlsplit(url).netloc.lower(), limit)
+    slot = _host_slots.get(key)
+    if slot is None:
+        slot = _host_slots[key] = {"semaphore": asyncio.Semaphore(limit), "users": 0}
+    slot["users"] += 1
+    try:
+        async with slot["semaphore"]:
+            yield
+    finally:
+        slot["users"] -= 1
+        if not slot["users"] and _host_slots.get(key) is slot:
+            del _host_slots[key]
+
+
+def retry_delay(response, attempt):
+    """المدة من Retry-After إن وُجدت، وإلا تراجع أسي."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+    return min(MAX_BACKOFF, BACKOFF_BASE * (2 ** attempt))
+
+
+async def request(method, url, max_retries=MAX_RETRIES, on_retry=None, throttle=None, retry_unsafe=False, **kwargs):
+    """
+    طلب HTTP عبر العميل المشترك مع إعادة المحاولة عند 429/5xx وأخطاء الاتصال.
+    يعيد آخر استجابة (حتى لو كانت خطأً بعد استنفاد المحاولات)، ويرفع خطأ الاتصال الأخير.
+    تُعاد الطرق الآمنة للتكرار (IDEMPOTENT_METHODS) فقط؛ POST وأمثالها تُرسل مرة واحدة ما لم
+    يمرر المستدعي retry_unsafe=True لطلب يعرف أن تكراره لا ينشئ شيئاً جديداً (بحث، تحديث بمعرف).
+    on_retry تُستدعى قبل كل إعادة محاولة (مثل note_retry للمقاييس)، وthrottle (coroutine function)
+    تُنتظر قبل كل محاولة (مثل حد الطلبات لكل موقع). timeout يقبل (الاتصال، القراءة) بالثواني.
+    """
+    import httpx
+
+    if isinstance(kwargs.get("timeout"), tuple):
+        connect, read = kwargs["timeout"]
+        kwargs["timeout"] = httpx.Timeout(read, connect=connect)
+    if not retry_unsafe and method.upper() not in IDEMPOTENT_METHODS:
+        max_retries = 0
+    client = get_http_client()
+    for attempt in range(max_retries + 1):
+        if throttle:
+            await throttle()
+        response = None
+        try:
+            response = await client.request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+        except httpx.TransportError:
+            if attempt == max_retries:
+                raise
+        if attempt == max_retries:
+            return response
+        if on_retry:
+            on_retry()
+        await asyncio.sleep(retry_delay(response, attempt))
+
+
+async def _aclose():
+    global _http_client
+    clients = list(_llm_clients.values())
+    _llm_clients.clear()
+    if _http_client is not None:
+        clients.append(_http_client)
+        _http_client = None
+    for client in clients:
+        try:
+            await client.aclose() if hasattr(client, "aclose") else await client.close()
+        except Exception as e:
+            print(f"خطأ في إغلاق عميل الشبكة: {e}")
+
+
+def close():
+    """إغلاق العملاء الدائمين وإيقاف الحلقة المشتركة (يُستدعى تلقائياً عند الخروج)."""
+    global _loop
+    with _lock:
+        loop, _loop = _loop, None
+    if loop is None or loop.is_closed():
+        return
+    if not in_loop_thread():
+        try:
+            asyncio.run_coroutine_threadsafe(_aclose(), loop).result(5)
+        except Exception as e:
+            print(f"خطأ في إغلاق حلقة الشبكة: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+    _host_slots.clear()
+
+
+def _reset_after_fork():
+    # العملية الناتجة عن fork لا ترث thread الحلقة؛ تُنشأ حلقة وعملاء جدد عند أول استخدام فيها
+    global _loop, _thread, _http_client, _lock
+    _loop = _thread = _http_client = None
+    _llm_clients.clear()
+    _host_slots.clear()
+    _lock = threading.Lock()
+
+
+atexit.register(close)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
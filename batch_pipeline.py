@@ -0,0 +1,393 @@
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+from competitor_analysis import analyze_competitors
+from content_generator import generate_outline, generate_content, generate_content_sections, llm_routing
+from storage_handler import save_all_formats
+from wordpress_handler import publish_to_wordpress, describe_upload
+from link_planner import suggest_anchors, index_article
+from seo_validator import validate_in_pool, repair_article
+from article_ledger import LedgerBuffer, make_ledger_row, export_ledger_to_excel
+from metrics import article_context
+
+# مراحل خط الإنتاج بالترتيب (مرحلة validate تعمل فقط مع validate=True)
+STAGES = ("analysis", "outline", "content", "validate", "export")
+
+# علامة إيقاف العمال في كل طابور
+_STOP = object()
+# مهلة انتظار الطابور الممتلئ قبل إعادة فحص الإلغاء
+_PUT_POLL_SECONDS = 0.1
+
+
+def load_keyword_jobs(path):
+    """
+    يقرأ مهام الكلمات المفتاحية من ملف CSV أو JSONL سطراً بسطر.
+    يعيد مولداً (generator) حتى لا يُحمَّل الملف كاملاً في الذاكرة.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                job = normalize_job(row)
+                if job:
+                    yield job
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from read_jsonl_jobs(f)
+
+
+def read_jsonl_jobs(stream, skip_invalid=False):
+    """
+    يقرأ مهام JSONL من أي مصدر نصي (ملف أو stdin) سطراً بسطر دون تحميله كاملاً.
+    skip_invalid=True يتخطى الأسطر غير الصالحة مع رسالة خطأ بدلاً من إيقاف الحملة.
+    """
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = normalize_job(json.loads(line))
+        except (ValueError, AttributeError) as e:
+            if not skip_invalid:
+                raise
+            print(f"خطأ في السطر {number}: {e}", file=sys.stderr)
+            continue
+        if job:
+            yield job
+
+
+def parse_anchors(value):
+    """
+    تحويل نصوص الربط إلى قائمة [{"text", "url"}].
+    تقبل قائمة جاهزة، أو نص JSON، أو صيغة CSV: "نص|رابط; نص|رابط".
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("["):
+            value = json.loads(value)
+        else:
+            pairs = []
+            for item in value.split(";"):
+                if "|" in item:
+                    text, url = item.split("|", 1)
+                    pairs.append({"text": text.strip(), "url": url.strip()})
+            value = pairs
+    return [a for a in value if a.get("text") and a.get("url")]
+
+
+def normalize_job(row):
+    """توحيد صف الإدخال إلى نفس بنية content_data المستخدمة في الواجهة."""
+    keyword = (row.get("main_keyword") or row.get("keyword") or "").strip()
+    if not keyword:
+        return None
+    related = row.get("related_keywords", "")
+    if isinstance(related, list):
+        related = "، ".join(related)
+    return {
+        "main_keyword": keyword,
+        "related_keywords": related,
+        "anchors": parse_anchors(row.get("anchors")),
+        "target_domain": row.get("target_domain") or row.get("domain") or "",
+        "language": row.get("language") or "العربية",
+    }
+
+
+def _stage_analysis(item, options):
+    item["analysis"] = analyze_competitors(item["job"]["main_keyword"], force_refresh=options.get("force_refresh", False))
+
+
+def _stage_outline(item, options):
+    item["outline"] = generate_outline(
+        item["analysis"], options.get("api_key"), force_refresh=options.get("force_refresh", False), raise_errors=True
+    )
+
+
+def _stage_content(item, options):
+    content_data = dict(item["job"], outline=item["outline"])
+    if options.get("internal_links"):
+        # روابط داخلية مقترحة من مقالات الموقع السابقة تُضاف إلى نصوص الربط اليدوية
+        content_data["anchors"] = suggest_anchors(content_data, options["internal_links"])
+    generate = generate_content_sections if options.get("section_parallel") else generate_content
+    article = generate(content_data, options.get("api_key"), force_refresh=options.get("force_refresh", False), raise_errors=True)
+    if not article.get("word_count"):
+        raise RuntimeError("النموذج أعاد مقالاً فارغاً")
+    item["content_data"] = content_data
+    item["article"] = article
+
+
+def _stage_validate(item, options):
+    # الفحص في مجموعة العمليات المشتركة، والإصلاح بطلبات صغيرة للأجزاء المخالفة فقط
+    report = validate_in_pool(item["article"], item["content_data"])
+    item["article"] = repair_article(
+        item["article"], item["content_data"], report, force_refresh=options.get("force_refresh", False)
+    )
+
+
+def _stage_export(item, options):
+    article = item["article"]
+    keyword = item["job"]["main_keyword"]
+    metadata = dict(item["job"])
+    files = {}
+    if options.get("save_files", True):
+        # بيانات Excel تُسجَّل في سجل المقالات دفعة واحدة بدلاً من ملف لكل مقال
+        files = save_all_formats(article, keyword, metadata, include_excel=False)
+    item["files"] = files
+
+    wp = options.get("wordpress")
+    link = None
+    if wp and wp.get("url") and wp.get("user") and wp.get("password"):
+        published = publish_to_wordpress(wp["url"], wp["user"], wp["password"], article)
+        item["wordpress"] = describe_upload(published)
+        item["published"] = published["ok"]
+        link = published["link"] if published["ok"] else None
+    # كل مقال يصبح هدفاً للروابط الداخلية في مقالات الموقع اللاحقة
+    index_article(keyword, article, domain=item["job"].get("target_domain"), url=link)
+
+
+_STAGE_HANDLERS = {
+    "analysis": _stage_analysis,
+    "outline": _stage_outline,
+    "content": _stage_content,
+    "validate": _stage_validate,
+    "export": _stage_export,
+}
+
+
+def _make_result(item, status, error=None):
+    """بناء سجل النتيجة النهائي لكلمة مفتاحية واحدة."""
+    article = item.get("article") or {}
+    return {
+        "job": item["job"],
+        "batch_id": item["batch_id"],
+        "keyword": item["job"]["main_keyword"],
+        "status": status,
+        "failed_stage": item.get("stage") if status == "failed" else None,
+        "error": error,
+        "title": article.get("title"),
+        "word_count": article.get("word_count", 0),
+        "meta_description": article.get("meta_description", ""),
+        "html": article.get("html"),
+        "files": item.get("files", {}),
+        "wordpress": item.get("wordpress"),
+        "published": item.get("published", False),
+        "validation": _validation_summary(article.get("validation")),
+        "timings": item["timings"],
+        "usage": item.get("usage"),
+    }
+
+
+def _validation_summary(validation):
+    if not validation:
+        return None
+    return {key: validation[key] for key in ("ok", "failed", "repaired", "rounds")}
+
+
+def _put(target, item, cancel):
+    """وضع item في طابور محدود؛ يعيد False دون وضعه إذا أُلغي خط الإنتاج أثناء انتظار مكان."""
+    while not cancel.is_set():
+        try:
+            target.put(item, timeout=_PUT_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _stage_worker(stage, in_queue, out_queue, results, options, cancel):
+    """
+    عامل واحد لمرحلة معينة: يسحب من طابورها ويدفع إلى طابور المرحلة التالية.
+    بعد cancel يُفرغ طابوره دون معالجة حتى تصل علامة الإيقاف.
+    """
+    handler = _STAGE_HANDLERS[stage]
+    while True:
+        item = in_queue.get()
+        if item is _STOP:
+            break
+        if cancel.is_set():
+            continue
+        item["stage"] = stage
+        started = time.perf_counter()
+        try:
+            # نفس قاموس الاستهلاك عبر كل المراحل، فيُسجَّل مجموع رموز المقال في السجل
+            with article_context(item["job"]["main_keyword"], item["usage"]), llm_routing(options.get("model"), options.get("hedge", False)):
+                handler(item, options)
+        except Exception as e:
+            item["timings"][stage] = round(time.perf_counter() - started, 3)
+            _put(results, _make_result(item, "failed", str(e)), cancel)
+            continue
+        item["timings"][stage] = round(time.perf_counter() - started, 3)
+        if out_queue is None:
+            _put(results, _make_result(item, "done"), cancel)
+        else:
+            _put(out_queue, item, cancel)
+
+
+def _ledger_row(result, job, batch_id):
+    if result["status"] == "failed":
+        status = "failed"
+    elif result["published"]:
+        status = "published"
+    else:
+        status = "generated"
+    article = {"title": result["title"] or result["keyword"], "word_count": result["word_count"], "usage": result["usage"]}
+    return make_ledger_row(
+        article,
+        result["keyword"],
+        job,
+        status,
+        batch_id=batch_id,
+        timings=result["timings"],
+        file_paths=result["files"] or None,
+        wordpress=result.get("wordpress"),
+    )
+
+
+def run_pipeline(jobs, concurrency=8, api_key=None, save_files=True, wordpress=None, stage_workers=None, force_refresh=False, section_parallel=False, batch_id=None, model=None, hedge=False, internal_links=0, validate=False):
+    """
+    تشغيل السلسلة الكاملة (تحليل ← مخطط ← كتابة ← تصدير) لعدد كبير من الكلمات المفتاحية.
+
+    لكل مرحلة طابور خاص ومجموعة عمال (threads) خاصة بها، لذلك تتداخل مراحل
+    الكلمات المختلفة: بينما يُكتب مقال كلمة، يُحلَّل منافسو كلمة أخرى.
+    الطوابير محدودة الحجم فيبقى استهلاك الذاكرة ثابتاً مهما كان عدد المهام.
+    يعيد مولداً يُخرج نتيجة كل كلمة فور انتهائها (وليس بترتيب الإدخال).
+    كل نتيجة تُسجَّل في سجل المقالات بمعاملات مجمّعة تحت batch_id.
+    model وhedge يُمرَّران إلى طبقة توجيه النماذج (llm_routing).
+    internal_links: عدد الروابط الداخلية المقترحة (link_planner) المضافة لكل مقال قبل كتابته.
+    validate=True يضيف مرحلة فحص قواعد SEO (seo_validator) بعد الكتابة مع إصلاح الأجزاء المخالفة فقط.
+    إيقاف الاستهلاك مبكراً (break أو استثناء أو close()) يلغي بقية المهام: تكتمل الطلبات
+    الجارية فقط ولا تبدأ بعدها أي مرحلة جديدة.
+    """
+    batch_id = batch_id or datetime.now().strftime("batch_%Y%m%d_%H%M%S")
+    options = {
+        "api_key": api_key,
+        "save_files": save_files,
+        "wordpress": wordpress,
+        "force_refresh": force_refresh,
+        "section_parallel": section_parallel,
+        "model": model,
+        "hedge": hedge,
+        "internal_links": internal_links,
+    }
+    stages = [stage for stage in STAGES if validate or stage != "validate"]
+    workers_per_stage = {stage: max(1, concurrency) for stage in stages}
+    workers_per_stage["export"] = max(1, concurrency // 2)
+    if stage_workers:
+        workers_per_stage.update(stage_workers)
+
+    queues = {stage: queue.Queue(maxsize=max(1, concurrency) * 2) for stage in stages}
+    results = queue.Queue(maxsize=max(1, concurrency) * 2)
+    cancel = threading.Event()
+
+    threads = {stage: [] for stage in stages}
+    for index, stage in enumerate(stages):
+        next_queue = queues[stages[index + 1]] if index + 1 < len(stages) else None
+        for _ in range(workers_per_stage[stage]):
+            t = threading.Thread(
+                target=_stage_worker,
+                args=(stage, queues[stage], next_queue, results, options, cancel),
+                daemon=True,
+            )
+            t.start()
+            threads[stage].append(t)
+
+    # خطأ مصدر المهام (مثل سطر JSONL غير صالح) يُحفظ ويُرفع للمستهلك بعد انتهاء المهام الجارية
+    feed_error = []
+
+    def feeder():
+        try:
+            for job in jobs:
+                item = {"job": job, "timings": {}, "batch_id": batch_id, "usage": {"prompt_tokens": 0, "completion_tokens": 0}}
+                if not _put(queues["analysis"], item, cancel):
+                    break
+        except BaseException as e:
+            feed_error.append(e)
+        finally:
+            # إيقاف المراحل بالتسلسل: لا تتوقف مرحلة قبل أن تُفرغ سابقتها
+            # (بعد الإلغاء يُفرغ العمال طوابيرهم، فلا يبقى put عالقاً)
+            for stage in stages:
+                for _ in threads[stage]:
+                    queues[stage].put(_STOP)
+                for t in threads[stage]:
+                    t.join()
+            _put(results, _STOP, cancel)
+
+    threading.Thread(target=feeder, daemon=True).start()
+
+    try:
+        with LedgerBuffer() as ledger:
+            while True:
+                result = results.get()
+                if result is _STOP:
+                    break
+                ledger.add(_ledger_row(result, result.pop("job"), batch_id))
+                yield result
+    finally:
+        # المستهلك توقف (أو انتهت المهام): لا مهام جديدة، وتفريغ النتائج يحرر أي عامل ينتظر مكاناً
+        cancel.set()
+        while True:
+            try:
+                results.get_nowait()
+            except queue.Empty:
+                break
+    if feed_error:
+        raise feed_error[0]
+
+
+def run_batch_file(input_path, output_path=None, concurrency=8, api_key=None, save_files=True, wordpress=None, model=None, hedge=False, validate=False):
+    """
+    تشغيل حملة كاملة من ملف CSV/JSONL وكتابة النتائج في ملف JSONL.
+    يعيد ملخصاً بعدد المقالات الناجحة والفاشلة والزمن الكلي.
+    """
+    if output_path is None:
+        base = os.path.splitext(os.path.basename(input_path))[0]
+        output_path = f"/tmp/{base}_results.jsonl"
+
+    started = time.perf_counter()
+    batch_id = datetime.now().strftime("batch_%Y%m%d_%H%M%S")
+    summary = {"done": 0, "failed": 0, "output": output_path, "batch_id": batch_id}
+    with open(output_path, "w", encoding="utf-8") as out:
+        for result in run_pipeline(
+            load_keyword_jobs(input_path),
+            concurrency=concurrency,
+            api_key=api_key,
+            save_files=save_files,
+            wordpress=wordpress,
+            batch_id=batch_id,
+            model=model,
+            hedge=hedge,
+            validate=validate,
+        ):
+            summary[result["status"]] += 1
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+    # مصنف Excel واحد للحملة كاملة من سجل المقالات
+    summary["excel"] = export_ledger_to_excel(batch_id=batch_id) if save_files else None
+    summary["elapsed"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="توليد مقالات SEO لقائمة كلمات مفتاحية دفعة واحدة")
+    parser.add_argument("input", help="ملف CSV أو JSONL بالكلمات المفتاحية")
+    parser.add_argument("-o", "--output", help="ملف JSONL للنتائج")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="عدد المهام المتزامنة في كل مرحلة")
+    parser.add_argument("--no-files", action="store_true", help="عدم حفظ ملفات Excel/Docx/HTML")
+    parser.add_argument("-m", "--model", help="النموذج الرئيسي (الافتراضي gpt-4.1-mini)")
+    parser.add_argument("--hedge", action="store_true", help="طلب احتياطي عند تجاوز زمن p95")
+    parser.add_argument("--validate", action="store_true", help="فحص قواعد SEO وإصلاح الأجزاء المخالفة فقط")
+    args = parser.parse_args()
+
+    print(json.dumps(
+        run_batch_file(args.input, args.output, args.concurrency, save_files=not args.no_files,
+                       model=args.model, hedge=args.hedge, validate=args.validate),
+        ensure_ascii=False,
+    ))
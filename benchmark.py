@@ -0,0 +1,254 @@
+"""
+قياس أداء خط إنتاج المحتوى بالكامل دون اتصال بالإنترنت.
+
+يستخدم FakeLLMClient بدلاً من OpenAI، ومجلد نتائج بحث وصفحات منافسين ثابت،
+وخادم WordPress محلي؛ ثم يقيس زمن كل مرحلة عند 1/100/1000 مقال ويعرض
+الإنتاجية وزمن الذيل (p95/p99) وذروة استهلاك الذاكرة.
+
+    python benchmark.py --scales 1 100 1000 --latency 0.05 --concurrency 16
+
+ويقيس --imports زمن بدء الواجهة والأدوات (استيراد الوحدات في عملية جديدة) ويفشل إذا
+حُمّلت مكتبة ثقيلة عند البدء بدلاً من أول استخدام لمرحلتها.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# عزل قواعد البيانات المحلية (الذاكرة المؤقتة، السجل، المقاييس) في مجلد مؤقت قبل استيراد الوحدات
+_WORKDIR = tempfile.mkdtemp(prefix="seo_bench_")
+os.environ.setdefault("SEO_DATA_DIR", os.path.join(_WORKDIR, "data"))
+
+from article_ledger import record_article
+from competitor_analysis import analyze_competitors, fixture_search_provider
+from content_generator import generate_outline, generate_content, count_keyword_density, set_llm_client
+from storage_handler import build_article_document, save_to_excel, save_to_docx, save_to_html
+from wordpress_handler import publish_to_wordpress, set_site_rate_limit
+from wordpress_stub import start_stub_server
+from fake_llm import FakeLLMClient
+
+STAGES = (
+    "analyze_competitors", "generate_outline", "generate_content", "count_keyword_density",
+    "record_article", "save_to_excel", "save_to_docx", "save_to_html", "upload_to_wordpress",
+)
+
+# الوحدات التي تستوردها كل نقطة دخول عند البدء، والمكتبات التي يجب ألا تُحمَّل قبل أول استخدام
+STARTUP_MODULES = {
+    "streamlit_app": (
+        "seo_metrics", "wordpress_handler", "storage_handler", "article_ledger", "metrics",
+        "cache_handler", "rate_limiter", "article_refresh", "job_queue",
+    ),
+    "batch_pipeline": ("batch_pipeline",),
+    "job_queue": ("job_queue",),
+}
+LAZY_LIBRARIES = ("pandas", "openpyxl", "docx", "bs4", "lxml", "httpx", "openai", "numpy")
+IMPORT_BUDGET_MS = 300
+
+_HEADINGS = ("المقدمة", "مقدمة", "المميزات", "العيوب", "الأسعار", "المقارنة", "الأسئلة الشائعة", "الخلاصة")
+
+
+def build_fixture_corpus(directory, pages=20, words_per_page=1500, seed=0):
+    """إنشاء مجلد نتائج بحث وصفحات منافسين ثابتة لمزود fixture_search_provider."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    index = {"*": []}
+    for i in range(pages):
+        sections = rng.sample(_HEADINGS, 5)
+        body = "".join(
+            f"<h2>{heading}</h2><h3>تفاصيل {heading}</h3><p>{' '.join(['نص'] * (words_per_page // 5))}</p>"
+            for heading in sections
+        )
+        file_name = f"page_{i}.html"
+        with open(os.path.join(directory, file_name), "w", encoding="utf-8") as f:
+            f.write(f"<html><body><h1>صفحة منافس {i}</h1>{body}<script>var x = 1;</script></body></html>")
+        index["*"].append({"title": f"منافس {i}", "url": f"https://competitor{i}.example", "file": file_name})
+    with open(os.path.join(directory, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    return directory
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class _Recorder:
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def measure(self, stage, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples[stage].append(elapsed)
+        return result
+
+    def report(self):
+        rows = {}
+        for stage, values in self.samples.items():
+            values = sorted(values)
+            total = sum(values)
+            rows[stage] = {
+                "count": len(values),
+                "mean_ms": round(total / len(values) * 1000, 2) if values else 0,
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2) if values else 0,
+                "ops_per_s": round(len(values) / total, 2) if total else 0,
+            }
+        return rows
+
+
+def _run_article(index, recorder, provider, wp_url):
+    keyword = f"كلمة مفتاحية {index}"
+    analysis = recorder.measure("analyze_competitors", analyze_competitors, keyword, provider=provider, force_refresh=True)
+    outline = recorder.measure("generate_outline", generate_outline, analysis, None, force_refresh=True)
+    data = {
+        "main_keyword": keyword,
+        "related_keywords": "كلمة مرتبطة، كلمة أخرى",
+        "anchors": [{"text": "رابط داخلي", "url": "https://example.com/a"}],
+        "target_domain": "https://example.com",
+        "language": "العربية",
+        "outline": outline,
+    }
+    article = recorder.measure("generate_content", generate_content, data, None, force_refresh=True)
+    recorder.measure("count_keyword_density", count_keyword_density, article["html"], keyword)
+    document = build_article_document(article, keyword, data)
+    # save_to_excel يصدّر صفوف الكلمة من السجل، فيُسجَّل المقال أولاً كما في خط الإنتاج والعمال
+    recorder.measure("record_article", record_article, article, keyword, data)
+    recorder.measure("save_to_excel", save_to_excel, article, keyword, data, document)
+    recorder.measure("save_to_docx", save_to_docx, article, keyword, data, document)
+    recorder.measure("save_to_html", save_to_html, article, keyword, document)
+    recorder.measure("upload_to_wordpress", publish_to_wordpress, wp_url, "bench", "bench", article)
+    return [document["file_stem"] + ext for ext in (".xlsx", ".docx", ".html")]
+
+
+def run_benchmark(articles, concurrency=8, latency=0.05, tokens_per_second=0, wp_latency=0.0):
+    """قياس خط الإنتاج لعدد articles من المقالات. يعيد تقريراً بكل المقاييس."""
+    client = FakeLLMClient(latency=latency, tokens_per_second=tokens_per_second)
+    set_llm_client(client)
+    provider = fixture_search_provider(build_fixture_corpus(os.path.join(_WORKDIR, "serp")))
+    server, wp_url = start_stub_server(latency=wp_latency)
+    set_site_rate_limit(wp_url, 0)
+    recorder = _Recorder()
+    files = []
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for paths in pool.map(lambda i: _run_article(i, recorder, provider, wp_url), range(articles)):
+                files.extend(paths)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        server.shutdown()
+        set_llm_client(None)
+        for path in files:
+            if os.path.exists(path):
+                os.remove(path)
+
+    return {
+        "articles": articles,
+        "concurrency": concurrency,
+        "llm_latency_s": latency,
+        "elapsed_s": round(elapsed, 3),
+        "articles_per_s": round(articles / elapsed, 3) if elapsed else 0,
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+        "llm_calls": client.calls,
+        "stages": recorder.report(),
+    }
+
+
+def measure_import_time(modules, repeat=3):
+    """
+    زمن استيراد الوحدات في عملية Python جديدة (أفضل قيمة من repeat مرات)،
+    والمكتبات الثقيلة التي حُمّلت نتيجة لذلك.
+    """
+    code = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        f"for name in {list(modules)!r}:\n"
+        "    __import__(name)\n"
+        "elapsed = (time.perf_counter() - started) * 1000\n"
+        f"print(json.dumps({{'ms': elapsed, 'loaded': [m for m in {list(LAZY_LIBRARIES)!r} if m in sys.modules]}}))\n"
+    )
+    env = dict(os.environ, SEO_DATA_DIR=os.path.join(_WORKDIR, "imports"))
+    results = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(results, key=lambda r: r["ms"])
+    return {"ms": round(best["ms"], 1), "loaded": best["loaded"]}
+
+
+def run_import_benchmark(budget_ms=IMPORT_BUDGET_MS, repeat=3):
+    """قياس زمن البدء لكل نقطة دخول؛ يعيد (التقرير، هل التزمت كلها بالحدود)."""
+    report = {entry: measure_import_time(modules, repeat) for entry, modules in STARTUP_MODULES.items()}
+    ok = all(not row["loaded"] and row["ms"] <= budget_ms for row in report.values())
+    return report, ok
+
+
+def _print_report(report):
+    print(f"\n=== {report['articles']} مقال | تزامن {report['concurrency']} | "
+          f"{report['elapsed_s']} ث | {report['articles_per_s']} مقال/ث | "
+          f"ذروة الذاكرة {report['peak_memory_mb']} MB ===")
+    print(f"{'stage':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'ops/s':>10}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<24}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+              f"{row['p99_ms']:>10}{row['max_ms']:>10}{row['ops_per_s']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="قياس أداء خط إنتاج المحتوى دون اتصال")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 100, 1000], help="أعداد المقالات المقاسة")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="زمن استجابة النموذج المحاكى بالثواني")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="سرعة توليد الرموز المحاكاة")
+    parser.add_argument("--wp-latency", type=float, default=0.0, help="زمن استجابة خادم WordPress المحلي")
+    parser.add_argument("--json", help="حفظ التقرير الكامل في ملف JSON")
+    parser.add_argument("--imports", action="store_true", help="قياس زمن الاستيراد عند البدء فقط")
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    args = parser.parse_args()
+
+    if args.imports:
+        try:
+            import_report, within_budget = run_import_benchmark(args.import_budget_ms)
+        finally:
+            shutil.rmtree(_WORKDIR, ignore_errors=True)
+        print(f"{'entry point':<20}{'import ms':>12}  heavy libraries loaded")
+        for entry, row in import_report.items():
+            print(f"{entry:<20}{row['ms']:>12}  {', '.join(row['loaded']) or '-'}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(import_report, f, ensure_ascii=False, indent=2)
+        sys.exit(0 if within_budget else 1)
+
+    reports = []
+    try:
+        for scale in args.scales:
+            report = run_benchmark(scale, args.concurrency, args.latency, args.tokens_per_second, args.wp_latency)
+            _print_report(report)
+            reports.append(report)
+    finally:
+        shutil.rmtree(_WORKDIR, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,262 @@
+import asyncio
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+
+from local_store import connect
+from metrics import note_cache_hit
+
+CACHE_DB = "cache.sqlite3"
+
+# مدة صلاحية كل مرحلة بالثواني
+STAGE_TTLS = {
+    "analysis": 7 * 24 * 3600,
+    "outline": 30 * 24 * 3600,
+    "content": 30 * 24 * 3600,
+}
+DEFAULT_TTL = 7 * 24 * 3600
+
+# الحد الأقصى لحجم الذاكرة المؤقتة قبل حذف الأقدم استخداماً (LRU)
+MAX_CACHE_BYTES = int(os.environ.get("SEO_CACHE_MAX_MB", "512")) * 1024 * 1024
+# عدادات الإصابة/الإخفاق وأزمنة آخر استخدام تُجمع في الذاكرة وتُكتب دفعة واحدة
+FLUSH_EVERY = 200
+FLUSH_SECONDS = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    stage TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache(last_access);
+CREATE INDEX IF NOT EXISTS idx_cache_stage ON cache(stage);
+CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache(expires_at);
+CREATE TABLE IF NOT EXISTS cache_counters (
+    stage TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+-- الحجم الكلي في صف واحد تحدّثه المشغلات (triggers) مع كل إضافة أو تعديل أو حذف
+CREATE TABLE IF NOT EXISTS cache_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_meta(id, total_bytes)
+    SELECT 1, COALESCE(SUM(size), 0) FROM cache WHERE NOT EXISTS (SELECT 1 FROM cache_meta);
+CREATE TRIGGER IF NOT EXISTS cache_size_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_meta SET total_bytes = total_bytes + new.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_size_update AFTER UPDATE OF size ON cache BEGIN
+    UPDATE cache_meta SET total_bytes = total_bytes + new.size - old.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_size_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_meta SET total_bytes = total_bytes - old.size WHERE id = 1;
+END;
+"""
+
+_pending = {"counters": {}, "access": {}, "ops": 0, "flushed": time.monotonic()}
+_pending_lock = threading.Lock()
+
+
+def _db():
+    return connect(CACHE_DB, _SCHEMA)
+
+
+def _normalize(value):
+    """توحيد المدخلات قبل الحساب: تطبيع Unicode وإزالة المسافات الزائدة."""
+    if isinstance(value, str):
+        return " ".join(unicodedata.normalize("NFC", value).split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_key(stage, inputs):
+    """مفتاح المحتوى: بصمة SHA-256 للمدخلات بعد التوحيد."""
+    payload = json.dumps([stage, _normalize(inputs)], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _note(stage=None, column=None, key=None, accessed=None):
+    """تسجيل إصابة/إخفاق أو زمن استخدام في الذاكرة، والكتابة في SQLite كل FLUSH_EVERY عملية أو FLUSH_SECONDS."""
+    with _pending_lock:
+        if stage:
+            counter = _pending["counters"].setdefault(stage, {"hits": 0, "misses": 0})
+            counter[column] += 1
+        if key:
+            _pending["access"][key] = accessed
+        _pending["ops"] += 1
+        due = _pending["ops"] >= FLUSH_EVERY or time.monotonic() - _pending["flushed"] >= FLUSH_SECONDS
+    if due:
+        flush_counters()
+
+
+def flush_counters():
+    """كتابة العدادات وأزمنة آخر استخدام المتجمعة في معاملة واحدة."""
+    with _pending_lock:
+        counters, _pending["counters"] = _pending["counters"], {}
+        access, _pending["access"] = _pending["access"], {}
+        _pending["ops"] = 0
+        _pending["flushed"] = time.monotonic()
+    if not counters and not access:
+        return
+    db = _db()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.executemany(
+            "INSERT INTO cache_counters(stage, hits, misses) VALUES (?, ?, ?) "
+            "ON CONFLICT(stage) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+            [(stage, c["hits"], c["misses"]) for stage, c in counters.items()],
+        )
+        db.executemany(
+            "UPDATE cache SET last_access = MAX(last_access, ?) WHERE key = ?",
+            [(accessed, key) for key, accessed in access.items()],
+        )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+
+
+def record_lookup(stage, hit):
+    """تسجيل إصابة أو إخفاق لذاكرة مؤقتة أخرى (مثل semantic_cache) في نفس العدادات."""
+    _note(stage, "hits" if hit else "misses")
+
+
+def cache_get(stage, key):
+    """إرجاع القيمة المخزنة أو None إذا لم توجد أو انتهت صلاحيتها."""
+    db = _db()
+    now = time.time()
+    row = db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+    if row is None or row["expires_at"] < now:
+        if row is not None:
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+        _note(stage, "misses")
+        return None
+    _note(stage, "hits", key, now)
+    return json.loads(row["value"])
+
+
+def cache_has(key):
+    """هل توجد قيمة صالحة للمفتاح؟ (دون تحديث العدادات أو زمن آخر استخدام)"""
+    row = _db().execute("SELECT 1 FROM cache WHERE key = ? AND expires_at >= ?", (key, time.time())).fetchone()
+    return row is not None
+
+
+def cache_set(stage, key, value, ttl=None):
+    """تخزين قيمة (قابلة للتحويل إلى JSON) ثم حذف الأقدم استخداماً إذا تجاوز الحجم الحد."""
+    ttl = ttl if ttl is not None else STAGE_TTLS.get(stage, DEFAULT_TTL)
+    data = json.dumps(value, ensure_ascii=False)
+    now = time.time()
+    db = _db()
+    # UPSERT وليس INSERT OR REPLACE: الاستبدال لا يشغّل مشغل الحذف فيختل الحجم الكلي
+    db.execute(
+        "INSERT INTO cache(key, stage, value, size, created_at, expires_at, last_access) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET stage = excluded.stage, "
+        "value = excluded.value, size = excluded.size, created_at = excluded.created_at, "
+        "expires_at = excluded.expires_at, last_access = excluded.last_access",
+        (key, stage, data, len(data.encode("utf-8")), now, now + ttl, now),
+    )
+    if _total_bytes(db) > MAX_CACHE_BYTES:
+        _evict(db)
+
+
+def _total_bytes(db):
+    return db.execute("SELECT total_bytes FROM cache_meta WHERE id = 1").fetchone()[0]
+
+
+def _evict(db):
+    """حذف المنتهي صلاحيته، ثم الأقدم استخداماً حتى ينزل الحجم إلى 90% من الحد."""
+    # أزمنة الاستخدام المتجمعة تُكتب أولاً حتى لا يُحذف ما استُخدم للتو
+    flush_counters()
+    db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+    total = _total_bytes(db)
+    if total <= MAX_CACHE_BYTES:
+        return
+    target = int(MAX_CACHE_BYTES * 0.9)
+    freed = 0
+    victims = []
+    for row in db.execute("SELECT key, size FROM cache ORDER BY last_access"):
+        if total - freed <= target:
+            break
+        victims.append((row["key"],))
+        freed += row["size"]
+    db.executemany("DELETE FROM cache WHERE key = ?", victims)
+
+
+def cached_call(stage, inputs, compute, bypass=False, ttl=None, should_cache=None):
+    """
+    تنفيذ compute() مرة واحدة لكل مجموعة مدخلات متطابقة.
+    bypass=True يتجاوز القراءة (إعادة توليد إجبارية) لكنه يحدّث القيمة المخزنة.
+    should_cache تسمح باستبعاد نتائج لا يجب تخزينها (مثل رسائل الخطأ).
+    """
+    key = make_key(stage, inputs)
+    if not bypass:
+        value = cache_get(stage, key)
+        if value is not None:
+            note_cache_hit()
+            return value
+    value = compute()
+    if should_cache is None or should_cache(value):
+        cache_set(stage, key, value, ttl)
+    return value
+
+
+async def acached_call(stage, inputs, compute, bypass=False, ttl=None, should_cache=None):
+    """
+    نسخة cached_call غير المتزامنة: compute دالة تعيد coroutine.
+    القراءة والكتابة في SQLite تتم في thread آخر حتى لا تتوقف حلقة الأحداث المشتركة.
+    """
+    key = make_key(stage, inputs)
+    if not bypass:
+        value = await asyncio.to_thread(cache_get, stage, key)
+        if value is not None:
+            note_cache_hit()
+            return value
+    value = await compute()
+    if should_cache is None or should_cache(value):
+        await asyncio.to_thread(cache_set, stage, key, value, ttl)
+    return value
+
+
+def cache_stats():
+    """إحصائيات الإصابة والإخفاق وعدد العناصر والحجم لكل مرحلة."""
+    flush_counters()
+    db = _db()
+    stats = {}
+    for row in db.execute("SELECT stage, hits, misses FROM cache_counters"):
+        stats[row["stage"]] = {"hits": row["hits"], "misses": row["misses"], "entries": 0, "bytes": 0}
+    for row in db.execute("SELECT stage, COUNT(*) AS entries, SUM(size) AS bytes FROM cache GROUP BY stage"):
+        entry = stats.setdefault(row["stage"], {"hits": 0, "misses": 0})
+        entry["entries"] = row["entries"]
+        entry["bytes"] = row["bytes"]
+    return stats
+
+
+def clear_cache(stage=None):
+    """مسح الذاكرة المؤقتة بالكامل أو لمرحلة واحدة."""
+    db = _db()
+    if stage:
+        db.execute("DELETE FROM cache WHERE stage = ?", (stage,))
+    else:
+        db.execute("DELETE FROM cache")
+
+
+def _flush_at_exit():
+    try:
+        flush_counters()
+    except Exception as e:
+        print(f"خطأ في حفظ عدادات الذاكرة المؤقتة: {e}")
+
+
+atexit.register(_flush_at_exit)
@@ -1,21 +1,62 @@
-import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import threading
+import json
 import os
+from async_network import run_sync, request, host_slot, pool_context
+from cache_handler import cached_call, record_lookup
+from metrics import instrumented
+from heading_analysis import cluster_headings
+from page_snapshots import get_page, conditional_headers, mark_checked, record_snapshot, content_hash
 
-def analyze_competitors(keyword):
+# إعدادات الزحف
+MAX_COMPETITORS = 20
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+CONNECTIONS_PER_HOST = 4
+REQUEST_TIMEOUT = (5, 15)  # (الاتصال، القراءة) بالثواني
+HEADERS = {"Accept-Language": "ar,en;q=0.8"}
+
+_parse_pool = None
+_lock = threading.Lock()
+
+@instrumented("analysis")
+def analyze_competitors(keyword, provider=None, force_refresh=False):
     """
     يقوم بالبحث عن المنافسين وتحليل محتواهم.
-    يستخدم محاكاة للنتائج في الوقت الحالي، ويمكن ربطها بـ Serper API أو Google Search API.
+    يستخدم مزود بحث حقيقي إذا كان مهيأً (SERPER_API_KEY أو SEO_SERP_FIXTURES)،
+    وإلا يعود إلى بيانات المحاكاة.
+    نتائج الزحف الحقيقي تُحفظ في الذاكرة المؤقتة؛ force_refresh=True يعيد الزحف.
     """
     
-    # محاكاة لنتائج البحث - يمكن استبدالها بـ API حقيقي
-    competitors_data = get_mock_competitors(keyword)
+    competitors_data = []
+    source = "mock"
+    provider = provider or get_search_provider()
+    if provider:
+        try:
+            competitors_data = cached_call(
+                "analysis",
+                {"keyword": keyword, "num_results": MAX_COMPETITORS},
+                lambda: fetch_real_competitors(keyword, provider=provider),
+                bypass=force_refresh,
+                should_cache=bool,
+            )
+            source = "live"
+        except Exception as e:
+            print(f"خطأ في جلب المنافسين: {e}")
+    
+    if not competitors_data:
+        competitors_data = get_mock_competitors(keyword)
+        source = "mock"
     
+    heading_clusters = cluster_headings(competitors_data, limit=20)
     analysis_summary = {
         "keyword": keyword,
+        "source": source,
         "top_competitors": competitors_data,
         "avg_length": calculate_avg_length(competitors_data),
-        "common_headings": extract_common_headings(competitors_data),
+        "common_headings": [c["heading"] for c in heading_clusters[:8]],
+        "heading_clusters": heading_clusters,
         "suggested_keywords": generate_keyword_suggestions(keyword),
         "faq_suggestions": generate_faq_suggestions(keyword)
     }
@@ -69,15 +110,11 @@ def calculate_avg_length(competitors):
     return total // len(competitors)
 
 def extract_common_headings(competitors):
-    """استخراج العناوين الشائعة من المنافسين."""
-    headings = {}
-    for competitor in competitors:
-        for heading in competitor.get("headings", []):
-            headings[heading] = headings.get(heading, 0) + 1
-    
-    # ترتيب حسب التكرار
-    sorted_headings = sorted(headings.items(), key=lambda x: x[1], reverse=True)
-    return [h[0] for h in sorted_headings[:8]]
+    """
+    استخراج العناوين الشائعة من المنافسين: ممثل كل مجموعة عناوين متشابهة
+    (وليس التطابق الحرفي فقط)، مرتبة حسب عدد المنافسين الذين يغطونها.
+    """
+    return [c["heading"] for c in cluster_headings(competitors, limit=8)]
 
 def generate_keyword_suggestions(keyword):
     """توليد اقتراحات كلمات مفتاحية مرتبطة."""
@@ -111,10 +148,203 @@ def generate_faq_suggestions(keyword):
     ]
     return faqs[:12]
 
-def fetch_real_competitors(keyword, api_key=None):
+def serper_search_provider(api_key):
+    """
+    مزود بحث يعتمد على Serper API.
+    كل مزود هو دالة تستقبل (keyword, num_results) وتعيد قائمة [{"title", "url"}].
+    """
+    def search(keyword, num_results):
+        response = run_sync(request(
+            "POST",
+            "https://google.serper.dev/search",
+            json={"q": keyword, "num": num_results, "hl": "ar"},
+            headers={"X-API-KEY": api_key},
+            timeout=REQUEST_TIMEOUT,
+            retry_unsafe=True,  # بحث للقراءة فقط رغم أنه POST
+        ))
+        response.raise_for_status()
+        return [
+            {"title": item.get("title", ""), "url": item["link"]}
+            for item in response.json().get("organic", [])
+            if item.get("link")
+        ][:num_results]
+    return search
+
+def fixture_search_provider(fixture_dir):
+    """
+    مزود بحث محلي للاختبارات يقرأ النتائج من مجلد ثابت بدون أي اتصال بالإنترنت.
+    يحتوي المجلد على index.json بالشكل:
+    {"الكلمة": [{"title": ..., "url": ..., "file": "page1.html"}], "*": [...]}
+    ويستخدم المفتاح "*" لأي كلمة غير موجودة.
+    """
+    with open(os.path.join(fixture_dir, "index.json"), encoding="utf-8") as f:
+        index = json.load(f)
+
+    def search(keyword, num_results):
+        results = []
+        for item in index.get(keyword, index.get("*", []))[:num_results]:
+            result = {"title": item.get("title", ""), "url": item.get("url", "")}
+            if item.get("file"):
+                with open(os.path.join(fixture_dir, item["file"]), encoding="utf-8") as page:
+                    result["html"] = page.read()
+            results.append(result)
+        return results
+    return search
+
+def get_search_provider(api_key=None):
+    """اختيار مزود البحث حسب الإعدادات المتاحة، أو None للعودة إلى المحاكاة."""
+    api_key = api_key or os.environ.get("SERPER_API_KEY")
+    if api_key:
+        return serper_search_provider(api_key)
+    fixture_dir = os.environ.get("SEO_SERP_FIXTURES")
+    if fixture_dir:
+        return fixture_search_provider(fixture_dir)
+    return None
+
+def fetch_page(url):
+    """النسخة المتزامنة من afetch_page."""
+    return run_sync(afetch_page(url))
+
+async def afetch_page(url):
+    """تحميل صفحة منافس واحدة عبر عميل HTTP المشترك. يعيد None عند الفشل."""
+    import httpx
+    
+    try:
+        async with host_slot(url, CONNECTIONS_PER_HOST):
+            response = await request("GET", url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
+        if response.status_code != 200:
+            return None
+        if "html" not in response.headers.get("Content-Type", "text/html"):
+            return None
+        return response.text
+    except (httpx.HTTPError, httpx.InvalidURL):
+        return None
+
+def fetch_page_conditional(url):
+    """النسخة المتزامنة من afetch_page_conditional."""
+    return run_sync(afetch_page_conditional(url))
+
+async def afetch_page_conditional(url):
+    """
+    تحميل صفحة منافس بطلب شرطي (If-None-Match / If-Modified-Since) من آخر لقطة محفوظة.
+    يعيد {"status": not_modified/unchanged/changed/failed, ...}: الصفحة التي لم تتغير تعيد
+    ملخصها المحفوظ في "summary"، والمتغيرة تعيد "html" و"validators" لتحليلها وحفظها.
+    عدد الطلبات المتزامنة لكل موقع محدود بـ CONNECTIONS_PER_HOST، وقراءة اللقطات وكتابتها في thread آخر.
+    """
+    import httpx
+    
+    page = await asyncio.to_thread(get_page, url)
+    try:
+        async with host_slot(url, CONNECTIONS_PER_HOST):
+            response = await request("GET", url, headers=dict(HEADERS, **conditional_headers(page)), timeout=REQUEST_TIMEOUT)
+    except (httpx.HTTPError, httpx.InvalidURL):
+        return {"status": "failed"}
+    validators = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+    if response.status_code == 304 and page:
+        await asyncio.to_thread(mark_checked, url, validators)
+        return {"status": "not_modified", "summary": page["summary"]}
+    if response.status_code != 200 or "html" not in response.headers.get("Content-Type", "text/html"):
+        return {"status": "failed"}
+    html = response.text
+    if page and page["content_hash"] == content_hash(html):
+        # خادم لا يدعم الطلبات الشرطية لكن المحتوى نفسه: لا حاجة لإعادة التحليل
+        await asyncio.to_thread(mark_checked, url, validators)
+        return {"status": "unchanged", "summary": page["summary"]}
+    return {"status": "changed", "html": html, "validators": validators}
+
+async def afetch_pages_conditional(urls):
+    """تحميل كل الصفحات معاً على الحلقة المشتركة؛ النتائج بنفس ترتيب urls."""
+    return await asyncio.gather(*(afetch_page_conditional(url) for url in urls))
+
+def parse_competitor_page(html):
+    """
+    استخراج عدد الكلمات الفعلي وعناوين H1–H3 من صفحة منافس.
+    دالة مستقلة على مستوى الوحدة حتى يمكن تشغيلها داخل ProcessPoolExecutor.
+    """
+    from bs4 import BeautifulSoup
+    
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript", "nav", "header", "footer", "aside", "form"]):
+        tag.decompose()
+    
+    outline = []
+    for element in soup.find_all(["h1", "h2", "h3"]):
+        text = " ".join(element.get_text(" ", strip=True).split())
+        if text:
+            outline.append({"level": int(element.name[1]), "text": text})
+    
+    body = soup.body or soup
+    return {
+        "length": len(body.get_text(" ", strip=True).split()),
+        "h1": next((h["text"] for h in outline if h["level"] == 1), ""),
+        "headings": [h["text"] for h in outline if h["level"] > 1],
+        "outline": outline,
+    }
+
+def _get_parse_pool():
+    global _parse_pool
+    with _lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=pool_context())
+        return _parse_pool
+
+def _parse_pages(pages):
+    """تحليل الصفحات في مجموعة عمليات (process pool)، مع الرجوع للتحليل المباشر عند تعطلها."""
+    global _parse_pool
+    try:
+        return list(_get_parse_pool().map(parse_competitor_page, pages))
+    except (BrokenProcessPool, OSError):
+        with _lock:
+            _parse_pool = None
+        return [parse_competitor_page(page) for page in pages]
+
+@instrumented("crawl")
+def fetch_real_competitors(keyword, api_key=None, provider=None, num_results=MAX_COMPETITORS):
     """
     دالة لجلب نتائج حقيقية من محرك البحث.
-    يمكن استخدام Serper API أو Google Search API.
+    تُحمَّل صفحات النتائج معاً على حلقة الأحداث المشتركة (async_network)، ثم تُحلَّل في مجموعة عمليات
+    لاستخراج عدد الكلمات والعناوين.
     """
-    # هذه دالة نموذجية يمكن تطويرها لاحقاً
-    pass
+    provider = provider or get_search_provider(api_key)
+    if provider is None:
+        return []
+    
+    results = provider(keyword, num_results)
+    missing = [r for r in results if not r.get("html")]
+    if missing:
+        pages = run_sync(afetch_pages_conditional([r["url"] for r in missing]))
+        for result, page in zip(missing, pages):
+            result.update(page)
+    for result in results:
+        # صفحات مزود البحث التي تأتي مع HTML (مثل fixtures) تُقارن ببصمة آخر لقطة أيضاً
+        if result.get("html") and "status" not in result:
+            page = get_page(result["url"])
+            if page and page["content_hash"] == content_hash(result["html"]):
+                result.update(status="unchanged", summary=page["summary"])
+                mark_checked(result["url"])
+    
+    # لا يُحلَّل إلا ما تغيرت بصمته، ويُحفظ كلقطة جديدة
+    changed = [r for r in results if r.get("html") and not r.get("summary")]
+    for result, summary in zip(changed, _parse_pages([r["html"] for r in changed]) if changed else []):
+        result["summary"] = summary
+        try:
+            record_snapshot(result["url"], result["html"], summary, result.get("validators"))
+        except Exception as e:
+            print(f"خطأ في حفظ لقطة الصفحة {result['url']}: {e}")
+    for result in results:
+        if result.get("summary"):
+            record_lookup("page_snapshot", result.get("status") in ("not_modified", "unchanged"))
+    
+    competitors = []
+    for result in results:
+        summary = result.get("summary")
+        if not summary or not summary["length"]:
+            continue
+        competitors.append({
+            "title": result.get("title") or summary["h1"],
+            "url": result["url"],
+            "length": summary["length"],
+            "headings": summary["headings"],
+            "outline": summary["outline"],
+        })
+    return competitors
@@ -1,14 +1,202 @@
-import openai
-from openai import OpenAI
+import os
 import re
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from async_network import run_sync, get_async_openai
+from cache_handler import acached_call, cache_get, cache_set, cache_has, make_key
+from seo_metrics import analyze_seo_metrics, count_words
+from metrics import atimed, note_usage, note_retry, record_event, stage_latency_percentile
+from rate_limiter import call_with_rate_limit, acall_with_rate_limit, settle_usage
+from semantic_cache import lookup_outline, remember_outline
 
-def generate_outline(analysis_results, api_key):
+# النموذج الافتراضي للمقال والأقسام، والنموذج الأسرع المقابل له للمهام الخفيفة
+DEFAULT_MODEL = "gpt-4.1-mini"
+FAST_MODELS = {"gpt-4.1-mini": "gpt-4.1-nano"}
+# المهام القصيرة التي لا تحتاج النموذج الأكبر
+CHEAP_TASKS = {"outline", "faq", "meta"}
+# ترتيب النماذج البديلة عند فشل النموذج المختار أو انتهاء مهلته
+FALLBACK_ORDER = ["gpt-4.1-mini", "gpt-4.1-nano", "gemini-2.5-flash"]
+# مهلة الطلب الواحد بالثواني قبل التحويل إلى النموذج التالي
+LLM_TIMEOUT = 120
+# أقل عدد من الطلبات المسجلة قبل الاعتماد على p95 لإطلاق طلب احتياطي
+HEDGE_MIN_SAMPLES = 20
+
+# Gemini عبر واجهته المتوافقة مع OpenAI
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+
+_llm_client = None
+# عملاء OpenAI لكل مزود: إنشاء العميل مكلف (استيراد openai ومجمع اتصالات HTTP)، فيُنشأ مرة واحدة لكل عملية
+_clients = {}
+_clients_lock = threading.Lock()
+_routing = contextvars.ContextVar("llm_routing", default={"model": None, "hedge": False})
+
+def set_llm_client(client):
+    """
+    استبدال عميل النموذج بعميل آخر له نفس واجهة OpenAI
+    (client.chat.completions.create)، مثل FakeLLMClient في القياس والاختبارات.
+    تمرير None يعيد العميل الافتراضي.
+    """
+    global _llm_client
+    _llm_client = client
+
+def get_llm_client(model=None):
+    """العميل المستخدم في استدعاءات النموذج المحدد."""
+    if _llm_client is not None:
+        return _llm_client
+    provider = "gemini" if model and model.startswith("gemini") else "openai"
+    with _clients_lock:
+        client = _clients.get(provider)
+        if client is None:
+            # استيراد openai مكلف، لذا يؤجَّل حتى أول طلب فعلي للنموذج
+            from openai import OpenAI
+            
+            # إعادة المحاولة عند 429 يتولاها rate_limiter حتى يتكيف المعدل المشترك
+            if provider == "gemini":
+                client = OpenAI(api_key=os.environ.get("GEMINI_API_KEY"), base_url=GEMINI_BASE_URL, max_retries=0)
+            else:
+                # استخدام العميل الافتراضي المجهز مسبقاً في البيئة
+                client = OpenAI(max_retries=0)
+            _clients[provider] = client
+        return client
+
+def get_async_llm_client(model=None):
+    """
+    عميل AsyncOpenAI الدائم على حلقة الأحداث المشتركة (async_network) للنموذج المحدد.
+    مع عميل بديل (set_llm_client) تُستخدم واجهته غير المتزامنة client.aio إن وُجدت، وإلا None.
+    """
+    if _llm_client is not None:
+        return getattr(_llm_client, "aio", None)
+    if model and model.startswith("gemini"):
+        return get_async_openai("gemini", api_key=os.environ.get("GEMINI_API_KEY"), base_url=GEMINI_BASE_URL)
+    return get_async_openai("openai")
+
+async def _acreate(model, **kwargs):
+    client = get_async_llm_client(model)
+    if client is None:
+        # عميل بديل بواجهة متزامنة فقط: يُنفَّذ في thread حتى لا تتوقف الحلقة المشتركة
+        return await asyncio.to_thread(get_llm_client(model).chat.completions.create, model=model, **kwargs)
+    return await client.chat.completions.create(model=model, **kwargs)
+
+@contextmanager
+def llm_routing(model=None, hedge=False):
+    """
+    اختيار النموذج لكل استدعاءات التوليد داخل هذا السياق (مثل اختيار المستخدم في الواجهة).
+    hedge=True يطلق طلباً احتياطياً ثانياً إذا تجاوز الطلب الأول زمن p95 المسجل لمرحلته.
+    """
+    token = _routing.set({"model": model, "hedge": hedge})
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+def _model_available(model):
+    if _llm_client is not None or not model.startswith("gemini"):
+        return True
+    return bool(os.environ.get("GEMINI_API_KEY"))
+
+def route_models(task):
+    """
+    النماذج المرشحة لمهمة بالترتيب: النموذج المختار (أو الأسرع للمهام الخفيفة)،
+    ثم البدائل المتاحة عند الفشل.
+    """
+    selected = _routing.get()["model"] or DEFAULT_MODEL
+    primary = FAST_MODELS.get(selected, selected) if task in CHEAP_TASKS else selected
+    fallbacks = [m for m in [selected] + FALLBACK_ORDER if m != primary and _model_available(m)]
+    return list(dict.fromkeys([primary] + fallbacks))
+
+async def _ahedged(stage, model, request):
+    """
+    تنفيذ request()، وإذا تجاوز زمن p95 المسجل للمرحلة والنموذج يُطلق طلب مماثل ثانٍ
+    وتُعتمد أول استجابة ناجحة ويُلغى الآخر. الطلب الاحتياطي يُحتسب كإعادة محاولة في المقاييس.
+    """
+    threshold = await asyncio.to_thread(
+        stage_latency_percentile, f"llm_{stage}", model, 0.95, min_samples=HEDGE_MIN_SAMPLES
+    )
+    if not threshold:
+        return await request()
+    first = asyncio.ensure_future(request())
+    done, _ = await asyncio.wait({first}, timeout=threshold / 1000)
+    if done:
+        return first.result()
+    note_retry()
+    pending = {first, asyncio.ensure_future(request())}
+    error = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return task.result()
+            error = task.exception()
+    raise error
+
+def _completion_inputs(model, temperature, max_tokens, messages):
+    """مدخلات مفتاح الذاكرة المؤقتة لطلب نموذج واحد."""
+    return {"model": model, "temperature": temperature, "max_tokens": max_tokens, "messages": messages}
+
+async def _amodel_completion(stage, messages, model, temperature, max_tokens, force_refresh=False):
+    """
+    استدعاء نموذج واحد مع ذاكرة مؤقتة دائمة مفتاحها بصمة المدخلات
+    (النموذج، الحرارة، الحد الأقصى للرموز، ونص الرسائل كاملاً).
+    يُسجَّل الزمن واستهلاك الرموز والأخطاء في مخزن المقاييس.
+    """
+    def request():
+        return acall_with_rate_limit(model, messages, max_tokens, lambda: _acreate(
+            model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=LLM_TIMEOUT
+        ))
+    
+    async def compute():
+        response = await (_ahedged(stage, model, request) if _routing.get()["hedge"] else request())
+        if response.usage:
+            note_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+        content = response.choices[0].message.content
+        if not content:
+            raise RuntimeError(f"استجابة فارغة من النموذج {model}")
+        return content
+    
+    inputs = _completion_inputs(model, temperature, max_tokens, messages)
+    async with atimed(f"llm_{stage}", model):
+        return await acached_call(stage, inputs, compute, bypass=force_refresh, should_cache=bool)
+
+async def _achat_completion(stage, messages, temperature, max_tokens, force_refresh=False, task=None):
+    """
+    استدعاء نموذج المحادثة عبر طبقة التوجيه: النموذج المناسب للمهمة أولاً،
+    ثم النماذج البديلة بالترتيب عند الخطأ أو انتهاء المهلة.
+    """
+    error = None
+    for model in route_models(task or stage):
+        try:
+            return await _amodel_completion(stage, messages, model, temperature, max_tokens, force_refresh)
+        except Exception as e:
+            print(f"خطأ في النموذج {model}: {e}")
+            error = e
+    raise error
+
+def _chat_completion(stage, messages, temperature, max_tokens, force_refresh=False, task=None):
+    """النسخة المتزامنة من _achat_completion (تنتظر النتيجة من الحلقة المشتركة)."""
+    return run_sync(_achat_completion(stage, messages, temperature, max_tokens, force_refresh, task))
+
+def generate_outline(analysis_results, api_key, force_refresh=False, raise_errors=False):
+    """النسخة المتزامنة من agenerate_outline (للواجهة والعمال)."""
+    return run_sync(agenerate_outline(analysis_results, api_key, force_refresh, raise_errors))
+
+async def agenerate_outline(analysis_results, api_key, force_refresh=False, raise_errors=False):
     """
     توليد مخطط (Outline) تفصيلي بناءً على تحليل المنافسين.
+    force_refresh=True يتجاوز الذاكرة المؤقتة ويعيد التوليد.
+    الكلمات شبه المتطابقة مع كلمة سابقة (semantic_cache) تعيد استخدام مخططها دون طلب جديد
+    إذا لم يكن لنفس المدخلات حرفياً مخطط في الذاكرة المؤقتة.
+    عند الفشل يُعاد نص الخطأ للعرض، أو يُرفع الاستثناء نفسه مع raise_errors=True (خط الإنتاج والعمال).
     """
     try:
-        # استخدام العميل الافتراضي المجهز مسبقاً في البيئة
-        client = OpenAI()
         keyword = analysis_results['keyword']
         common_headings = analysis_results.get('common_headings', [])
         
@@ -29,34 +217,50 @@ def generate_outline(analysis_results, api_key):
         قدم الـ Outline بصيغة منظمة وسهلة القراءة.
         """
         
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[{"role": "user", "content": prompt}],
+        messages = [{"role": "user", "content": prompt}]
+        if not force_refresh:
+            # نفس المدخلات حرفياً (الكلمة والعناوين والنموذج) تُعاد من الذاكرة المؤقتة العادية داخل _achat_completion؛
+            # المخطط الدلالي لكلمة أخرى شبه متطابقة لا يُستخدم إلا عند إخفاقها
+            key = make_key("outline", _completion_inputs(route_models("outline")[0], 0.7, 2000, messages))
+            if not await asyncio.to_thread(cache_has, key):
+                started = time.perf_counter()
+                match = await asyncio.to_thread(lookup_outline, keyword, exclude_same=True)
+                if match:
+                    await asyncio.to_thread(
+                        record_event, "outline", (time.perf_counter() - started) * 1000, model="semantic_cache", cache_hit=True
+                    )
+                    return match["outline"]
+        
+        outline = await _achat_completion(
+            "outline",
+            messages,
             temperature=0.7,
-            max_tokens=2000
+            max_tokens=2000,
+            force_refresh=force_refresh
         )
-        return response.choices[0].message.content
+        await asyncio.to_thread(remember_outline, keyword, outline)
+        return outline
     except Exception as e:
+        if raise_errors:
+            raise
         return f"خطأ في توليد الـ Outline: {str(e)}"
 
-def generate_content(data, api_key):
+SYSTEM_PROMPT = "أنت خبير SEO وكاتب محتوى محترف متخصص في إنشاء محتوى عالي الجودة متوافق مع معايير SEO الحديثة."
+
+def build_content_messages(data):
     """
-    توليد مقال احترافي متوافق مع SEO.
+    تحضير رسائل المحادثة لتوليد المقال الكامل (مشتركة بين الوضع العادي ووضع البث).
     """
-    try:
-        # استخدام العميل الافتراضي المجهز مسبقاً في البيئة
-        client = OpenAI()
-        
-        # تحضير بيانات الروابط
-        anchors_text = ""
-        if data.get('anchors'):
-            anchors_list = []
-            for anchor in data['anchors']:
-                if anchor.get('text') and anchor.get('url'):
-                    anchors_list.append(f"'{anchor['text']}' -> {anchor['url']}")
-            anchors_text = ", ".join(anchors_list)
-        
-        prompt = f"""
+    # تحضير بيانات الروابط
+    anchors_text = ""
+    if data.get('anchors'):
+        anchors_list = []
+        for anchor in data['anchors']:
+            if anchor.get('text') and anchor.get('url'):
+                anchors_list.append(f"'{anchor['text']}' -> {anchor['url']}")
+        anchors_text = ", ".join(anchors_list)
+    
+    prompt = f"""
         أنت كاتب محتوى SEO محترف. اكتب مقالاً احترافياً متوافقاً مع معايير SEO الحديثة.
         
         بيانات المقال:
@@ -83,19 +287,31 @@ def generate_content(data, api_key):
         
         قدم المقال بصيغة HTML جاهزة للنشر.
         """
-        
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "أنت خبير SEO وكاتب محتوى محترف متخصص في إنشاء محتوى عالي الجودة متوافق مع معايير SEO الحديثة."},
-                {"role": "user", "content": prompt}
-            ],
+    
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def generate_content(data, api_key, force_refresh=False, raise_errors=False):
+    """النسخة المتزامنة من agenerate_content (للواجهة والعمال)."""
+    return run_sync(agenerate_content(data, api_key, force_refresh, raise_errors))
+
+async def agenerate_content(data, api_key, force_refresh=False, raise_errors=False):
+    """
+    توليد مقال احترافي متوافق مع SEO.
+    force_refresh=True يتجاوز الذاكرة المؤقتة ويعيد التوليد.
+    raise_errors=True يرفع الاستثناء بدلاً من إعادة مقال يحمل رسالة الخطأ.
+    """
+    try:
+        content = await _achat_completion(
+            "content",
+            build_content_messages(data),
             temperature=0.7,
-            max_tokens=4000
+            max_tokens=4000,
+            force_refresh=force_refresh
         )
-        
-        content = response.choices[0].message.content
-        word_count = len(content.split())
+        word_count = count_words(content)
         
         # استخراج Meta Description إذا كانت موجودة
         meta_desc = extract_meta_description(content)
@@ -107,20 +323,487 @@ def generate_content(data, api_key):
             "meta_description": meta_desc
         }
     except Exception as e:
+        if raise_errors:
+            raise
+        return {
+            "html": f"<p>خطأ في توليد المقال: {str(e)}</p>",
+            "word_count": 0,
+            "title": data['main_keyword'],
+            "meta_description": ""
+        }
+
+class StreamingArticleStats:
+    """
+    إحصائيات المقال محسوبة تدريجياً أثناء البث، دون إعادة فحص النص كاملاً:
+    عدد الكلمات (خارج وسوم HTML)، تكرار الكلمة المفتاحية، عدد أقسام H2،
+    واستخراج Meta Description بمجرد ظهورها.
+    """
+    
+    META_MARKER = "meta description"
+    
+    def __init__(self, keyword):
+        self.keyword = " ".join(keyword.lower().split())
+        self.word_count = 0
+        self.keyword_count = 0
+        self.sections = 0
+        self.meta_description = ""
+        self._in_tag = False
+        self._tag = ""
+        self._in_word = False
+        self._text_tail = ""
+        self._meta_state = "search"
+        self._meta_tail = ""
+        self._meta_in_tag = False
+    
+    def feed(self, chunk):
+        """تحديث الإحصائيات بجزء جديد من النص المبثوث."""
+        visible = []
+        for ch in chunk:
+            if self._in_tag:
+                if ch == ">":
+                    self._in_tag = False
+                    if self._tag.lower().startswith("/h2"):
+                        self.sections += 1
+                else:
+                    self._tag += ch
+                continue
+            if ch == "<":
+                self._in_tag = True
+                self._tag = ""
+                ch = " "
+            if ch.isspace():
+                if self._in_word:
+                    visible.append(" ")
+                self._in_word = False
+            else:
+                if not self._in_word:
+                    self.word_count += 1
+                self._in_word = True
+                visible.append(ch.lower())
+        self._count_keyword("".join(visible))
+        self._feed_meta(chunk)
+    
+    def _count_keyword(self, text):
+        if not self.keyword or not text:
+            return
+        # الاحتفاظ بذيل أقصر من الكلمة المفتاحية يضمن احتساب كل تطابق مرة واحدة فقط
+        window = self._text_tail + text
+        self.keyword_count += window.count(self.keyword)
+        self._text_tail = window[-(len(self.keyword) - 1):] if len(self.keyword) > 1 else ""
+    
+    def _feed_meta(self, chunk):
+        if self._meta_state == "done":
+            return
+        if self._meta_state == "search":
+            window = self._meta_tail + chunk
+            index = window.lower().find(self.META_MARKER)
+            if index < 0:
+                self._meta_tail = window[-(len(self.META_MARKER) - 1):]
+                return
+            self._meta_state = "skip"
+            chunk = window[index + len(self.META_MARKER):]
+        for ch in chunk:
+            if self._meta_in_tag:
+                self._meta_in_tag = ch != ">"
+                continue
+            if self._meta_state == "skip":
+                if ch == ":" or ch.isspace():
+                    continue
+                if ch == "<":
+                    self._meta_in_tag = True
+                    continue
+                self._meta_state = "capture"
+            if ch in "\n<":
+                self._meta_state = "done"
+                self.meta_description = self.meta_description.strip()
+                return
+            self.meta_description += ch
+    
+    @property
+    def density(self):
+        return round(self.keyword_count / self.word_count * 100, 2) if self.word_count else 0
+    
+    def snapshot(self):
+        return {
+            "word_count": self.word_count,
+            "keyword_count": self.keyword_count,
+            "density": self.density,
+            "sections": self.sections,
+            "meta_description": self.meta_description.strip(),
+        }
+
+def _model_completion_stream(stage, messages, model, temperature, max_tokens, force_refresh=False):
+    """
+    نسخة البث من _model_completion: تُخرج أجزاء النص فور وصولها.
+    عند إغلاق المولد قبل النهاية (إلغاء) يُغلق الاتصال فيتوقف احتساب بقية الرموز.
+    النص الكامل فقط هو ما يُخزَّن في الذاكرة المؤقتة.
+    """
+    key = make_key(stage, _completion_inputs(model, temperature, max_tokens, messages))
+    started = time.perf_counter()
+    if not force_refresh:
+        cached = cache_get(stage, key)
+        if cached is not None:
+            record_event(f"llm_{stage}", (time.perf_counter() - started) * 1000, model=model, cache_hit=True)
+            yield cached
+            return
+    
+    parts = []
+    usage = None
+    status, error = "ok", None
+    try:
+        client = get_llm_client(model)
+        stream = call_with_rate_limit(model, messages, max_tokens, lambda: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=LLM_TIMEOUT
+        ))
+        try:
+            for event in stream:
+                if event.usage:
+                    usage = event.usage
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            stream.close()
+    except GeneratorExit:
+        status = "cancelled"
+        raise
+    except Exception as e:
+        status, error = "error", str(e)
+        raise
+    finally:
+        settle_usage(model, messages, max_tokens, usage)
+        if usage:
+            # خارج أي حدث مفتوح: يُضاف الاستهلاك إلى مجموع المقال الحالي فقط
+            note_usage(usage.prompt_tokens, usage.completion_tokens)
+        # البث يمتد عبر عدة yield، لذا يُسجَّل الحدث يدوياً بدلاً من timed()
+        record_event(
+            f"llm_{stage}",
+            (time.perf_counter() - started) * 1000,
+            status=status,
+            model=model,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            error=error
+        )
+    if parts:
+        cache_set(stage, key, "".join(parts))
+
+def _chat_completion_stream(stage, messages, temperature, max_tokens, force_refresh=False, task=None):
+    """
+    البث عبر طبقة التوجيه: يُجرَّب النموذج البديل التالي إذا فشل البث قبل وصول أول جزء،
+    أما بعد بدء الإخراج فيُرفع الخطأ كما هو حتى لا يختلط نصّا نموذجين.
+    """
+    error = None
+    for model in route_models(task or stage):
+        emitted = False
+        try:
+            for delta in _model_completion_stream(stage, messages, model, temperature, max_tokens, force_refresh):
+                emitted = True
+                yield delta
+            return
+        except Exception as e:
+            if emitted:
+                raise
+            print(f"خطأ في النموذج {model}: {e}")
+            error = e
+    raise error
+
+def generate_content_stream(data, api_key, force_refresh=False):
+    """
+    توليد المقال في وضع البث (streaming).
+    يُخرج أحداثاً متتالية:
+    - {"type": "delta", "text": ..., "stats": {...}} لكل جزء جديد من النص.
+    - {"type": "done", "article": {...}} في النهاية بنفس بنية generate_content.
+    - {"type": "error", "article": {...}} عند الفشل.
+    """
+    stats = StreamingArticleStats(data['main_keyword'])
+    parts = []
+    try:
+        for delta in _chat_completion_stream(
+            "content",
+            build_content_messages(data),
+            temperature=0.7,
+            max_tokens=4000,
+            force_refresh=force_refresh
+        ):
+            parts.append(delta)
+            stats.feed(delta)
+            yield {"type": "delta", "text": delta, "stats": stats.snapshot()}
+    except Exception as e:
+        yield {
+            "type": "error",
+            "article": {
+                "html": f"<p>خطأ في توليد المقال: {str(e)}</p>",
+                "word_count": 0,
+                "title": data['main_keyword'],
+                "meta_description": ""
+            }
+        }
+        return
+    
+    yield {
+        "type": "done",
+        "article": {
+            "html": "".join(parts),
+            "word_count": stats.word_count,
+            "title": data['main_keyword'],
+            "meta_description": stats.meta_description.strip(),
+            "keyword_density": stats.density
+        }
+    }
+
+_MD_HEADING_RE = re.compile(r'^(#{1,6})\s*(.+)$')
+_LEVEL_TAG_RE = re.compile(r'^\(?\s*H([1-3])\s*\)?\s*[:：\-–]?\s*(.*)$', re.IGNORECASE)
+_NUMBERED_RE = re.compile(r'^(\d+(?:\.\d+)*)[.)]?\s+(.+)$')
+_FAQ_RE = re.compile(r'الأسئلة الشائعة|أسئلة شائعة|FAQ', re.IGNORECASE)
+_INTRO_OUTRO_RE = re.compile(r'^(ال)?(مقدمة|خاتمة)|^(introduction|conclusion)', re.IGNORECASE)
+
+def _clean_heading(text):
+    text = text.replace("**", "").replace("__", "").strip()
+    return text.strip(" :：-–").strip()
+
+def parse_outline_sections(outline):
+    """
+    تحويل المخطط النصي الناتج من generate_outline إلى بنية أقسام:
+    {"title": عنوان H1, "sections": [{"heading", "subheadings", "is_faq"}]}.
+    يدعم عناوين Markdown (#, ##)، والوسوم الصريحة (H1: / H2:)، والترقيم (1. / 1.1).
+    """
+    title = ""
+    sections = []
+    for raw_line in (outline or "").splitlines():
+        indent = len(raw_line) - len(raw_line.lstrip())
+        line = raw_line.strip()
+        if not line:
+            continue
+        level = None
+        explicit = False
+        bullet = line[0] in "-*•" and not line.startswith("**")
+        if bullet:
+            line = line[1:].strip()
+        
+        match = _MD_HEADING_RE.match(line)
+        if match:
+            level = min(len(match.group(1)), 3)
+            explicit = True
+            line = match.group(2).strip()
+        line = line.replace("**", "").strip()
+        
+        match = _NUMBERED_RE.match(line)
+        if match:
+            line = match.group(2).strip()
+            if level is None:
+                level = 3 if "." in match.group(1) or indent else 2
+        
+        match = _LEVEL_TAG_RE.match(line)
+        if match:
+            level = int(match.group(1))
+            explicit = True
+            line = match.group(2)
+        
+        if level is None and (bullet or indent):
+            level = 3
+        # الأسئلة المرقمة داخل قسم FAQ أسئلة فرعية وليست أقساماً جديدة
+        if not explicit and level == 2 and sections and sections[-1]["is_faq"]:
+            level = 3
+        heading = _clean_heading(line)
+        if not heading or level is None:
+            continue
+        
+        if level == 1:
+            title = title or heading
+        elif level == 2:
+            sections.append({"heading": heading, "subheadings": [], "is_faq": bool(_FAQ_RE.search(heading))})
+        elif sections:
+            sections[-1]["subheadings"].append(heading)
+    return {"title": title, "sections": sections}
+
+def _strip_fences(text):
+    """إزالة أسوار ```html التي يضيفها النموذج أحياناً حول HTML."""
+    text = text.strip()
+    text = re.sub(r'^```[a-zA-Z]*\s*', '', text)
+    return re.sub(r'\s*```$', '', text)
+
+def _section_context(data, outline_text):
+    """السياق المشترك المرسل مع كل طلب قسم حتى يبقى المقال متسقاً."""
+    return f"""
+        بيانات المقال المشتركة:
+        - الكلمة المفتاحية الرئيسية: "{data['main_keyword']}"
+        - الدومين المستهدف: {data['target_domain']}
+        - اللغة: {data['language']}
+        - المخطط الكامل للمقال (للسياق فقط):
+        {outline_text}
+        """
+
+def _section_messages(data, outline_text, task):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": _section_context(data, outline_text) + task}
+    ]
+
+def plan_article(data):
+    """
+    تخطيط المقال من المخطط: العنوان، أقسام المتن (مع عناوينها الفرعية ونصوص الربط
+    والكلمات المرتبطة الموزعة عليها)، وقسم الأسئلة الشائعة إن وُجد.
+    """
+    parsed = parse_outline_sections(data.get('outline', ''))
+    # المقدمة والخاتمة تُكتبان في طلبين مستقلين، لذا تُستبعدان من أقسام المتن
+    body_sections = [
+        s for s in parsed["sections"]
+        if not s["is_faq"] and not _INTRO_OUTRO_RE.match(s["heading"])
+    ]
+    
+    # توزيع نصوص الربط والكلمات المرتبطة على الأقسام حتى يُستخدم كل منها مرة واحدة
+    anchors = [a for a in data.get('anchors') or [] if a.get('text') and a.get('url')]
+    related = [k.strip() for k in re.split(r'[,،]', data.get('related_keywords') or '') if k.strip()]
+    sections = [dict(s, anchors=[], related=[]) for s in body_sections]
+    for i, anchor in enumerate(anchors if sections else []):
+        sections[i % len(sections)]["anchors"].append(anchor)
+    for i, phrase in enumerate(related if sections else []):
+        sections[i % len(sections)]["related"].append(phrase)
+    
+    return {
+        "title": parsed["title"] or data['main_keyword'],
+        "sections": sections,
+        "faq": next((s for s in parsed["sections"] if s["is_faq"]), None),
+    }
+
+def build_section_tasks(data, plan):
+    """طلبات أجزاء المقال: {اسم الجزء: (نص الطلب، الحد الأقصى للرموز)}."""
+    keyword = data['main_keyword']
+    tasks = {
+        "intro": (f"""
+        اكتب مقدمة المقال بعنوان "{plan['title']}" فقط (70-100 كلمة) تشمل الكلمة المفتاحية بشكل طبيعي.
+        أعد فقرات HTML (<p>) فقط بدون أي عناوين.
+        """, 400),
+        "closing": (f"""
+        اكتب خاتمة المقال (80-120 كلمة) تتضمن CTA (دعوة للإجراء) طبيعية للدومين {data['target_domain']}.
+        أعد HTML يبدأ بعنوان <h2>الخاتمة</h2> ثم الفقرات.
+        """, 500),
+        "meta": (f"""
+        اكتب Meta Description واحدة للمقال (150-160 حرف) تحتوي على الكلمة المفتاحية "{keyword}".
+        أعد النص فقط بدون أي تنسيق أو علامات تنصيص.
+        """, 200),
+    }
+    faq_questions = ""
+    if plan["faq"] and plan["faq"]["subheadings"]:
+        faq_questions = "الأسئلة المقترحة: " + " | ".join(plan["faq"]["subheadings"])
+    tasks["faq"] = (f"""
+        اكتب قسم الأسئلة الشائعة للمقال: 12 سؤالاً مع إجابة مختصرة (40-60 كلمة) لكل سؤال.
+        {faq_questions}
+        أعد HTML يبدأ بعنوان <h2>الأسئلة الشائعة</h2> ثم كل سؤال في <h3> وإجابته في <p>.
+        """, 2000)
+    for i, section in enumerate(plan["sections"]):
+        anchors_text = ", ".join(f"'{a['text']}' -> {a['url']}" for a in section["anchors"]) or "لا يوجد"
+        tasks[f"section-{i + 1}"] = (f"""
+        اكتب محتوى القسم "{section['heading']}" فقط من المقال.
+        - العناوين الفرعية H3 لهذا القسم: {', '.join(section['subheadings']) or 'حسب الحاجة'}
+        - ابدأ بمقدمة تمهيدية 30-40 كلمة توضح محتوى القسم.
+        - لا يقل القسم عن 250 كلمة.
+        - الكلمات المفتاحية المرتبطة المطلوبة في هذا القسم (مرة واحدة لكل منها): {', '.join(section['related']) or 'لا يوجد'}
+        - نصوص الربط المطلوبة في هذا القسم كروابط <a>: {anchors_text}
+        - إذا وجد مصطلح تقني عربي، اذكر المصطلح الإنجليزي بجانبه بين قوسين.
+        - لا تذكر أي منافسين، ولا تكتب عنوان H2 للقسم، ولا مقدمة أو خاتمة للمقال.
+        أعد HTML فقط (p, h3, ul, ol, li, strong, em, a).
+        """, 1500)
+    return tasks
+
+def run_section_tasks(data, tasks, max_workers=8, force_refresh=False, stage="section"):
+    """النسخة المتزامنة من arun_section_tasks (للواجهة والعمال)."""
+    return run_sync(arun_section_tasks(data, tasks, max_workers, force_refresh, stage))
+
+async def arun_section_tasks(data, tasks, max_workers=8, force_refresh=False, stage="section"):
+    """
+    تنفيذ طلبات الأجزاء بالتوازي بسياق مشترك. يعيد {اسم الجزء: النص}.
+    max_workers: أقصى عدد طلبات متزامنة لهذا المقال.
+    stage: اسم المرحلة في الذاكرة المؤقتة والمقاييس (مثل "repair" لطلبات الإصلاح).
+    """
+    outline_text = data['outline']
+    slots = asyncio.Semaphore(max(1, max_workers))
+    
+    async def run(name):
+        task, max_tokens = tasks[name]
+        async with slots:
+            return name, await _achat_completion(
+                stage,
+                _section_messages(data, outline_text, task),
+                temperature=0.7,
+                max_tokens=max_tokens,
+                force_refresh=force_refresh,
+                task=name
+            )
+    
+    # المهام ترث سياق المستدعي، فتُنسب مقاييس كل قسم إلى نفس المقال
+    return dict(await asyncio.gather(*(run(name) for name in tasks)))
+
+def assemble_article(data, plan, parts):
+    """تجميع الأجزاء في مستند HTML واحد بمعرّفات ثابتة للأقسام (section-N و faq)."""
+    title = plan["title"]
+    meta_desc = " ".join(_strip_fences(parts["meta"]).strip('"\'').split())
+    toc = "".join(
+        f'<li><a href="#section-{i + 1}">{section["heading"]}</a></li>'
+        for i, section in enumerate(plan["sections"])
+    )
+    html_parts = [f"<h1>{title}</h1>", _strip_fences(parts["intro"]), f'<nav class="toc"><ul>{toc}</ul></nav>']
+    for i, section in enumerate(plan["sections"]):
+        body = re.sub(r'<h[12][^>]*>.*?</h[12]>', '', _strip_fences(parts[f"section-{i + 1}"]), flags=re.DOTALL)
+        html_parts.append(f'<h2 id="section-{i + 1}">{section["heading"]}</h2>\n{body.strip()}')
+    html_parts.append(_strip_fences(parts["faq"]).replace("<h2>", '<h2 id="faq">', 1))
+    html_parts.append(_strip_fences(parts["closing"]))
+    html_parts.append(f"<p><strong>Meta Description:</strong> {meta_desc}</p>")
+    content = "\n".join(html_parts)
+    
+    return {
+        "html": content,
+        "word_count": count_words(content),
+        "title": data['main_keyword'],
+        "meta_description": meta_desc
+    }
+
+def generate_content_sections(data, api_key, max_workers=8, force_refresh=False, raise_errors=False):
+    """النسخة المتزامنة من agenerate_content_sections (للواجهة والعمال)."""
+    return run_sync(agenerate_content_sections(data, api_key, max_workers, force_refresh, raise_errors))
+
+async def agenerate_content_sections(data, api_key, max_workers=8, force_refresh=False, raise_errors=False):
+    """
+    توليد المقال الطويل بالتوازي: المقدمة، كل قسم H2، الأسئلة الشائعة، الخاتمة
+    والـ Meta Description كطلبات مستقلة متزامنة بسياق مشترك، ثم تجميعها في مستند HTML واحد.
+    الزمن الكلي ≈ زمن أبطأ قسم، ولا يُقتطع المقال بسبب حد الرموز لاستجابة واحدة.
+    يعود إلى generate_content إذا تعذر استخراج أقسام H2 من المخطط.
+    raise_errors=True يرفع الاستثناء بدلاً من إعادة مقال يحمل رسالة الخطأ.
+    """
+    plan = plan_article(data)
+    if not plan["sections"]:
+        return await agenerate_content(data, api_key, force_refresh=force_refresh, raise_errors=raise_errors)
+    
+    try:
+        parts = await arun_section_tasks(data, build_section_tasks(data, plan), max_workers, force_refresh)
+    except Exception as e:
+        if raise_errors:
+            raise
         return {
             "html": f"<p>خطأ في توليد المقال: {str(e)}</p>",
             "word_count": 0,
             "title": data['main_keyword'],
             "meta_description": ""
         }
+    return assemble_article(data, plan, parts)
 
 def extract_meta_description(content):
     """
     استخراج Meta Description من المحتوى.
     """
     try:
-        # البحث عن Meta Description في المحتوى
-        match = re.search(r'Meta Description[:\s]*([^\n<]+)', content, re.IGNORECASE)
+        # البحث عن Meta Description في المحتوى، مع تخطي الوسوم وعلامات Markdown بعد العنوان (</strong> أو **)
+        match = re.search(r'Meta Description[\s*_]*:?[\s*_]*(?:</[^>]+>\s*)*:?\s*([^\n<]+)', content, re.IGNORECASE)
         if match:
             return match.group(1).strip()
         return ""
@@ -130,13 +813,10 @@ def extract_meta_description(content):
 def count_keyword_density(content, keyword):
     """
     حساب كثافة الكلمة المفتاحية في المحتوى.
+    تُحسب على النص المرئي فقط (بعد إزالة وسوم HTML وتوحيد الكتابة العربية)،
+    وتدعم العبارات متعددة الكلمات.
     """
     try:
-        words = content.lower().split()
-        keyword_lower = keyword.lower()
-        keyword_count = sum(1 for word in words if keyword_lower in word)
-        total_words = len(words)
-        density = (keyword_count / total_words * 100) if total_words > 0 else 0
-        return round(density, 2)
+        return analyze_seo_metrics(content, keyword)["density"]
     except:
         return 0
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+_WORDS = (
+    "المحتوى", "الجودة", "الأداء", "التجربة", "المستخدم", "السعر", "المميزات", "الاختيار",
+    "التقنية", "الدليل", "المقارنة", "النصائح", "الخيارات", "الفوائد", "التفاصيل", "السوق",
+)
+
+
+def _estimate_tokens(text):
+    # تقدير تقريبي: أربعة أحرف لكل رمز
+    return max(1, len(text) // 4)
+
+
+class _FakeStream:
+    """تدفق أجزاء بنفس شكل أحداث OpenAI، مع توزيع زمن التوليد على الأجزاء."""
+
+    def __init__(self, text, usage, delay, chunk_size=40):
+        self._chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        self._usage = usage
+        self._delay = delay / max(1, len(self._chunks))
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if self.closed:
+                return
+            if self._delay:
+                time.sleep(self._delay)
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))],
+                usage=None,
+            )
+        yield SimpleNamespace(choices=[], usage=self._usage)
+
+    def close(self):
+        self.closed = True
+
+
+class _FakeCompletions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def _respond(self, model, messages, max_tokens):
+        owner = self._owner
+        prompt = "\n".join(m["content"] for m in messages)
+        seed = int(hashlib.sha256(f"{model}|{prompt}".encode("utf-8")).hexdigest()[:16], 16)
+        rng = random.Random(seed)
+        text = owner.render(prompt, rng, max_tokens)
+        usage = SimpleNamespace(
+            prompt_tokens=_estimate_tokens(prompt),
+            completion_tokens=_estimate_tokens(text),
+            total_tokens=_estimate_tokens(prompt) + _estimate_tokens(text),
+        )
+        delay = owner.latency + usage.completion_tokens / owner.tokens_per_second if owner.tokens_per_second else owner.latency
+        with owner._lock:
+            owner.calls += 1
+        return text, usage, delay
+
+    def create(self, model, messages, temperature=None, max_tokens=None, stream=False, stream_options=None, **kwargs):
+        text, usage, delay = self._respond(model, messages, max_tokens)
+        if stream:
+            return _FakeStream(text, usage if stream_options else None, delay)
+        if delay:
+            time.sleep(delay)
+        return _completion(text, usage)
+
+
+class _FakeAsyncCompletions(_FakeCompletions):
+    """نفس الاستجابات بواجهة AsyncOpenAI: الانتظار بـ asyncio.sleep دون حجز thread."""
+
+    async def create(self, model, messages, temperature=None, max_tokens=None, **kwargs):
+        text, usage, delay = self._respond(model, messages, max_tokens)
+        if delay:
+            await asyncio.sleep(delay)
+        return _completion(text, usage)
+
+
+def _completion(text, usage):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=usage,
+    )
+
+
+class FakeLLMClient:
+    """
+    بديل محلي حتمي لعميل OpenAI بنفس الواجهة (chat.completions.create، وaio لواجهة AsyncOpenAI):
+    نفس المدخلات تعطي نفس المخرجات دائماً، مع زمن استجابة وحجم مخرجات قابلين للضبط.
+    latency: زمن ثابت لكل طلب بالثواني.
+    tokens_per_second: سرعة التوليد (0 لتعطيلها).
+    article_words: عدد كلمات المقال المولد.
+    """
+
+    def __init__(self, latency=0.05, tokens_per_second=0, article_words=2500, sections=8):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.article_words = article_words
+        self.sections = sections
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+        # نسخة غير متزامنة بنفس شكل AsyncOpenAI (client.aio.chat.completions.create)
+        self.aio = SimpleNamespace(chat=SimpleNamespace(completions=_FakeAsyncCompletions(self)))
+
+    def _sentence(self, rng, words):
+        return " ".join(rng.choice(_WORDS) for _ in range(words)) + "."
+
+    def render(self, prompt, rng, max_tokens):
+        """توليد نص حتمي يناسب نوع الطلب (مخطط، قسم، Meta Description، أو مقال كامل)."""
+        if "Outline" in prompt:
+            lines = ["# H1: عنوان المقال"]
+            for i in range(1, self.sections + 1):
+                lines.append(f"## {i}. القسم {i}")
+                lines.append(f"### {i}.1 فرع {i}")
+            lines.append("## الأسئلة الشائعة")
+            lines.extend(f"{q}. سؤال رقم {q}؟" for q in range(1, 13))
+            return "\n".join(lines)
+        if "Meta Description واحدة" in prompt:
+            keyword = re.search(r'الكلمة المفتاحية "([^"]+)"', prompt)
+            prefix = f"{keyword.group(1)} " if keyword else ""
+            return (prefix + self._sentence(rng, 20))[:158]
+        if "أعد كتابة" in prompt:
+            return self._repair(prompt, rng)
+        if "اكتب محتوى القسم" in prompt or "اكتب مقدمة" in prompt or "اكتب خاتمة" in prompt or "الأسئلة الشائعة للمقال" in prompt:
+            return "".join(f"<p>{self._sentence(rng, 25)}</p>" for _ in range(max(1, self.article_words // (25 * self.sections))))
+        per_section = max(1, self.article_words // self.sections)
+        parts = ["<h1>عنوان المقال</h1>", f"<p>{self._sentence(rng, 80)}</p>"]
+        for i in range(1, self.sections + 1):
+            parts.append(f"<h2>القسم {i}</h2>")
+            parts.extend(f"<p>{self._sentence(rng, 25)}</p>" for _ in range(max(1, per_section // 25)))
+        parts.append(f"<p><strong>Meta Description:</strong> {self._sentence(rng, 20)[:158]}</p>")
+        return "\n".join(parts)
+
+    def _repair(self, prompt, rng):
+        """
+        جزء مُصلَح (seo_validator): يُبقي المحتوى الحالي للقسم إن أُرسل ويضيف إليه فقرات
+        تحقق الطول المطلوب والروابط والكلمات المطلوبة في التعليمات.
+        """
+        target = re.search(r'(\d+) كلمة على الأقل', prompt)
+        bounds = re.search(r'\((\d+)-(\d+) كلمة\)', prompt)
+        if target:
+            words = int(target.group(1)) + 10
+        elif bounds:
+            words = (int(bounds.group(1)) + int(bounds.group(2))) // 2
+        else:
+            words = 200
+        current = re.search(r'المحتوى الحالي للقسم:\s*(.*?)\s*لا تكتب عنوان', prompt, re.DOTALL)
+        kept = current.group(1) if current else ""
+        words -= len(re.sub(r'<[^>]+>', ' ', kept).split())
+        inserts = re.findall(r'أضف الرابط (<a href="[^"]*">[^<]*</a>)', prompt)
+        for phrase, times in re.findall(r'أضف الكلمة (?:المفتاحية|المرتبطة) "([^"]+)" (\d+|مرة واحدة)', prompt):
+            inserts.extend([phrase] * (int(times) if times.isdigit() else 1))
+        paragraphs = [kept] if kept else []
+        for i in range(max(0 if kept else 1, -(-words // 25), len(inserts))):
+            extra = f" {inserts[i]}" if i < len(inserts) else ""
+            paragraphs.append(f"<p>{self._sentence(rng, 25)}{extra}</p>")
+        return "".join(paragraphs)
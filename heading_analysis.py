@@ -0,0 +1,137 @@
+"""
+تجميع عناوين المنافسين المتشابهة في مجموعات بدلاً من عدّ التطابق الحرفي.
+
+تُوحَّد العناوين (التشكيل، أشكال الحروف، أداة التعريف، الترقيم)، ثم تُمثَّل بمتجهات
+TF-IDF من مقاطع الحروف (character n-grams) والكلمات في مصفوفة NumPy واحدة، ويُحسب
+التشابه بين كل العناوين بضرب مصفوفات على دفعات. كل مجموعة يمثلها أكثر عناوينها
+انتشاراً مع عدد المنافسين الذين يغطونها.
+"""
+import re
+
+from seo_metrics import normalize_arabic, tokenize
+
+NGRAM_SIZE = 3
+SIMILARITY_THRESHOLD = 0.5
+# عدد الصفوف في كل دفعة من ضرب المصفوفات (يحد من الذاكرة عند آلاف العناوين)
+BATCH_ROWS = 1024
+
+_NUMBERING_RE = re.compile(r'^[\d\s.\-–):（(]+')
+# مرادفات شائعة في عناوين المقالات العربية تُوحَّد قبل المقارنة
+_SYNONYMS = {
+    "متكرره": "شائعه",
+    "خلاصه": "خاتمه",
+    "ملخص": "خاتمه",
+    "faq": "اسئله شائعه",
+    "faqs": "اسئله شائعه",
+    "introduction": "مقدمه",
+    "conclusion": "خاتمه",
+}
+
+
+def normalize_heading(text):
+    """توحيد العنوان للمقارنة: ترقيم، تشكيل، أشكال الحروف، أداة التعريف، ومرادفات شائعة."""
+    text = _NUMBERING_RE.sub("", normalize_arabic(text or "").strip())
+    words = []
+    for token in tokenize(text):
+        if token.startswith("ال") and len(token) > 3:
+            token = token[2:]
+        words.append(_SYNONYMS.get(token, token))
+    return " ".join(words)
+
+
+def _features(normalized):
+    """مقاطع الحروف الثلاثية لكل كلمة (مع حدودها) إضافة إلى الكلمات نفسها."""
+    features = []
+    for word in normalized.split():
+        padded = f" {word} "
+        features.extend(padded[i:i + NGRAM_SIZE] for i in range(max(1, len(padded) - NGRAM_SIZE + 1)))
+        features.append("w:" + word)
+    return features
+
+
+def vectorize_headings(normalized_headings):
+    """
+    مصفوفة TF-IDF (float32) بصف لكل عنوان، مطبَّعة بطول 1 حتى يكون ضرب الصفوف
+    هو تشابه جيب التمام مباشرة.
+    """
+    import numpy as np
+
+    vocabulary = {}
+    rows, cols = [], []
+    for row, heading in enumerate(normalized_headings):
+        for feature in _features(heading):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(feature, len(vocabulary)))
+    matrix = np.zeros((len(normalized_headings), max(1, len(vocabulary))), dtype=np.float32)
+    if rows:
+        np.add.at(matrix, (np.array(rows), np.array(cols)), 1.0)
+    document_frequency = np.count_nonzero(matrix, axis=0)
+    idf = np.log((1 + len(normalized_headings)) / (1 + document_frequency)).astype(np.float32) + 1.0
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _similarity_neighbors(matrix, threshold):
+    """لكل عنوان: مصفوفة منطقية للعناوين المشابهة له، محسوبة على دفعات من الصفوف."""
+    import numpy as np
+
+    neighbors = np.zeros((matrix.shape[0], matrix.shape[0]), dtype=bool)
+    for start in range(0, matrix.shape[0], BATCH_ROWS):
+        block = matrix[start:start + BATCH_ROWS] @ matrix.T
+        neighbors[start:start + BATCH_ROWS] = block >= threshold
+    return neighbors
+
+
+def cluster_headings(competitors, threshold=SIMILARITY_THRESHOLD, limit=None):
+    """
+    تجميع عناوين كل المنافسين في مجموعات متشابهة.
+    يعيد قائمة مرتبة حسب التغطية: [{"heading", "coverage", "share", "variants"}]،
+    حيث coverage عدد المنافسين الذين يحتوون عنواناً من المجموعة،
+    وheading أكثر صيغ المجموعة انتشاراً.
+    """
+    # numpy يُستورد عند أول تحليل فقط حتى لا يبطئ بدء الواجهة
+    import numpy as np
+
+    # العناوين المتطابقة بعد التوحيد تُدمج أولاً فيبقى حجم المصفوفة صغيراً
+    groups = {}
+    for index, competitor in enumerate(competitors):
+        for heading in competitor.get("headings", []):
+            normalized = normalize_heading(heading)
+            if not normalized:
+                continue
+            group = groups.setdefault(normalized, {"pages": set(), "variants": {}})
+            group["pages"].add(index)
+            group["variants"][heading.strip()] = group["variants"].get(heading.strip(), 0) + 1
+    if not groups:
+        return []
+
+    keys = list(groups)
+    coverage = np.array([len(groups[k]["pages"]) for k in keys])
+    neighbors = _similarity_neighbors(vectorize_headings(keys), threshold)
+
+    # تجميع جشع: الأكثر انتشاراً يصبح قائد مجموعة ويضم كل العناوين المشابهة غير المُجمَّعة بعد
+    order = np.lexsort((np.array([len(k) for k in keys]), -coverage))
+    assigned = np.zeros(len(keys), dtype=bool)
+    clusters = []
+    for leader in order:
+        if assigned[leader]:
+            continue
+        members = np.flatnonzero(neighbors[leader] & ~assigned)
+        assigned[members] = True
+        pages = set().union(*(groups[keys[m]]["pages"] for m in members))
+        variants = {}
+        for m in [leader] + [m for m in members if m != leader]:
+            for text, count in groups[keys[m]]["variants"].items():
+                variants[text] = variants.get(text, 0) + count
+        variants = [text for text, _ in sorted(variants.items(), key=lambda item: -item[1])]
+        clusters.append({
+            "heading": variants[0],
+            "coverage": len(pages),
+            "share": round(len(pages) / len(competitors), 2),
+            "variants": variants[:5],
+        })
+
+    clusters.sort(key=lambda c: (-c["coverage"], -len(c["variants"])))
+    return clusters[:limit] if limit else clusters
@@ -0,0 +1,418 @@
+"""
+طابور مهام دائم (SQLite) مع مجموعة عمال في الخلفية.
+
+تُرسل الواجهة مهام التحليل والمخطط والمقال والتحديث والتصدير عبر submit_job وتتابع حالتها
+ونتائجها الجزئية عبر get_job، فلا تضيع النتائج عند إعادة تشغيل الصفحة، وتتوزع
+المهام على العمال بدلاً من تشغيلها داخل جلسة المتصفح. لتشغيل العمال في عملية مستقلة:
+
+    python job_queue.py --workers 8
+"""
+import argparse
+import contextvars
+import json
+import os
+import socket
+import threading
+import time
+
+from local_store import connect
+from metrics import article_context
+from competitor_analysis import analyze_competitors
+from content_generator import generate_outline, generate_content, generate_content_stream, generate_content_sections, llm_routing
+from storage_handler import save_all_formats
+from article_ledger import record_article
+from wordpress_handler import describe_upload
+from article_refresh import save_version, refresh_article
+from workspace import save_artifact, load_artifact, set_publish_status
+from link_planner import suggest_anchors, index_article
+from seo_validator import repair_article
+
+JOBS_DB = "jobs.sqlite3"
+
+# حالات المهمة
+JOB_STATUS_LABELS = {
+    "queued": "في الانتظار",
+    "running": "قيد التنفيذ",
+    "done": "اكتملت",
+    "failed": "فشلت",
+    "cancelled": "أُلغيت",
+}
+
+POLL_INTERVAL = 0.5
+# المهمة التي لم يحدّث عاملها نبضه خلال هذه المدة تُعاد إلى الطابور (توقف العامل)
+STALE_AFTER = 120
+MAX_ATTEMPTS = 3
+# أقل فاصل بين تحديثات النتائج الجزئية
+PROGRESS_INTERVAL = 0.5
+HEARTBEAT_INTERVAL = 15
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    keyword TEXT,
+    payload TEXT NOT NULL,
+    partial TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id);
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# رقم المهمة التي ينفذها هذا السياق (لنقاط فحص الإلغاء بين المراحل)
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def _db():
+    return connect(JOBS_DB, _SCHEMA)
+
+
+def _row_to_job(row):
+    job = dict(row)
+    for field in ("payload", "partial", "result"):
+        job[field] = json.loads(job[field]) if job[field] else None
+    return job
+
+
+def submit_job(kind, payload):
+    """إضافة مهمة إلى الطابور وإرجاع رقمها."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"نوع مهمة غير معروف: {kind}")
+    cursor = _db().execute(
+        "INSERT INTO jobs (kind, keyword, payload, created_at) VALUES (?, ?, ?, ?)",
+        (kind, payload.get("keyword"), json.dumps(payload, ensure_ascii=False), time.time()),
+    )
+    return cursor.lastrowid
+
+
+def get_job(job_id):
+    """حالة المهمة ونتيجتها الجزئية أو النهائية، أو None إذا لم توجد."""
+    row = _db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(status=None, limit=50):
+    """أحدث المهام (دون الحمولة والنتائج) لعرضها في الواجهة."""
+    sql = "SELECT id, kind, status, keyword, error, created_at, started_at, finished_at FROM jobs"
+    params = []
+    if status:
+        sql += " WHERE status = ?"
+        params.append(status)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    return [dict(row) for row in _db().execute(sql, params)]
+
+
+def cancel_job(job_id):
+    """إلغاء مهمة في الانتظار فوراً، أو طلب إيقاف مهمة قيد التنفيذ عند تحديثها التالي."""
+    _db().execute(
+        "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+        (time.time(), job_id),
+    )
+
+
+def _claim_job(worker):
+    """حجز أقدم مهمة في الانتظار لهذا العامل (بشكل ذري بين العمليات)."""
+    db = _db()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        row = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            db.execute("COMMIT")
+            return None
+        now = time.time()
+        db.execute(
+            "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+            "started_at = ?, heartbeat = ? WHERE id = ?",
+            (worker, now, now, row["id"]),
+        )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+    return _row_to_job(row)
+
+
+def _report_progress(job_id, partial):
+    """حفظ النتيجة الجزئية وتحديث النبض؛ يرفع JobCancelled إذا أُلغيت المهمة."""
+    cursor = _db().execute(
+        "UPDATE jobs SET partial = ?, heartbeat = ? WHERE id = ? AND status = 'running'",
+        (json.dumps(partial, ensure_ascii=False) if partial is not None else None, time.time(), job_id),
+    )
+    if cursor.rowcount == 0:
+        raise JobCancelled()
+
+
+def _is_running(job_id):
+    row = _db().execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return row is not None and row["status"] == "running"
+
+
+def check_cancelled():
+    """نقطة فحص بين مراحل المهمة: يرفع JobCancelled إذا أُلغيت المهمة الحالية فتتوقف مبكراً."""
+    job_id = _current_job.get()
+    if job_id is not None and not _is_running(job_id):
+        raise JobCancelled()
+
+
+def _finish_job(job_id, status, result=None, error=None):
+    _db().execute(
+        "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND status = 'running'",
+        (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, time.time(), job_id),
+    )
+
+
+def requeue_stale_jobs(stale_after=STALE_AFTER):
+    """إعادة المهام المتوقفة (عامل انتهى أثناء التنفيذ) إلى الطابور، أو إفشالها بعد MAX_ATTEMPTS."""
+    db = _db()
+    cutoff = time.time() - stale_after
+    db.execute(
+        "UPDATE jobs SET status = 'failed', error = 'توقف العامل أثناء التنفيذ', finished_at = ? "
+        "WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+        (time.time(), cutoff, MAX_ATTEMPTS),
+    )
+    db.execute(
+        "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat < ?",
+        (cutoff,),
+    )
+
+
+# معالجات المهام: كل معالج يستقبل الحمولة ودالة progress لنشر النتائج الجزئية
+
+def _job_analysis(payload, progress):
+    return analyze_competitors(payload["keyword"], force_refresh=payload.get("force_refresh", False))
+
+
+def _job_outline(payload, progress):
+    # الواجهة ترسل رقم التحليل المحفوظ في مساحة العمل بدلاً من التحليل نفسه
+    analysis = payload.get("analysis") or load_artifact(payload.get("analysis_id"))
+    return generate_outline(analysis, None, force_refresh=payload.get("force_refresh", False), raise_errors=True)
+
+
+def _job_article(payload, progress):
+    data = payload["data"]
+    if payload.get("internal_links"):
+        data = dict(data, anchors=suggest_anchors(data, payload["internal_links"]))
+    force_refresh = payload.get("force_refresh", False)
+    mode = payload.get("mode", "full")
+    if mode == "sections":
+        article = generate_content_sections(data, None, force_refresh=force_refresh, raise_errors=True)
+    elif mode == "stream":
+        html = ""
+        article = None
+        last_report = 0.0
+        events = generate_content_stream(data, None, force_refresh=force_refresh)
+        try:
+            for event in events:
+                if event["type"] != "delta":
+                    article = event["article"]
+                    break
+                html += event["text"]
+                if time.monotonic() - last_report > PROGRESS_INTERVAL:
+                    progress({"html": html, "stats": event["stats"]})
+                    last_report = time.monotonic()
+        finally:
+            events.close()
+    else:
+        article = generate_content(data, None, force_refresh=force_refresh, raise_errors=True)
+    if not article or not article.get("word_count"):
+        raise RuntimeError((article or {}).get("html") or "فشل توليد المقال")
+    if payload.get("validate"):
+        check_cancelled()
+        # فحص قواعد SEO وإصلاح الأجزاء المخالفة فقط قبل حفظ النسخة
+        article = repair_article(article, data, force_refresh=force_refresh)
+    check_cancelled()
+    try:
+        # حفظ المقال كنسخة أولى حتى يمكن تحديثه تدريجياً لاحقاً
+        save_version(data["main_keyword"], data, article, payload.get("common_headings"))
+        index_article(data["main_keyword"], article, domain=data.get("target_domain"))
+    except Exception as e:
+        print(f"خطأ في حفظ نسخة المقال: {e}")
+    return article
+
+
+def _job_refresh(payload, progress):
+    result = refresh_article(
+        payload["keyword"],
+        payload["data"],
+        analysis=payload.get("analysis"),
+        max_age_days=payload.get("max_age_days"),
+        force_refresh=payload.get("force_refresh", False),
+        wordpress=payload.get("wordpress"),
+    )
+    if not result["article"].get("word_count"):
+        raise RuntimeError(result["article"].get("html") or "فشل تحديث المقال")
+    check_cancelled()
+    if payload.get("keyword_id") and result["wordpress"]:
+        set_publish_status(payload["keyword_id"], result["wordpress"], user=payload.get("user"))
+    wordpress = result["wordpress"] or {}
+    try:
+        index_article(
+            payload["keyword"], result["article"], domain=payload["data"].get("target_domain"),
+            url=wordpress.get("link") if wordpress.get("ok") else None,
+        )
+    except Exception as e:
+        print(f"خطأ في فهرسة المقال للروابط الداخلية: {e}")
+    refresh = {key: result[key] for key in ("version", "regenerated", "reused", "analysis_diff", "wordpress")}
+    return dict(result["article"], refresh=refresh)
+
+
+def _job_repair(payload, progress):
+    article = payload.get("article") or load_artifact(payload.get("article_id"))
+    # نتيجة الإصلاح السابقة لا تُحمل إلى الفحص الجديد
+    article = {key: value for key, value in article.items() if key != "validation"}
+    return repair_article(article, payload["data"], force_refresh=payload.get("force_refresh", False))
+
+
+def _job_export(payload, progress):
+    article = payload.get("article") or load_artifact(payload.get("article_id"))
+    check_cancelled()
+    saved = save_all_formats(article, payload["keyword"], payload.get("metadata"))
+    if not all(saved.values()):
+        raise RuntimeError("فشل حفظ بعض الملفات")
+    return saved
+
+
+JOB_HANDLERS = {
+    "analysis": _job_analysis,
+    "outline": _job_outline,
+    "article": _job_article,
+    "export": _job_export,
+    "refresh": _job_refresh,
+    "repair": _job_repair,
+}
+
+# نوع النتيجة في مساحة العمل (workspace) لكل نوع مهمة تحمل حمولتها keyword_id
+JOB_ARTIFACTS = {
+    "analysis": "analysis",
+    "outline": "outline",
+    "article": "article",
+    "refresh": "article",
+    "repair": "article",
+    "export": "files",
+}
+
+# المهام التي تنتج مقالاً جديداً فتُسجَّل مرة واحدة في سجل المقالات عند اكتمالها
+LEDGER_KINDS = {"article", "refresh"}
+
+
+def _heartbeat(job_id, done):
+    """تحديث نبض المهمة دورياً أثناء الطلبات الطويلة التي لا تنشر نتائج جزئية؛ يتوقف عند إلغائها."""
+    while not done.wait(HEARTBEAT_INTERVAL):
+        cursor = _db().execute(
+            "UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'", (time.time(), job_id)
+        )
+        if cursor.rowcount == 0:
+            break
+
+
+def _record_in_ledger(payload, article, usage):
+    data = payload["data"]
+    wordpress = (article.get("refresh") or {}).get("wordpress")
+    try:
+        record_article(
+            dict(article, usage=usage),
+            data["main_keyword"],
+            data,
+            "published" if wordpress and wordpress["ok"] else "generated",
+            wordpress=describe_upload(wordpress) if wordpress else None,
+        )
+    except Exception as e:
+        print(f"خطأ في تسجيل المقال في السجل: {e}")
+
+
+def _run_job(job):
+    job_id = job["id"]
+    done = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job_id, done), daemon=True).start()
+    token = _current_job.set(job_id)
+    try:
+        payload = job["payload"]
+        with article_context(job["keyword"]) as usage, llm_routing(payload.get("model"), payload.get("hedge", False)):
+            result = JOB_HANDLERS[job["kind"]](payload, lambda partial: _report_progress(job_id, partial))
+    except JobCancelled:
+        return
+    except Exception as e:
+        print(f"خطأ في تنفيذ المهمة {job_id}: {e}")
+        _finish_job(job_id, "failed", error=str(e))
+        return
+    finally:
+        done.set()
+        _current_job.reset(token)
+    if not _is_running(job_id):
+        # أُلغيت المهمة أثناء تنفيذ مرحلتها الأخيرة: لا تُحفظ نتيجتها في مساحة العمل ولا السجل
+        return
+    if payload.get("keyword_id"):
+        # تُحفظ النتيجة في مساحة العمل قبل إعلان اكتمال المهمة حتى تجدها كل الجلسات فوراً
+        try:
+            save_artifact(payload["keyword_id"], JOB_ARTIFACTS[job["kind"]], result, user=payload.get("user"))
+        except Exception as e:
+            print(f"خطأ في حفظ نتيجة المهمة {job_id} في مساحة العمل: {e}")
+    if job["kind"] in LEDGER_KINDS:
+        _record_in_ledger(payload, result, usage)
+    _finish_job(job_id, "done", result=result)
+
+
+def run_worker(worker, stop_event, poll_interval=POLL_INTERVAL):
+    """
+    حلقة عامل واحد: حجز مهمة، تنفيذها، ثم الانتظار إذا كان الطابور فارغاً.
+    كل STALE_AFTER / 2 ثانية تُعاد المهام المتوقفة إلى الطابور، فتُستعاد مهام العمال المنتهية
+    حتى في عملية تعمل طويلاً (مثل العمال المدمجين في الواجهة).
+    """
+    last_sweep = 0.0
+    while not stop_event.is_set():
+        if time.monotonic() - last_sweep > STALE_AFTER / 2:
+            try:
+                requeue_stale_jobs()
+            except Exception as e:
+                print(f"خطأ في استعادة المهام المتوقفة: {e}")
+            last_sweep = time.monotonic()
+        try:
+            job = _claim_job(worker)
+        except Exception as e:
+            print(f"خطأ في قراءة طابور المهام: {e}")
+            job = None
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        _run_job(job)
+
+
+def start_workers(count=4, stop_event=None):
+    """تشغيل count عامل في threads خلفية داخل العملية الحالية. يعيد (stop_event, threads)."""
+    stop_event = stop_event or threading.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = []
+    for i in range(count):
+        thread = threading.Thread(target=run_worker, args=(f"{prefix}:{i}", stop_event), daemon=True)
+        thread.start()
+        threads.append(thread)
+    return stop_event, threads
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="عمال طابور مهام توليد المحتوى")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="عدد العمال")
+    args = parser.parse_args()
+
+    stop_event, threads = start_workers(args.workers)
+    print(f"✅ {args.workers} عامل يعملون على {JOBS_DB} (Ctrl+C للإيقاف)")
+    try:
+        while not stop_event.wait(1):
+            pass
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=5)
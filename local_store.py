@@ -0,0 +1,37 @@
+import os
+import sqlite3
+import threading
+
+# مجلد البيانات المحلية الدائمة (قواعد SQLite وغيرها)
+DATA_DIR = os.environ.get("SEO_DATA_DIR", "/tmp/seo_automation")
+
+_local = threading.local()
+
+
+def data_path(name):
+    """المسار الكامل لملف داخل مجلد البيانات، مع إنشاء المجلد عند الحاجة."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, name)
+
+
+def connect(name, schema=None):
+    """
+    اتصال SQLite خاص بكل thread لقاعدة البيانات المحددة.
+    يُفعَّل وضع WAL ومهلة الانتظار حتى تعمل عدة عمليات وthreads على نفس الملف بأمان.
+    يُنفَّذ المخطط (schema) مرة واحدة عند أول اتصال في كل thread.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    path = data_path(name)
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        if schema:
+            conn.executescript(schema)
+        connections[path] = conn
+    return conn
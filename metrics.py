@@ -0,0 +1,271 @@
+import asyncio
+import contextvars
+import functools
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from local_store import connect
+
+METRICS_DB = "metrics.sqlite3"
+
+# أسعار النماذج بالدولار لكل مليون رمز (إدخال، إخراج)
+MODEL_PRICES = {
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    stage TEXT NOT NULL,
+    model TEXT,
+    article TEXT,
+    duration_ms REAL NOT NULL,
+    status TEXT NOT NULL,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    cost REAL DEFAULT 0,
+    retries INTEGER DEFAULT 0,
+    cache_hit INTEGER DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);
+CREATE INDEX IF NOT EXISTS idx_events_stage ON events(stage, ts);
+"""
+
+# المقال الحالي (الكلمة المفتاحية) واستهلاكه التراكمي للرموز، والحدث المفتوح حالياً في هذا السياق
+_current_article = contextvars.ContextVar("current_article", default=None)
+_current_usage = contextvars.ContextVar("current_usage", default=None)
+_current_event = contextvars.ContextVar("current_event", default=None)
+
+
+def _db():
+    return connect(METRICS_DB, _SCHEMA)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """تكلفة الطلب بالدولار حسب جدول أسعار النماذج."""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+@contextmanager
+def article_context(article, usage=None):
+    """
+    ربط كل الأحداث داخل هذا السياق بمقال معين لحساب التكلفة لكل مقال.
+    يعيد قاموس {"prompt_tokens", "completion_tokens"} تتجمع فيه رموز كل الطلبات داخل السياق؛
+    تمرير usage سابق يكمل التجميع عبر عدة سياقات (مثل مراحل خط الإنتاج لنفس المقال).
+    """
+    usage = usage if usage is not None else {"prompt_tokens": 0, "completion_tokens": 0}
+    token = _current_article.set(article)
+    usage_token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(usage_token)
+        _current_article.reset(token)
+
+
+def article_usage():
+    """استهلاك الرموز المتجمع للمقال الحالي (article_context)، أو None خارج أي مقال."""
+    return _current_usage.get()
+
+
+def record_event(stage, duration_ms, status="ok", model=None, prompt_tokens=0, completion_tokens=0,
+                 retries=0, cache_hit=False, error=None, article=None):
+    """تسجيل حدث واحد في مخزن المقاييس المحلي."""
+    try:
+        _db().execute(
+            "INSERT INTO events (ts, stage, model, article, duration_ms, status, prompt_tokens, "
+            "completion_tokens, cost, retries, cache_hit, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                time.time(), stage, model, article or _current_article.get(), round(duration_ms, 2), status,
+                prompt_tokens, completion_tokens, estimate_cost(model, prompt_tokens, completion_tokens),
+                retries, int(bool(cache_hit)), (error or "")[:500] or None,
+            ),
+        )
+    except Exception as e:
+        # القياس لا يجب أن يُفشل العملية الأصلية أبداً
+        print(f"خطأ في تسجيل المقاييس: {e}")
+
+
+@contextmanager
+def timed(stage, model=None):
+    """
+    قياس زمن مرحلة وتسجيلها عند الخروج (مع حالة الخطأ إن وقع).
+    يمكن إرفاق الرموز وإعادة المحاولات وإصابات الذاكرة المؤقتة بالحدث المفتوح
+    عبر note_usage / note_retry / note_cache_hit من أي دالة داخلية.
+    """
+    event = {"model": model, "prompt_tokens": 0, "completion_tokens": 0, "retries": 0, "cache_hit": False}
+    token = _current_event.set(event)
+    started = time.perf_counter()
+    status, error = "ok", None
+    try:
+        yield event
+    except Exception as e:
+        status, error = "error", str(e)
+        raise
+    finally:
+        _current_event.reset(token)
+        record_event(stage, **_event_fields(event, started, status, error))
+
+
+@asynccontextmanager
+async def atimed(stage, model=None):
+    """
+    نسخة timed للكود غير المتزامن: يُكتب الحدث في SQLite من thread آخر (asyncio.to_thread)
+    حتى لا تتوقف الحلقة المشتركة عن بقية الطلبات أثناء الكتابة.
+    """
+    event = {"model": model, "prompt_tokens": 0, "completion_tokens": 0, "retries": 0, "cache_hit": False}
+    token = _current_event.set(event)
+    started = time.perf_counter()
+    status, error = "ok", None
+    try:
+        yield event
+    except Exception as e:
+        status, error = "error", str(e)
+        raise
+    finally:
+        _current_event.reset(token)
+        await asyncio.to_thread(record_event, stage, **_event_fields(event, started, status, error))
+
+
+def _event_fields(event, started, status, error):
+    """حقول record_event من الحدث المفتوح عند إغلاقه."""
+    if event.get("error"):
+        status, error = "error", event["error"]
+    return {
+        "duration_ms": (time.perf_counter() - started) * 1000,
+        "status": status,
+        "model": event["model"],
+        "prompt_tokens": event["prompt_tokens"],
+        "completion_tokens": event["completion_tokens"],
+        "retries": event["retries"],
+        "cache_hit": event["cache_hit"],
+        "error": error,
+    }
+
+
+def instrumented(stage):
+    """مُزخرف (decorator) يقيس زمن الدالة كاملة كمرحلة."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def note_usage(prompt_tokens=0, completion_tokens=0, model=None):
+    """إضافة استهلاك الرموز إلى الحدث المفتوح حالياً وإلى مجموع المقال الحالي."""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage["prompt_tokens"] += prompt_tokens or 0
+        usage["completion_tokens"] += completion_tokens or 0
+    event = _current_event.get()
+    if event is not None:
+        event["prompt_tokens"] += prompt_tokens or 0
+        event["completion_tokens"] += completion_tokens or 0
+        if model:
+            event["model"] = model
+
+
+def note_retry():
+    event = _current_event.get()
+    if event is not None:
+        event["retries"] += 1
+
+
+def note_cache_hit():
+    event = _current_event.get()
+    if event is not None:
+        event["cache_hit"] = True
+
+
+def note_error(message):
+    """تسجيل خطأ على الحدث المفتوح دون رفع استثناء (للدوال التي تعيد رسائل الخطأ)."""
+    event = _current_event.get()
+    if event is not None:
+        event["error"] = message
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+_percentile_cache = {}
+PERCENTILE_CACHE_SECONDS = 60
+
+
+def stage_latency_percentile(stage, model=None, fraction=0.95, window=200, min_samples=20):
+    """
+    زمن المئين (بالمللي ثانية) لآخر window طلب ناجح غير مخزن مؤقتاً لمرحلة ونموذج،
+    أو None إذا كانت العينات أقل من min_samples. تُحفظ النتيجة دقيقة واحدة في الذاكرة.
+    """
+    cache_key = (stage, model, fraction, window, min_samples)
+    cached = _percentile_cache.get(cache_key)
+    if cached and time.monotonic() - cached[0] < PERCENTILE_CACHE_SECONDS:
+        return cached[1]
+    rows = _db().execute(
+        "SELECT duration_ms FROM events WHERE stage = ? AND model IS ? AND status = 'ok' AND cache_hit = 0 "
+        "ORDER BY id DESC LIMIT ?",
+        (stage, model, window),
+    ).fetchall()
+    durations = sorted(row["duration_ms"] for row in rows)
+    value = _percentile(durations, fraction) if len(durations) >= min_samples else None
+    _percentile_cache[cache_key] = (time.monotonic(), value)
+    return value
+
+
+def summarize_metrics(since=None):
+    """
+    ملخص لكل (مرحلة، نموذج): العدد، p50/p95 بالمللي ثانية، الأخطاء، إصابات الذاكرة المؤقتة،
+    الرموز والتكلفة؛ إضافة إلى متوسط التكلفة لكل مقال ولكل نموذج.
+    """
+    since = since or 0
+    groups = {}
+    articles = {}
+    models = {}
+    for row in _db().execute(
+        "SELECT stage, model, article, duration_ms, status, prompt_tokens, completion_tokens, cost, "
+        "retries, cache_hit FROM events WHERE ts >= ?",
+        (since,),
+    ):
+        group = groups.setdefault((row["stage"], row["model"] or ""), {
+            "durations": [], "errors": 0, "cache_hits": 0, "retries": 0, "tokens": 0, "cost": 0.0,
+        })
+        group["durations"].append(row["duration_ms"])
+        group["errors"] += row["status"] == "error"
+        group["cache_hits"] += row["cache_hit"]
+        group["retries"] += row["retries"]
+        group["tokens"] += row["prompt_tokens"] + row["completion_tokens"]
+        group["cost"] += row["cost"]
+        if row["article"]:
+            articles[row["article"]] = articles.get(row["article"], 0.0) + row["cost"]
+        if row["model"]:
+            models[row["model"]] = models.get(row["model"], 0.0) + row["cost"]
+
+    stages = []
+    for (stage, model), group in sorted(groups.items()):
+        durations = sorted(group.pop("durations"))
+        stages.append({
+            "stage": stage,
+            "model": model,
+            "count": len(durations),
+            "p50_ms": round(_percentile(durations, 0.50), 1),
+            "p95_ms": round(_percentile(durations, 0.95), 1),
+            **{k: round(v, 6) if isinstance(v, float) else v for k, v in group.items()},
+        })
+    return {
+        "stages": stages,
+        "articles": len(articles),
+        "cost_per_article": round(sum(articles.values()) / len(articles), 6) if articles else 0,
+        "cost_per_model": {model: round(cost, 6) for model, cost in models.items()},
+    }
+
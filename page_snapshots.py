@@ -0,0 +1,161 @@
+"""
+مخزن لقطات صفحات المنافسين: HTML مضغوط وملخص التحليل (الطول والعناوين) لكل نسخة من الصفحة.
+
+عند إعادة تحليل نفس نتائج البحث (مراجعة أسبوعية مثلاً) تُرسل طلبات شرطية بالـ ETag
+وLast-Modified المحفوظين (If-None-Match / If-Modified-Since)، فالصفحة التي لم تتغير تعود 304
+دون محتوى ويُستخدم ملخصها المحفوظ. وإن أعاد الخادم الصفحة كاملة تُقارن بصمة محتواها (SHA-256)
+بالبصمة السابقة، ولا يُعاد تحليل (parse) إلا الصفحات التي تغيرت بصمتها. كل بصمة جديدة تُحفظ
+كلقطة في السجل، فيبقى تاريخ تغيّر صفحات المنافسين (page_history).
+"""
+import hashlib
+import json
+import time
+import zlib
+
+from local_store import connect
+
+SNAPSHOTS_DB = "snapshots.sqlite3"
+COMPRESSION_LEVEL = 6
+# عدد اللقطات المحفوظة لكل صفحة عند التنظيف (prune_snapshots)
+KEEP_SNAPSHOTS = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    fetched_at REAL NOT NULL,
+    checked_at REAL NOT NULL,
+    changes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    html BLOB NOT NULL,
+    raw_size INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_url ON snapshots(url, id);
+"""
+
+
+def _db():
+    return connect(SNAPSHOTS_DB, _SCHEMA)
+
+
+def content_hash(html):
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def get_page(url):
+    """آخر حالة معروفة للصفحة: {"etag", "last_modified", "content_hash", "summary", ...} أو None."""
+    row = _db().execute("SELECT * FROM pages WHERE url = ?", (url,)).fetchone()
+    if row is None:
+        return None
+    page = dict(row)
+    page["summary"] = json.loads(page["summary"])
+    return page
+
+
+def conditional_headers(page):
+    """ترويسات الطلب الشرطي من آخر نسخة محفوظة للصفحة."""
+    headers = {}
+    if page and page.get("etag"):
+        headers["If-None-Match"] = page["etag"]
+    if page and page.get("last_modified"):
+        headers["If-Modified-Since"] = page["last_modified"]
+    return headers
+
+
+def mark_checked(url, validators=None):
+    """تسجيل التحقق من صفحة لم تتغير (304 أو نفس البصمة)، مع تحديث ETag/Last-Modified إن أُرسلا."""
+    validators = validators or {}
+    _db().execute(
+        "UPDATE pages SET checked_at = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) "
+        "WHERE url = ?",
+        (time.time(), validators.get("etag"), validators.get("last_modified"), url),
+    )
+
+
+def record_snapshot(url, html, summary, validators=None):
+    """
+    حفظ نسخة جديدة من الصفحة بعد تحليلها: لقطة مضغوطة في السجل (إن كانت بصمتها جديدة)
+    وتحديث حالتها الحالية. يعيد البصمة.
+    """
+    validators = validators or {}
+    digest = content_hash(html)
+    now = time.time()
+    encoded_summary = json.dumps(summary, ensure_ascii=False)
+    compressed = zlib.compress(html.encode("utf-8"), COMPRESSION_LEVEL)
+    db = _db()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        previous = db.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+        if previous is None or previous["content_hash"] != digest:
+            db.execute(
+                "INSERT INTO snapshots (url, content_hash, html, raw_size, summary, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, digest, compressed, len(html), encoded_summary, now),
+            )
+        db.execute(
+            "INSERT INTO pages (url, etag, last_modified, content_hash, summary, first_seen, fetched_at, checked_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified, "
+            "changes = changes + (content_hash != excluded.content_hash), content_hash = excluded.content_hash, "
+            "summary = excluded.summary, fetched_at = excluded.fetched_at, checked_at = excluded.checked_at",
+            (url, validators.get("etag"), validators.get("last_modified"), digest, encoded_summary, now, now, now),
+        )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+    return digest
+
+
+def page_history(url, limit=20):
+    """نسخ الصفحة المحفوظة (الأحدث أولاً) مع ملخص كل نسخة والعناوين المضافة والمحذوفة مقارنة بسابقتها."""
+    rows = _db().execute(
+        "SELECT id, content_hash, raw_size, LENGTH(html) AS stored_size, summary, fetched_at FROM snapshots "
+        "WHERE url = ? ORDER BY id DESC LIMIT ?",
+        (url, limit + 1),
+    ).fetchall()
+    history = []
+    for i, row in enumerate(rows[:limit]):
+        summary = json.loads(row["summary"])
+        older = json.loads(rows[i + 1]["summary"]) if i + 1 < len(rows) else None
+        entry = dict(row, summary=summary)
+        if older is not None:
+            entry["added_headings"] = [h for h in summary["headings"] if h not in older["headings"]]
+            entry["removed_headings"] = [h for h in older["headings"] if h not in summary["headings"]]
+            entry["length_change"] = summary["length"] - older["length"]
+        history.append(entry)
+    return history
+
+
+def load_snapshot_html(snapshot_id):
+    """HTML لقطة محفوظة (بعد فك الضغط) أو None."""
+    row = _db().execute("SELECT html FROM snapshots WHERE id = ?", (snapshot_id,)).fetchone()
+    return zlib.decompress(row["html"]).decode("utf-8") if row else None
+
+
+def prune_snapshots(keep=KEEP_SNAPSHOTS):
+    """حذف اللقطات الأقدم مع الإبقاء على أحدث keep لقطة لكل صفحة. يعيد عدد المحذوف."""
+    cursor = _db().execute(
+        "DELETE FROM snapshots WHERE id IN ("
+        "SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY url ORDER BY id DESC) AS rank FROM snapshots) "
+        "WHERE rank > ?)",
+        (keep,),
+    )
+    return cursor.rowcount
+
+
+def snapshot_stats():
+    row = _db().execute(
+        "SELECT (SELECT COUNT(*) FROM pages) AS pages, COUNT(*) AS snapshots, "
+        "COALESCE(SUM(raw_size), 0) AS raw_bytes, COALESCE(SUM(LENGTH(html)), 0) AS stored_bytes FROM snapshots"
+    ).fetchone()
+    return dict(row)
@@ -0,0 +1,269 @@
+"""
+جدولة طلبات النماذج حسب حصص المزود: عدد الطلبات في الدقيقة (RPM) والرموز في الدقيقة (TPM).
+
+لكل نموذج دلوان (token bucket) مشتركان بين كل الـ threads؛ يُحجز لكل طلب رمز واحد
+من دلو الطلبات وتقدير رموزه (طول الرسائل + max_tokens) من دلو الرموز، ثم يُسوّى الفرق
+بعد معرفة الاستهلاك الفعلي. عند 429 يُحترم Retry-After ويُخفَّض المعدل تدريجياً ثم يُستعاد
+مع النجاح، فيبقى الإنتاج قريباً من سقف الحصة بدلاً من التذبذب بين التوقف والحظر.
+"""
+import asyncio
+import sys
+import threading
+import time
+
+from metrics import note_retry
+
+# حصص كل نموذج (طلبات/دقيقة، رموز/دقيقة)
+MODEL_LIMITS = {
+    "gpt-4.1-mini": {"rpm": 500, "tpm": 200_000},
+    "gpt-4.1-nano": {"rpm": 500, "tpm": 200_000},
+    "gemini-2.5-flash": {"rpm": 1000, "tpm": 1_000_000},
+}
+DEFAULT_LIMITS = {"rpm": 500, "tpm": 200_000}
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+MAX_BACKOFF = 60.0
+# تخفيض المعدل عند كل 429، وزيادته مع كل نجاح حتى يعود إلى 100%
+DECREASE_FACTOR = 0.8
+INCREASE_STEP = 0.005
+MIN_RATE_FACTOR = 0.1
+# تقدير عدد الأحرف لكل رمز (النص العربي أقصر رموزاً من الإنجليزي)
+CHARS_PER_TOKEN = 3
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+class _TokenBucket:
+    """دلو يمتلئ بمعدل ثابت حتى سعته؛ الحجز قد يجعل الرصيد سالباً فيحدد زمن الانتظار."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now, factor):
+        if now <= self.updated:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * factor)
+        self.updated = now
+
+    def reserve(self, amount, now, factor):
+        """حجز amount وإرجاع زمن الانتظار بالثواني حتى يصبح الحجز متاحاً."""
+        self._refill(now, factor)
+        self.tokens -= min(amount, self.capacity)
+        return 0.0 if self.tokens >= 0 else -self.tokens / (self.rate * factor)
+
+    def refund(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def pause_until(self, moment):
+        """تفريغ الدلو وإيقاف امتلائه حتى moment (بعد 429)، مع إلغاء الحجوزات السابقة."""
+        self.tokens = 0.0
+        self.updated = moment
+
+
+class ModelRateLimiter:
+    """محدد معدل نموذج واحد: دلو للطلبات، دلو للرموز، وعامل معدل يتكيف مع 429."""
+
+    def __init__(self, rpm, tpm):
+        self.requests = _TokenBucket(rpm)
+        self.tokens = _TokenBucket(tpm)
+        self.rate_factor = 1.0
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self, estimated_tokens):
+        with self._lock:
+            now = time.monotonic()
+            delay = max(
+                self.blocked_until - now,
+                self.requests.reserve(1, now, self.rate_factor),
+                self.tokens.reserve(estimated_tokens, now, self.rate_factor),
+            )
+            return delay, self.throttled
+
+    def _confirmed(self, generation):
+        # إذا حُظر النموذج أثناء الانتظار فقد أُلغي الحجز ويُعاد بعد انتهاء الحظر
+        with self._lock:
+            return self.throttled == generation
+
+    def acquire(self, estimated_tokens):
+        """انتظار دور الطلب حسب الحصتين وأي Retry-After سابق. يعيد رقم جيل الحجز لـ settle."""
+        while True:
+            delay, generation = self._reserve(estimated_tokens)
+            if delay > 0:
+                time.sleep(delay)
+            if self._confirmed(generation):
+                return generation
+
+    async def acquire_async(self, estimated_tokens):
+        """نسخة acquire لحلقة الأحداث: الانتظار بـ asyncio.sleep دون حجز thread."""
+        while True:
+            delay, generation = self._reserve(estimated_tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self._confirmed(generation):
+                return generation
+
+    def settle(self, estimated_tokens, actual_tokens, generation=None):
+        """
+        تسوية الفرق بين تقدير الرموز والاستهلاك الفعلي بعد انتهاء الطلب.
+        إذا حُظر النموذج بعد الحجز (generation قديم) فقد أُلغي الحجز أصلاً ولا يُسترد شيء.
+        """
+        with self._lock:
+            if generation is not None and generation != self.throttled:
+                return
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+    def succeed(self):
+        with self._lock:
+            self.rate_factor = min(1.0, self.rate_factor + INCREASE_STEP)
+
+    def throttle(self, delay):
+        """
+        إيقاف كل طلبات النموذج حتى انقضاء delay وتخفيض المعدل.
+        سلسلة 429 المتزامنة من عدة threads تُخفّض المعدل مرة واحدة فقط.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now >= self.blocked_until:
+                self.rate_factor = max(MIN_RATE_FACTOR, self.rate_factor * DECREASE_FACTOR)
+            self.blocked_until = max(self.blocked_until, now + delay)
+            self.requests.pause_until(self.blocked_until)
+            self.tokens.pause_until(self.blocked_until)
+            self.throttled += 1
+
+
+def get_model_limiter(model):
+    with _lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limits = MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+            limiter = _limiters[model] = ModelRateLimiter(limits["rpm"], limits["tpm"])
+        return limiter
+
+
+def set_model_limits(model, rpm=None, tpm=None):
+    """تغيير حصص نموذج (مثلاً حسب مستوى الحساب لدى المزود)."""
+    limits = dict(MODEL_LIMITS.get(model, DEFAULT_LIMITS))
+    if rpm:
+        limits["rpm"] = rpm
+    if tpm:
+        limits["tpm"] = tpm
+    with _lock:
+        MODEL_LIMITS[model] = limits
+        _limiters[model] = ModelRateLimiter(limits["rpm"], limits["tpm"])
+
+
+def estimate_tokens(messages, max_tokens):
+    """تقدير رموز الطلب قبل إرساله: طول الرسائل + الحد الأقصى للإخراج."""
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // CHARS_PER_TOKEN + (max_tokens or 0)
+
+
+def _retry_after(error, attempt):
+    """المدة من ترويسات Retry-After / retry-after-ms إن وُجدت، وإلا تراجع أسي."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return min(MAX_BACKOFF, BACKOFF_BASE * (2 ** attempt))
+
+
+def call_with_rate_limit(model, messages, max_tokens, request):
+    """
+    تنفيذ request() ضمن حصة النموذج، مع إعادة المحاولة عند 429 والأخطاء المؤقتة.
+    يعيد استجابة request() كما هي؛ إذا احتوت usage تُسوّى الرموز المحجوزة فوراً.
+    """
+    # أخطاء openai لا تُرفع إلا إذا كانت الحزمة محمّلة، فلا داعي لاستيرادها هنا (مثلاً مع FakeLLMClient)
+    openai = sys.modules.get("openai")
+    retryable = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) if openai else ()
+    estimated = estimate_tokens(messages, max_tokens)
+    limiter = get_model_limiter(model)
+    for attempt in range(MAX_RETRIES + 1):
+        generation = limiter.acquire(estimated)
+        response = None
+        try:
+            response = request()
+        except retryable as e:
+            # انتهاء المهلة يُترك لطبقة التوجيه لتنتقل إلى نموذج بديل
+            if isinstance(e, openai.APITimeoutError) or attempt == MAX_RETRIES:
+                raise
+            if isinstance(e, openai.RateLimitError):
+                limiter.throttle(_retry_after(e, attempt))
+            else:
+                time.sleep(_retry_after(e, attempt))
+            note_retry()
+            continue
+        finally:
+            _settle_attempt(limiter, estimated, response, generation)
+        limiter.succeed()
+        return response
+
+
+async def acall_with_rate_limit(model, messages, max_tokens, request):
+    """نسخة call_with_rate_limit غير المتزامنة: request دالة تعيد coroutine (مثل AsyncOpenAI)."""
+    openai = sys.modules.get("openai")
+    retryable = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) if openai else ()
+    estimated = estimate_tokens(messages, max_tokens)
+    limiter = get_model_limiter(model)
+    for attempt in range(MAX_RETRIES + 1):
+        generation = await limiter.acquire_async(estimated)
+        response = None
+        try:
+            response = await request()
+        except retryable as e:
+            if isinstance(e, openai.APITimeoutError) or attempt == MAX_RETRIES:
+                raise
+            if isinstance(e, openai.RateLimitError):
+                limiter.throttle(_retry_after(e, attempt))
+            else:
+                await asyncio.sleep(_retry_after(e, attempt))
+            note_retry()
+            continue
+        finally:
+            _settle_attempt(limiter, estimated, response, generation)
+        limiter.succeed()
+        return response
+
+
+def _settle_attempt(limiter, estimated, response, generation):
+    """
+    تسوية حجز محاولة واحدة: بالاستهلاك الفعلي إن أعادت الاستجابة usage، وبصفر إذا فشل الطلب
+    أو أُلغي، حتى لا تخفض عواصف الأخطاء المعدل تحت الحصة الحقيقية.
+    استجابة بلا usage (مثل بدء البث) تُسوّى لاحقاً عبر settle_usage.
+    """
+    usage = getattr(response, "usage", None)
+    if response is None or usage:
+        limiter.settle(estimated, usage.total_tokens if usage else 0, generation)
+
+
+def settle_usage(model, messages, max_tokens, usage):
+    """
+    تسوية رموز طلب بث بعد انتهائه (لا تتوفر usage عند بدء البث).
+    بث فشل أو أُلغي قبل وصول usage يُسوّى بصفر.
+    """
+    get_model_limiter(model).settle(estimate_tokens(messages, max_tokens), usage.total_tokens if usage else 0)
+
+
+def limiter_stats():
+    """حالة كل نموذج: عامل المعدل الحالي، مرات الحظر، والرموز المتاحة."""
+    with _lock:
+        limiters = dict(_limiters)
+    return {
+        model: {
+            "rate_factor": round(limiter.rate_factor, 2),
+            "throttled": limiter.throttled,
+            "tokens_available": int(limiter.tokens.tokens),
+        }
+        for model, limiter in limiters.items()
+    }
@@ -0,0 +1,199 @@
+"""
+ذاكرة مؤقتة دلالية للمخططات: الكلمات المفتاحية شبه المتطابقة تعيد استخدام مخطط سابق.
+
+"أفضل هواتف 2024" و"افضل الهواتف 2024" و"أفضل هاتف 2024" تنتج المخطط نفسه تقريباً،
+لكن الذاكرة المؤقتة العادية (cache_handler) لا تطابق إلا المدخلات المتطابقة حرفياً.
+هنا تُوحَّد الكلمة (heading_analysis.normalize_heading) وتُمثَّل بمتجه مقاطع حروف
+مُجزّأ (feature hashing) ثابت الأبعاد، وتُحفظ متجهات كل المخططات السابقة في مصفوفة NumPy
+واحدة في الذاكرة يُبحث فيها بضرب مصفوفة في متجه. أقرب مرشح فوق العتبة لا يُقبل إلا إذا
+قابلت كل كلمة فيه كلمة مشابهة في الكلمة الجديدة (مفرد/جمع، أداة التعريف) وتطابقت
+الأرقام، حتى لا يُعاد استخدام مخطط "أفضل هواتف 2025" أو "أفضل هواتف سامسونج" لـ"أفضل هواتف 2024".
+"""
+import os
+import threading
+import time
+import zlib
+
+from local_store import connect
+from cache_handler import STAGE_TTLS, record_lookup
+from heading_analysis import normalize_heading, _features
+
+SEMANTIC_DB = "semantic_cache.sqlite3"
+# أقل تشابه (جيب التمام) بين الكلمتين لإعادة استخدام المخطط؛ 0 يعطّل الذاكرة الدلالية
+SIMILARITY_THRESHOLD = float(os.environ.get("SEO_SEMANTIC_THRESHOLD", "0.7"))
+# أقل تشابه بين كلمتين متقابلتين (معامل Dice لثنائيات الحروف): هاتف/هواتف ≈ 0.73
+WORD_MATCH_THRESHOLD = 0.6
+DIMENSIONS = 1024
+MAX_ENTRIES = 20000
+CANDIDATES = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outlines (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    keyword TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    outline TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outlines_normalized ON outlines(normalized);
+"""
+
+_lock = threading.Lock()
+_index = {"matrix": None, "entries": [], "last_id": 0}
+
+
+def _db():
+    return connect(SEMANTIC_DB, _SCHEMA)
+
+
+def embed_keyword(normalized):
+    """متجه مقاطع الحروف المُجزّأ (بطول 1) لكلمة موحدة؛ crc32 ثابت بين العمليات بخلاف hash()."""
+    import numpy as np
+
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for feature in _features(normalized):
+        vector[zlib.crc32(feature.encode("utf-8")) % DIMENSIONS] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _bigrams(word):
+    padded = f" {word} "
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def _word_similarity(a, b):
+    if a == b:
+        return 1.0
+    if a.isdigit() or b.isdigit():
+        return 0.0
+    first, second = _bigrams(a), _bigrams(b)
+    return 2 * len(first & second) / (len(first) + len(second))
+
+
+def _words_aligned(query, candidate):
+    """كل كلمة في كل طرف تقابل كلمة مشابهة في الطرف الآخر (والأرقام متطابقة تماماً)."""
+    query, candidate = query.split(), candidate.split()
+    if len(query) != len(candidate):
+        return False
+    return all(
+        max(_word_similarity(a, b) for b in others) >= WORD_MATCH_THRESHOLD
+        for words, others in ((query, candidate), (candidate, query))
+        for a in words
+    )
+
+
+def _append(entries):
+    """إضافة صفوف إلى المصفوفة في الذاكرة (بسعة تتضاعف عند الامتلاء)."""
+    import numpy as np
+
+    matrix = _index["matrix"]
+    needed = len(_index["entries"]) + len(entries)
+    if matrix is None or needed > matrix.shape[0]:
+        grown = np.zeros((max(256, needed * 2), DIMENSIONS), dtype=np.float32)
+        if matrix is not None:
+            grown[:len(_index["entries"])] = matrix[:len(_index["entries"])]
+        matrix = _index["matrix"] = grown
+    for entry in entries:
+        matrix[len(_index["entries"])] = embed_keyword(entry["normalized"])
+        _index["entries"].append(entry)
+        _index["last_id"] = max(_index["last_id"], entry["id"])
+
+
+def _sync():
+    """تحميل المخططات التي أضافتها عمليات أخرى (أو كل المخططات عند أول استخدام)."""
+    rows = _db().execute(
+        "SELECT id, keyword, normalized, expires_at FROM outlines WHERE id > ? AND expires_at > ? "
+        "ORDER BY id DESC LIMIT ?",
+        (_index["last_id"], time.time(), MAX_ENTRIES),
+    ).fetchall()
+    if rows:
+        _append([dict(row) for row in reversed(rows)])
+    if len(_index["entries"]) > MAX_ENTRIES * 2:
+        # إعادة البناء من الأحدث فقط حتى لا تكبر المصفوفة بلا حد في العمليات الطويلة
+        _index.update(matrix=None, entries=[], last_id=0)
+        _sync()
+
+
+def find_similar_outline(keyword, threshold=None, exclude_same=False):
+    """
+    مخطط كلمة مفتاحية شبه متطابقة مع keyword مُكيَّفاً لها، أو None.
+    exclude_same=True يتجاهل مخطط نفس الكلمة حرفياً (مخططها يُعاد من ذاكرة المدخلات الحرفية فقط).
+    يعيد {"outline", "keyword": الكلمة الأصلية، "similarity"}.
+    """
+    import numpy as np
+
+    threshold = SIMILARITY_THRESHOLD if threshold is None else threshold
+    normalized = normalize_heading(keyword)
+    if not threshold or not normalized:
+        return None
+    with _lock:
+        _sync()
+        count = len(_index["entries"])
+        if not count:
+            return None
+        scores = _index["matrix"][:count] @ embed_keyword(normalized)
+        now = time.time()
+        best = None
+        for row in np.argsort(scores)[::-1][:CANDIDATES]:
+            entry = _index["entries"][row]
+            if scores[row] < threshold:
+                break
+            if entry["expires_at"] > now and _words_aligned(normalized, entry["normalized"]):
+                best = (entry, float(scores[row]))
+                break
+    if best is None:
+        return None
+    entry, similarity = best
+    # أحدث مخطط لنفس الكلمة الموحدة (قد يكون استُبدل بعد تحميل الفهرس)
+    found = _db().execute(
+        "SELECT keyword, outline FROM outlines WHERE normalized = ? ORDER BY id DESC LIMIT 1", (entry["normalized"],)
+    ).fetchone()
+    if found is None or (exclude_same and found["keyword"] == keyword):
+        return None
+    return {
+        "outline": adapt_outline(found["outline"], found["keyword"], keyword),
+        "keyword": found["keyword"],
+        "similarity": round(similarity, 3),
+    }
+
+
+def adapt_outline(outline, source_keyword, keyword):
+    """تكييف بسيط: استبدال الكلمة المفتاحية الأصلية بالجديدة حيث وردت حرفياً في المخطط."""
+    if source_keyword == keyword:
+        return outline
+    return outline.replace(source_keyword, keyword)
+
+
+def remember_outline(keyword, outline, ttl=None):
+    """حفظ مخطط مولَّد ليُعاد استخدامه للكلمات شبه المتطابقة لاحقاً."""
+    normalized = normalize_heading(keyword)
+    if not normalized or not outline:
+        return
+    now = time.time()
+    expires_at = now + (ttl if ttl is not None else STAGE_TTLS["outline"])
+    db = _db()
+    # كلمة موحدة واحدة = مخطط واحد (الأحدث)
+    db.execute("DELETE FROM outlines WHERE normalized = ?", (normalized,))
+    db.execute(
+        "INSERT INTO outlines (keyword, normalized, outline, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+        (keyword, normalized, outline, now, expires_at),
+    )
+    with _lock:
+        # الفهرس يُحمَّل كاملاً عند أول بحث؛ إن كان محمّلاً تُضاف إليه الصفوف الجديدة الآن
+        if _index["matrix"] is not None:
+            _sync()
+
+
+def lookup_outline(keyword, exclude_same=False):
+    """find_similar_outline مع تسجيل الإصابة/الإخفاق في عدادات الذاكرة المؤقتة."""
+    match = find_similar_outline(keyword, exclude_same=exclude_same)
+    record_lookup("outline_semantic", match is not None)
+    return match
+
+
+def clear_semantic_cache():
+    _db().execute("DELETE FROM outlines")
+    with _lock:
+        _index.update(matrix=None, entries=[], last_id=0)
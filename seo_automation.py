@@ -0,0 +1,304 @@
+"""
+واجهة سطر الأوامر لخط إنتاج المحتوى دون Streamlit (للجدولة عبر cron أو ربطها بخطوط البيانات).
+
+تُقرأ مهام الكلمات المفتاحية بصيغة JSONL من ملف أو من stdin سطراً بسطر، وتُكتب نتيجة كل
+مقال سطراً في JSONL فور انتهائه (وليس بترتيب الإدخال)، فيبقى استهلاك الذاكرة ثابتاً مهما
+كان حجم الملف:
+
+    python -m seo_automation run keywords.jsonl -o results.jsonl -c 16
+    cat keywords.jsonl | python -m seo_automation run - --no-files > results.jsonl
+
+كل سطر إدخال بنفس أعمدة batch_pipeline: keyword, related_keywords, anchors, domain, language.
+--zip / --docx يضيفان كل مقال إلى أرشيف واحد فور انتهائه، والأمر export يبني الأرشيف نفسه
+من ملف نتائج سابق:
+
+    python -m seo_automation export results.jsonl --zip campaign.zip --docx campaign.docx
+
+--internal-links N يضيف لكل مقال حتى N روابط داخلية من مقالات الموقع السابقة (link_planner)،
+والأمر index يسجّل مقالات ملف نتائج سابق في فهرس الروابط:
+
+    python -m seo_automation index results.jsonl --domain https://example.com
+
+--validate يفحص كل مقال بقواعد SEO ويصلح الأجزاء المخالفة فقط (seo_validator)، والأمر validate
+يفحص ملف نتائج سابق في مجموعة عمليات ويكتب تقريراً لكل مقال:
+
+    python -m seo_automation validate results.jsonl -o report.jsonl
+رسائل التقدم والأخطاء تُكتب في stderr حتى يبقى stdout نتائج JSONL فقط.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from batch_pipeline import run_pipeline, read_jsonl_jobs
+from article_ledger import export_ledger_to_excel
+from storage_handler import HtmlZipExporter, DocxStreamExporter
+from link_planner import index_article, link_index_stats
+from seo_validator import validate_batch, failed_rules
+
+
+def _completed_keywords(path):
+    """الكلمات المفتاحية التي نجحت في ملف نتائج سابق (لاستئناف حملة متوقفة)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if result.get("status") == "done":
+                done.add(result.get("keyword"))
+    return done
+
+
+def _open_exporters(args):
+    exporters = []
+    if args.zip:
+        exporters.append(HtmlZipExporter(args.zip))
+    if args.docx:
+        exporters.append(DocxStreamExporter(args.docx))
+    return exporters
+
+
+def _export_result(exporters, result):
+    if result.get("status") != "done" or not result.get("html"):
+        return
+    article = {
+        "title": result.get("title") or result["keyword"],
+        "html": result["html"],
+        "meta_description": result.get("meta_description") or "",
+    }
+    for exporter in exporters:
+        exporter.add(article, result["keyword"], {"batch_id": result.get("batch_id")})
+
+
+def run_command(args):
+    """تشغيل الحملة وكتابة النتائج؛ يعيد ملخص الحملة."""
+    started = time.perf_counter()
+    batch_id = args.batch_id or datetime.now().strftime("batch_%Y%m%d_%H%M%S")
+    wordpress = None
+    if args.wp_url and args.wp_user and args.wp_password:
+        wordpress = {"url": args.wp_url, "user": args.wp_user, "password": args.wp_password}
+
+    skip = _completed_keywords(args.output) if args.resume and args.output else set()
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    if args.output:
+        out = open(args.output, "a" if args.resume else "w", encoding="utf-8")
+    else:
+        # الوحدات تطبع رسائل الأخطاء في stdout، فتُحوَّل إلى stderr حتى لا تختلط بنتائج JSONL
+        out, sys.stdout = sys.stdout, sys.stderr
+
+    jobs = (job for job in read_jsonl_jobs(source, skip_invalid=True) if job["main_keyword"] not in skip)
+    summary = {"done": 0, "failed": 0, "skipped": len(skip), "batch_id": batch_id}
+    exporters = _open_exporters(args)
+    try:
+        for result in run_pipeline(
+            jobs,
+            concurrency=args.concurrency,
+            save_files=not args.no_files,
+            wordpress=wordpress,
+            force_refresh=args.force_refresh,
+            section_parallel=args.sections,
+            batch_id=batch_id,
+            model=args.model,
+            hedge=args.hedge,
+            internal_links=args.internal_links,
+            validate=args.validate,
+        ):
+            summary[result["status"]] += 1
+            _export_result(exporters, result)
+            if args.no_html:
+                result.pop("html", None)
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            if args.progress and (summary["done"] + summary["failed"]) % args.progress == 0:
+                print(
+                    f"[{batch_id}] {summary['done']} ناجح، {summary['failed']} فاشل — "
+                    f"{round(time.perf_counter() - started)} ث",
+                    file=sys.stderr,
+                )
+    finally:
+        for exporter in exporters:
+            exporter.close()
+        if source is not sys.stdin:
+            source.close()
+        if args.output:
+            out.close()
+        else:
+            sys.stdout = out
+
+    # مصنف Excel واحد للحملة كاملة من سجل المقالات
+    summary["excel"] = export_ledger_to_excel(batch_id=batch_id) if args.excel else None
+    summary["exports"] = [exporter.path for exporter in exporters]
+    summary["elapsed"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def export_command(args):
+    """بناء أرشيف ZIP/Docx من ملف نتائج JSONL سطراً بسطر (يتطلب نتائج لم تُحذف منها HTML)."""
+    started = time.perf_counter()
+    summary = {"exported": 0, "skipped": 0}
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    exporters = _open_exporters(args)
+    try:
+        for line in source:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                summary["skipped"] += 1
+                continue
+            if result.get("status") != "done" or not result.get("html"):
+                summary["skipped"] += 1
+                continue
+            _export_result(exporters, result)
+            summary["exported"] += 1
+    finally:
+        for exporter in exporters:
+            exporter.close()
+        if source is not sys.stdin:
+            source.close()
+    summary["exports"] = [exporter.path for exporter in exporters]
+    summary["elapsed"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def index_command(args):
+    """تسجيل المقالات الناجحة في ملف نتائج JSONL كأهداف للروابط الداخلية."""
+    started = time.perf_counter()
+    summary = {"indexed": 0, "skipped": 0}
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        for line in source:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                summary["skipped"] += 1
+                continue
+            if result.get("status") != "done" or not result.get("keyword"):
+                summary["skipped"] += 1
+                continue
+            article = {"title": result.get("title"), "html": result.get("html") or ""}
+            if index_article(result["keyword"], article, domain=args.domain):
+                summary["indexed"] += 1
+            else:
+                summary["skipped"] += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    summary["index"] = link_index_stats()
+    summary["elapsed"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def validate_command(args):
+    """
+    فحص مقالات ملف نتائج JSONL بقواعد SEO على دفعات في مجموعة عمليات، وكتابة تقرير لكل مقال.
+    ملفات النتائج لا تحمل الكلمات المرتبطة ونصوص الربط، فتُفحص القواعد الأخرى فقط.
+    """
+    started = time.perf_counter()
+    summary = {"passed": 0, "failed": 0, "skipped": 0}
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    def flush(batch):
+        reports = validate_batch([(article, {"main_keyword": keyword}) for keyword, article in batch])
+        for (keyword, _), report in zip(batch, reports):
+            summary["passed" if report["ok"] else "failed"] += 1
+            record = {"keyword": keyword, "ok": report["ok"], "failed": failed_rules(report), "rules": report["rules"]}
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    batch = []
+    try:
+        for line in source:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                summary["skipped"] += 1
+                continue
+            if result.get("status") != "done" or not result.get("html"):
+                summary["skipped"] += 1
+                continue
+            batch.append((result["keyword"], {"html": result["html"], "meta_description": result.get("meta_description")}))
+            if len(batch) >= args.batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if args.output:
+            out.close()
+    summary["elapsed"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="seo_automation", description="أتمتة محتوى SEO من سطر الأوامر")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="توليد مقالات لمهام JSONL (ملف أو stdin)")
+    run.add_argument("input", nargs="?", default="-", help="ملف JSONL، أو - للقراءة من stdin (الافتراضي)")
+    run.add_argument("-o", "--output", help="ملف JSONL للنتائج (الافتراضي stdout)")
+    run.add_argument("-c", "--concurrency", type=int, default=8, help="عدد المهام المتزامنة في كل مرحلة")
+    run.add_argument("-m", "--model", help="النموذج الرئيسي (الافتراضي gpt-4.1-mini)")
+    run.add_argument("--hedge", action="store_true", help="طلب احتياطي عند تجاوز زمن p95")
+    run.add_argument("--sections", action="store_true", help="كتابة أقسام المقال بالتوازي (للمقالات الطويلة)")
+    run.add_argument("--force-refresh", action="store_true", help="تجاهل الذاكرة المؤقتة")
+    run.add_argument("--no-files", action="store_true", help="عدم حفظ ملفات Docx/HTML لكل مقال")
+    run.add_argument("--no-html", action="store_true", help="حذف HTML المقال من سجلات النتائج")
+    run.add_argument("--excel", action="store_true", help="تصدير مصنف Excel واحد للحملة في النهاية")
+    run.add_argument("--resume", action="store_true", help="تخطي الكلمات الناجحة في ملف النتائج والإضافة إليه")
+    run.add_argument("--batch-id", help="معرّف الحملة في سجل المقالات")
+    run.add_argument("--progress", type=int, default=100, help="رسالة تقدم في stderr كل N مقال (0 لإيقافها)")
+    run.add_argument("--wp-url", default=os.environ.get("WP_URL"), help="رابط موقع WordPress (أو WP_URL)")
+    run.add_argument("--wp-user", default=os.environ.get("WP_USER"), help="مستخدم WordPress (أو WP_USER)")
+    run.add_argument("--wp-password", default=os.environ.get("WP_APP_PASSWORD"),
+                     help="كلمة مرور التطبيق (أو WP_APP_PASSWORD)")
+    run.add_argument("--internal-links", type=int, default=0,
+                     help="عدد الروابط الداخلية المقترحة من مقالات الموقع السابقة لكل مقال")
+    run.add_argument("--zip", help="أرشيف ZIP بملف HTML لكل مقال يُكتب أثناء التشغيل")
+    run.add_argument("--docx", help="مستند Word واحد يجمع كل المقالات يُكتب أثناء التشغيل")
+    run.add_argument("--validate", action="store_true", help="فحص قواعد SEO لكل مقال وإصلاح الأجزاء المخالفة فقط")
+    run.set_defaults(handler=run_command)
+
+    export = commands.add_parser("export", help="تصدير ملف نتائج JSONL إلى أرشيف ZIP أو مستند Word واحد")
+    export.add_argument("input", nargs="?", default="-", help="ملف نتائج JSONL، أو - للقراءة من stdin")
+    export.add_argument("--zip", help="أرشيف ZIP بملف HTML لكل مقال")
+    export.add_argument("--docx", help="مستند Word واحد يجمع كل المقالات")
+    export.set_defaults(handler=export_command)
+
+    index = commands.add_parser("index", help="تسجيل مقالات ملف نتائج JSONL في فهرس الروابط الداخلية")
+    index.add_argument("input", nargs="?", default="-", help="ملف نتائج JSONL، أو - للقراءة من stdin")
+    index.add_argument("--domain", required=True, help="دومين الموقع الذي نُشرت عليه المقالات")
+    index.set_defaults(handler=index_command)
+
+    validate = commands.add_parser("validate", help="فحص مقالات ملف نتائج JSONL بقواعد SEO")
+    validate.add_argument("input", nargs="?", default="-", help="ملف نتائج JSONL، أو - للقراءة من stdin")
+    validate.add_argument("-o", "--output", help="ملف JSONL للتقارير (الافتراضي stdout)")
+    validate.add_argument("--batch-size", type=int, default=256, help="عدد المقالات في كل دفعة فحص")
+    validate.set_defaults(handler=validate_command)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "run" and args.resume and not args.output:
+        parser.error("--resume يتطلب ملف نتائج عبر -o")
+    if args.command == "export" and not (args.zip or args.docx):
+        parser.error("حدد --zip أو --docx")
+    if args.command == "run" and args.resume and (args.zip or args.docx):
+        parser.error("--zip و--docx يُكتبان من جديد ولا يدعمان --resume؛ استخدم الأمر export بعد انتهاء الحملة")
+    summary = args.handler(args)
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
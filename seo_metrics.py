@@ -0,0 +1,217 @@
+import re
+from collections import deque
+from html.parser import HTMLParser
+
+# التشكيل وعلامات القرآن والمدّة الخنجرية
+_DIACRITICS_RE = re.compile(r'[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]')
+_TOKEN_RE = re.compile(r'\w+')
+_CHAR_MAP = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي",
+    "ة": "ه",
+    "ـ": "",  # التطويل
+    "٠": "0", "١": "1", "٢": "2", "٣": "3", "٤": "4",
+    "٥": "5", "٦": "6", "٧": "7", "٨": "8", "٩": "9",
+})
+_SKIP_TAGS = {"script", "style", "noscript"}
+_HEADING_TAGS = {"h1", "h2", "h3"}
+
+
+def normalize_arabic(text):
+    """
+    توحيد النص العربي للمقارنة: إزالة التشكيل والتطويل، وتوحيد أشكال الألف
+    والياء والتاء المربوطة، وتحويل الأرقام الهندية، وتصغير الحروف اللاتينية.
+    """
+    return _DIACRITICS_RE.sub("", text).translate(_CHAR_MAP).lower()
+
+
+def tokenize(text):
+    """تقسيم النص الموحَّد إلى كلمات."""
+    return _TOKEN_RE.findall(normalize_arabic(text))
+
+
+class _ArticleTextParser(HTMLParser):
+    """
+    تمريرة واحدة على HTML تُخرج كلمات النص المرئي مع رقم القسم (H2) لكل كلمة،
+    وقائمة العناوين H1–H3.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tokens = []
+        self.token_sections = []
+        self.sections = [{"heading": "", "start": 0}]
+        self.headings = []
+        self._skip = 0
+        self._heading = None
+        self._heading_text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _HEADING_TAGS:
+            self._heading = tag
+            self._heading_text = []
+            if tag == "h2":
+                self.sections.append({"heading": "", "start": len(self.tokens)})
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS and self._skip:
+            self._skip -= 1
+        elif tag == self._heading:
+            text = " ".join("".join(self._heading_text).split())
+            self.headings.append({"level": int(tag[1]), "text": text})
+            if tag == "h2":
+                self.sections[-1]["heading"] = text
+            self._heading = None
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._heading:
+            self._heading_text.append(data)
+        tokens = tokenize(data)
+        self.tokens.extend(tokens)
+        self.token_sections.extend([len(self.sections) - 1] * len(tokens))
+
+
+def strip_markup(html):
+    """إزالة وسوم HTML مرة واحدة وإرجاع النص المرئي فقط."""
+    parser = _ArticleTextParser()
+    parser.feed(html or "")
+    parser.close()
+    return " ".join(parser.tokens)
+
+
+def count_words(html):
+    """عدد كلمات النص المرئي فقط، دون وسوم HTML وسماتها."""
+    parser = _ArticleTextParser()
+    parser.feed(html or "")
+    parser.close()
+    return len(parser.tokens)
+
+
+class PhraseMatcher:
+    """
+    مطابقة عدد كبير من العبارات (كلمة أو أكثر) دفعة واحدة بخوارزمية Aho–Corasick
+    على مستوى الكلمات: تمريرة واحدة O(n) على النص مهما كان عدد العبارات.
+    يُبنى مرة واحدة ويُعاد استخدامه لكل المقالات في التدقيق الجماعي.
+    """
+
+    def __init__(self, phrases):
+        self.phrases = []
+        seen = set()
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for phrase in phrases:
+            if phrase in seen:
+                continue
+            seen.add(phrase)
+            index = len(self.phrases)
+            self.phrases.append(phrase)
+            tokens = tokenize(phrase)
+            if not tokens:
+                # عبارة بلا كلمات لا تطابق شيئاً لكنها تحتفظ برقمها (الكلمة المفتاحية دائماً رقم 0)
+                continue
+            node = 0
+            for token in tokens:
+                nxt = self._goto[node].get(token)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][token] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                node = nxt
+            self._output[node].append(index)
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(token, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def iter_matches(self, tokens):
+        """يُخرج (رقم العبارة، موضع آخر كلمة فيها) لكل تطابق."""
+        node = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for position, token in enumerate(tokens):
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            for index in output[node]:
+                yield index, position
+
+    def count(self, tokens):
+        counts = [0] * len(self.phrases)
+        for index, _ in self.iter_matches(tokens):
+            counts[index] += 1
+        return counts
+
+
+def analyze_seo_metrics(html, keyword, related_keywords=None, matcher=None):
+    """
+    تقرير SEO كامل للمقال في تمريرة واحدة على النص:
+    عدد الكلمات، تكرار وكثافة الكلمة المفتاحية، توزيعها على أقسام H2،
+    تغطية الكلمات المرتبطة، واستخدام الكلمة في العناوين.
+    يمكن تمرير matcher مبني مسبقاً (PhraseMatcher) لتوفير البناء في التدقيق الجماعي،
+    بشرط أن تكون الكلمة المفتاحية أول عبارة فيه.
+    """
+    if isinstance(related_keywords, str):
+        related_keywords = [k.strip() for k in re.split(r'[,،\n]', related_keywords) if k.strip()]
+    related_keywords = [k for k in related_keywords or [] if k != keyword]
+    if matcher is None:
+        matcher = PhraseMatcher([keyword] + related_keywords)
+
+    parser = _ArticleTextParser()
+    parser.feed(html or "")
+    parser.close()
+    tokens = parser.tokens
+    total_words = len(tokens)
+
+    counts = [0] * len(matcher.phrases)
+    section_counts = [0] * len(parser.sections)
+    for index, position in matcher.iter_matches(tokens):
+        counts[index] += 1
+        if index == 0:
+            section_counts[parser.token_sections[position]] += 1
+
+    sections = []
+    for i, section in enumerate(parser.sections):
+        end = parser.sections[i + 1]["start"] if i + 1 < len(parser.sections) else total_words
+        words = end - section["start"]
+        if i == 0 and not words:
+            continue
+        sections.append({
+            "heading": section["heading"] or ("المقدمة" if i == 0 else ""),
+            "word_count": words,
+            "keyword_count": section_counts[i],
+        })
+
+    heading_usage = {"h1": 0, "h2": 0, "h3": 0, "with_keyword": 0}
+    for heading in parser.headings:
+        heading_usage[f"h{heading['level']}"] += 1
+        if any(index == 0 for index, _ in matcher.iter_matches(tokenize(heading["text"]))):
+            heading_usage["with_keyword"] += 1
+
+    phrase_counts = dict(zip(matcher.phrases, counts))
+    keyword_count = counts[0] if counts else 0
+    coverage = {k: phrase_counts.get(k, 0) for k in related_keywords}
+    covered = sum(1 for c in coverage.values() if c)
+    return {
+        "word_count": total_words,
+        "keyword_count": keyword_count,
+        "density": round(keyword_count / total_words * 100, 2) if total_words else 0,
+        "sections": sections,
+        "related_coverage": coverage,
+        "related_coverage_ratio": round(covered / len(coverage), 2) if coverage else 1.0,
+        "headings": heading_usage,
+    }
@@ -0,0 +1,463 @@
+"""
+مدقق SEO بعد التوليد مع إصلاح موجَّه للأجزاء المخالفة فقط.
+
+يُحلَّل كل مقال مرة واحدة (تمريرة HTMLParser واحدة + مطابقة العبارات بـ PhraseMatcher)
+ويُفحص مقابل قواعد طلب generate_content: الطول الإجمالي، طول كل قسم H2، طول المقدمة،
+طول Meta Description واحتواؤها على الكلمة المفتاحية، كثافة الكلمة المفتاحية، الكلمات
+المرتبطة، ونصوص الربط. النتيجة تقرير لكل قاعدة (القيمة الفعلية، المطلوب، والأجزاء المخالفة).
+
+عند الفشل لا يُعاد توليد المقال: تُرسل طلبات صغيرة للأجزاء المخالفة فقط (Meta Description،
+المقدمة، أو قسم بعينه مع تعليمات محددة: توسيعه، إضافة رابط أو كلمة ناقصة، ضبط تكرار الكلمة)
+بالتوازي، ثم تُستبدل تلك الأجزاء في نفس HTML ويُعاد الفحص.
+التدقيق الجماعي يعمل في مجموعة عمليات (process pool) لأن التحليل عمل معالج وليس انتظار شبكة.
+"""
+import math
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from async_network import pool_context
+from seo_metrics import _ArticleTextParser, PhraseMatcher, tokenize, count_words
+from content_generator import (
+    run_section_tasks, extract_meta_description, _strip_fences, _FAQ_RE, _INTRO_OUTRO_RE,
+)
+
+# حدود القواعد كما في طلب generate_content
+MIN_WORDS = 2500
+MIN_SECTION_WORDS = 150
+INTRO_WORDS = (70, 100)
+META_CHARS = (150, 160)
+DENSITY = (1.0, 2.0)
+# جولات الإصلاح القصوى (إصلاح ثم إعادة فحص) قبل قبول المقال كما هو
+MAX_REPAIR_ROUNDS = 2
+# أقصى عدد من الأقسام تُوسَّع لتعويض نقص الطول الإجمالي
+LENGTH_REPAIR_SECTIONS = 3
+VALIDATE_WORKERS = min(4, os.cpu_count() or 1)
+
+RULE_LABELS = {
+    "length": "الطول الإجمالي",
+    "sections": "طول أقسام H2",
+    "intro": "طول المقدمة",
+    "meta": "Meta Description",
+    "density": "كثافة الكلمة المفتاحية",
+    "related": "الكلمات المرتبطة",
+    "anchors": "نصوص الربط",
+}
+
+_INTRO_RE = re.compile(r'^(ال)?مقدمة|^introduction', re.IGNORECASE)
+_H2_RE = re.compile(r'<h2[^>]*>.*?</h2>', re.IGNORECASE | re.DOTALL)
+_H1_RE = re.compile(r'<h1[^>]*>.*?</h1>', re.IGNORECASE | re.DOTALL)
+_NAV_RE = re.compile(r'<nav[^>]*>.*?</nav>', re.IGNORECASE | re.DOTALL)
+# فقرة Meta Description كاملة (أو السطر وحده إن لم تكن داخل <p>)
+_META_BLOCK_RE = re.compile(r'<p[^>]*>(?:(?!</p>).)*?Meta Description.*?</p>|Meta Description[^\n<]*', re.IGNORECASE | re.DOTALL)
+
+_pool = None
+_lock = threading.Lock()
+
+
+class _ValidatorParser(_ArticleTextParser):
+    """
+    نفس تمريرة _ArticleTextParser مع ما تحتاجه القواعد: كلمات عناوين H1/H2 في كل قسم
+    (لا تُحتسب من طول القسم)، والروابط مع القسم الذي وردت فيه. فهرس المحتوى (nav) يُتخطى.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.heading_words = [0]
+        self.links = []
+        self._link = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "nav":
+            self._skip += 1
+            return
+        super().handle_starttag(tag, attrs)
+        if tag == "h2":
+            self.heading_words.append(0)
+        elif tag == "a" and not self._skip:
+            self._link = {"href": dict(attrs).get("href") or "", "section": len(self.sections) - 1}
+
+    def handle_endtag(self, tag):
+        if tag == "nav":
+            self._skip = max(0, self._skip - 1)
+            return
+        super().handle_endtag(tag)
+        if tag == "a" and self._link is not None:
+            self.links.append(self._link)
+            self._link = None
+
+    def handle_data(self, data):
+        before = len(self.tokens)
+        super().handle_data(data)
+        if self._heading in ("h1", "h2"):
+            self.heading_words[-1] += len(self.tokens) - before
+
+
+def _split_list(value):
+    if isinstance(value, str):
+        return [k.strip() for k in re.split(r'[,،\n]', value) if k.strip()]
+    return [k for k in value or [] if k]
+
+
+def _normalize_url(url):
+    return (url or "").strip().rstrip("/").lower()
+
+
+def _rule(rule, ok, actual, expected, details=None):
+    return {"rule": rule, "label": RULE_LABELS[rule], "ok": ok, "actual": actual, "expected": expected,
+            "details": details or []}
+
+
+def validate_article(article, data, matcher=None):
+    """
+    فحص مقال مقابل قواعد SEO في تمريرة واحدة على HTML.
+    article: {"html", "meta_description"}، data: مدخلات التوليد (main_keyword، related_keywords، anchors).
+    يعيد {"ok", "word_count", "keyword_count", "density", "meta", "sections", "rules"}؛
+    كل قاعدة {"rule", "label", "ok", "actual", "expected", "details"}.
+    """
+    keyword = data["main_keyword"]
+    related = [k for k in _split_list(data.get("related_keywords")) if k != keyword]
+    anchors = [a for a in data.get("anchors") or [] if a.get("text") and a.get("url")]
+    if matcher is None:
+        matcher = PhraseMatcher([keyword] + related)
+
+    html = article.get("html") or ""
+    meta = article.get("meta_description") or extract_meta_description(html)
+    # فقرة Meta Description ليست من نص المقال
+    parser = _ValidatorParser()
+    parser.feed(_META_BLOCK_RE.sub("", html))
+    parser.close()
+    tokens = parser.tokens
+    total_words = len(tokens)
+
+    counts = [0] * len(matcher.phrases)
+    section_counts = [0] * len(parser.sections)
+    for index, position in matcher.iter_matches(tokens):
+        counts[index] += 1
+        if index == 0:
+            section_counts[parser.token_sections[position]] += 1
+    keyword_count = counts[0] if counts else 0
+    density = round(keyword_count / total_words * 100, 2) if total_words else 0
+
+    sections = []
+    intro_words = 0
+    for i, section in enumerate(parser.sections):
+        end = parser.sections[i + 1]["start"] if i + 1 < len(parser.sections) else total_words
+        words = end - section["start"] - parser.heading_words[i]
+        heading = section["heading"]
+        if i == 0 or _INTRO_RE.match(heading):
+            kind = "intro"
+            intro_words += words
+        elif _FAQ_RE.search(heading):
+            kind = "faq"
+        elif _INTRO_OUTRO_RE.match(heading):
+            kind = "closing"
+        else:
+            kind = "body"
+        if i:
+            sections.append({
+                "part": f"h2-{i}",
+                "heading": heading,
+                "kind": kind,
+                "word_count": words,
+                "keyword_count": section_counts[i],
+                "links": sum(1 for link in parser.links if link["section"] == i),
+            })
+    body = [s for s in sections if s["kind"] == "body"]
+
+    rules = [_rule("length", total_words >= MIN_WORDS, total_words, f"≥ {MIN_WORDS} كلمة")]
+    short = [
+        {"part": s["part"], "heading": s["heading"], "word_count": s["word_count"]}
+        for s in body if s["word_count"] < MIN_SECTION_WORDS
+    ]
+    rules.append(_rule(
+        "sections", bool(body) and not short,
+        f"{len(body) - len(short)}/{len(body)}" if body else "لا توجد أقسام H2",
+        f"≥ {MIN_SECTION_WORDS} كلمة لكل قسم", short,
+    ))
+    rules.append(_rule(
+        "intro", INTRO_WORDS[0] <= intro_words <= INTRO_WORDS[1], intro_words,
+        f"{INTRO_WORDS[0]}-{INTRO_WORDS[1]} كلمة",
+    ))
+    meta_has_keyword = bool(meta) and any(index == 0 for index, _ in matcher.iter_matches(tokenize(meta)))
+    meta_problems = []
+    if not meta:
+        meta_problems.append("غير موجودة")
+    elif not META_CHARS[0] <= len(meta) <= META_CHARS[1]:
+        meta_problems.append(f"{len(meta)} حرف")
+    if meta and not meta_has_keyword:
+        meta_problems.append("لا تحتوي الكلمة المفتاحية")
+    rules.append(_rule(
+        "meta", not meta_problems, f"{len(meta)} حرف" if meta else "غير موجودة",
+        f"{META_CHARS[0]}-{META_CHARS[1]} حرف مع الكلمة المفتاحية", meta_problems,
+    ))
+    rules.append(_rule(
+        "density", DENSITY[0] <= density <= DENSITY[1], f"{density}% ({keyword_count} مرة)",
+        f"{DENSITY[0]:g}-{DENSITY[1]:g}%",
+    ))
+    phrase_counts = dict(zip(matcher.phrases, counts))
+    missing_related = [k for k in related if not phrase_counts.get(k)]
+    rules.append(_rule(
+        "related", not missing_related, f"{len(related) - len(missing_related)}/{len(related)}",
+        "كل كلمة مرتبطة مرة واحدة على الأقل", missing_related,
+    ))
+    hrefs = {_normalize_url(link["href"]) for link in parser.links}
+    missing_anchors = [a for a in anchors if _normalize_url(a["url"]) not in hrefs]
+    rules.append(_rule(
+        "anchors", not missing_anchors, f"{len(anchors) - len(missing_anchors)}/{len(anchors)}",
+        "كل نصوص الربط كروابط <a>", [{"text": a["text"], "url": a["url"]} for a in missing_anchors],
+    ))
+
+    return {
+        "ok": all(rule["ok"] for rule in rules),
+        "word_count": total_words,
+        "keyword_count": keyword_count,
+        "density": density,
+        "intro_words": intro_words,
+        "meta": meta,
+        "sections": sections,
+        "rules": rules,
+    }
+
+
+def _validate_payload(payload):
+    article, data = payload
+    return validate_article(article, data)
+
+
+def _payload(article, data):
+    # يُرسل إلى العملية الأخرى ما تحتاجه القواعد فقط
+    article = {"html": article.get("html") or "", "meta_description": article.get("meta_description") or ""}
+    data = {key: data.get(key) for key in ("main_keyword", "related_keywords", "anchors")}
+    return article, data
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=VALIDATE_WORKERS, mp_context=pool_context())
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _lock:
+        _pool = None
+
+
+def validate_batch(items, chunksize=8):
+    """
+    فحص مجموعة مقالات [(article, data), ...] في مجموعة عمليات؛ يعيد التقارير بنفس الترتيب.
+    يعود إلى الفحص المباشر إذا تعطلت مجموعة العمليات.
+    """
+    payloads = [_payload(article, data) for article, data in items]
+    if not payloads:
+        return []
+    try:
+        return list(_get_pool().map(_validate_payload, payloads, chunksize=chunksize))
+    except (BrokenProcessPool, OSError):
+        _reset_pool()
+        return [_validate_payload(payload) for payload in payloads]
+
+
+def validate_in_pool(article, data):
+    """فحص مقال واحد في مجموعة العمليات المشتركة (لعمال خط الإنتاج المتزامنين)."""
+    try:
+        return _get_pool().submit(_validate_payload, _payload(article, data)).result()
+    except (BrokenProcessPool, OSError):
+        _reset_pool()
+        return validate_article(article, data)
+
+
+def failed_rules(report):
+    return [rule["rule"] for rule in report["rules"] if not rule["ok"]]
+
+
+def plan_repairs(report, data):
+    """
+    تحويل القواعد المخالفة إلى تعليمات لكل جزء: {"meta": [...], "intro": [...], "h2-N": [...]}.
+    كل جزء يُصلَح بطلب واحد يجمع كل تعليماته.
+    """
+    rules = {rule["rule"]: rule for rule in report["rules"]}
+    keyword = data["main_keyword"]
+    body = [s for s in report["sections"] if s["kind"] == "body"]
+    repairs = {}
+    targets = {}
+
+    def add(part, instruction):
+        repairs.setdefault(part, []).append(instruction)
+
+    if not rules["meta"]["ok"]:
+        repairs["meta"] = rules["meta"]["details"]
+    if not rules["intro"]["ok"]:
+        add("intro", f"طول المقدمة الحالي {report['intro_words']} كلمة")
+    if not body:
+        return repairs
+
+    for short in rules["sections"]["details"]:
+        targets[short["part"]] = MIN_SECTION_WORDS + 20
+    deficit = MIN_WORDS - report["word_count"]
+    if deficit > 0:
+        # نقص الطول الإجمالي يُعوَّض بتوسيع أقصر الأقسام بدلاً من إعادة كتابة المقال
+        chosen = sorted(body, key=lambda s: s["word_count"])[:LENGTH_REPAIR_SECTIONS]
+        extra = math.ceil(deficit / len(chosen))
+        for section in chosen:
+            targets[section["part"]] = max(targets.get(section["part"], 0), section["word_count"] + extra)
+
+    # الهدف منتصف النطاق حتى لا تخرج الكثافة عنه مجدداً بتغير الطول بعد الإصلاح
+    words = report["word_count"] + max(deficit, 0)
+    target_count = round(words * (DENSITY[0] + DENSITY[1]) / 200)
+    if report["density"] < DENSITY[0]:
+        needed = target_count - report["keyword_count"]
+        per_section = math.ceil(needed / len(body))
+        for section in sorted(body, key=lambda s: s["keyword_count"]):
+            if needed <= 0:
+                break
+            add(section["part"], f'أضف الكلمة المفتاحية "{keyword}" {min(per_section, needed)} مرة بشكل طبيعي')
+            needed -= per_section
+    elif report["density"] > DENSITY[1]:
+        excess = report["keyword_count"] - target_count
+        for section in sorted(body, key=lambda s: -s["keyword_count"]):
+            if excess <= 0 or not section["keyword_count"]:
+                break
+            keep = max(1, section["keyword_count"] - excess)
+            add(section["part"], f'قلل تكرار الكلمة المفتاحية "{keyword}" إلى {keep} مرة واستبدل الباقي بمرادفات')
+            excess -= section["keyword_count"] - keep
+
+    # الروابط والكلمات الناقصة تُوزَّع على الأقسام التي ستُصلَح أصلاً أولاً، ثم على أقلها روابط
+    order = sorted(body, key=lambda s: (s["part"] not in repairs, s["links"]))
+    for i, anchor in enumerate(rules["anchors"]["details"]):
+        add(order[i % len(order)]["part"], f'أضف الرابط <a href="{anchor["url"]}">{anchor["text"]}</a> داخل فقرة بشكل طبيعي')
+    for i, phrase in enumerate(rules["related"]["details"]):
+        add(order[i % len(order)]["part"], f'أضف الكلمة المرتبطة "{phrase}" مرة واحدة بشكل طبيعي')
+
+    # القسم المعاد كتابته يحافظ على طوله على الأقل حتى لا يُحل خلل بخلق آخر
+    for section in body:
+        part = section["part"]
+        if part in targets:
+            repairs.setdefault(part, []).insert(
+                0, f"وسّع القسم إلى {targets[part]} كلمة على الأقل (طوله الحالي {section['word_count']} كلمة)"
+            )
+        elif part in repairs:
+            repairs[part].insert(0, f"حافظ على طول القسم: {section['word_count']} كلمة على الأقل")
+    return repairs
+
+
+def build_repair_tasks(article, data, report, repairs):
+    """طلبات الإصلاح الصغيرة بصيغة run_section_tasks: {اسم الجزء: (نص الطلب، الحد الأقصى للرموز)}."""
+    keyword = data["main_keyword"]
+    spans = _part_spans(article.get("html") or "")
+    headings = {s["part"]: s["heading"] for s in report["sections"]}
+    tasks = {}
+    for part, instructions in repairs.items():
+        if part == "meta":
+            tasks[part] = (f"""
+        اكتب Meta Description واحدة للمقال (150-160 حرف) تحتوي على الكلمة المفتاحية "{keyword}".
+        الوصف الحالي غير صالح ({'، '.join(instructions)}): {report['meta'] or 'لا يوجد'}
+        أعد النص فقط بدون أي تنسيق أو علامات تنصيص.
+        """, 200)
+        elif part == "intro":
+            start, end = spans["intro"]
+            tasks[part] = (f"""
+        أعد كتابة مقدمة المقال فقط (70-100 كلمة) تشمل الكلمة المفتاحية "{keyword}" بشكل طبيعي.
+        {'، '.join(instructions)}. المقدمة الحالية:
+        {_NAV_RE.sub('', article['html'][start:end]).strip()}
+        أعد فقرات HTML (<p>) فقط بدون أي عناوين.
+        """, 400)
+        elif part in spans:
+            start, end = spans[part]
+            changes = "\n".join(f"        - {instruction}" for instruction in instructions)
+            tasks[part] = (f"""
+        أعد كتابة القسم "{headings[part]}" من المقال مع الحفاظ على محتواه وعناوينه الفرعية وروابطه، مع هذه التعديلات فقط:
+{changes}
+        المحتوى الحالي للقسم:
+        {article['html'][start:end].strip()}
+        لا تكتب عنوان H2 للقسم. أعد HTML فقط (p, h3, ul, ol, li, strong, em, a).
+        """, 2000)
+    return tasks
+
+
+def _part_spans(html):
+    """مواضع الأجزاء القابلة للاستبدال في HTML: {"intro", "meta", "h2-N": (البداية، النهاية)}."""
+    meta = _META_BLOCK_RE.search(html)
+    limit = meta.start() if meta else len(html)
+    headings = [m for m in _H2_RE.finditer(html) if m.start() < limit]
+    spans = {}
+    if meta:
+        spans["meta"] = (meta.start(), meta.end())
+    h1 = _H1_RE.search(html)
+    start = h1.end() if h1 and (not headings or h1.end() <= headings[0].start()) else 0
+    spans["intro"] = (start, headings[0].start() if headings else limit)
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else limit
+        spans[f"h2-{i + 1}"] = (match.end(), end)
+        if _INTRO_RE.match(re.sub(r'<[^>]+>', '', match.group(0)).strip()):
+            # مقدمة مكتوبة كقسم H2 "مقدمة" تُستبدل في مكانها
+            spans["intro"] = spans[f"h2-{i + 1}"]
+    return spans
+
+
+def apply_repairs(article, parts):
+    """استبدال الأجزاء المصلحة في نفس HTML دون لمس باقي المقال."""
+    html = article.get("html") or ""
+    spans = _part_spans(html)
+    meta = article.get("meta_description") or ""
+    replacements = []
+    for part, text in parts.items():
+        text = _strip_fences(text)
+        if part == "meta":
+            meta = " ".join(text.strip('"\'').split())
+            block = f"<p><strong>Meta Description:</strong> {meta}</p>"
+            if "meta" in spans:
+                replacements.append(spans["meta"] + (block,))
+            else:
+                replacements.append((len(html), len(html), "\n" + block))
+            continue
+        start, end = spans[part]
+        text = re.sub(r'<h[12][^>]*>.*?</h[12]>', '', text, flags=re.IGNORECASE | re.DOTALL).strip()
+        if part == "intro":
+            # فهرس المحتوى يبقى بعد المقدمة الجديدة
+            text = "\n".join([text] + _NAV_RE.findall(html[start:end]))
+        replacements.append((start, end, "\n" + text + "\n"))
+    for start, end, text in sorted(replacements, reverse=True):
+        html = html[:start] + text + html[end:]
+    return dict(article, html=html, word_count=count_words(html), meta_description=meta)
+
+
+def summarize_validation(report, repaired=(), rounds=0):
+    """ملخص مختصر يُحفظ مع المقال وفي نتائج الحملات."""
+    return {
+        "ok": report["ok"],
+        "failed": failed_rules(report),
+        "rules": report["rules"],
+        "repaired": list(repaired),
+        "rounds": rounds,
+    }
+
+
+def repair_article(article, data, report=None, max_rounds=MAX_REPAIR_ROUNDS, force_refresh=False, max_workers=8):
+    """
+    إصلاح الأجزاء المخالفة فقط بطلبات صغيرة متوازية ثم إعادة الفحص، حتى max_rounds جولة.
+    يعيد المقال (بعد الإصلاح إن لزم) مع "validation": ملخص التقرير النهائي والأجزاء المصلحة.
+    """
+    data = dict(data, outline=data.get("outline") or "")
+    report = report or validate_article(article, data)
+    repaired = []
+    rounds = 0
+    while not report["ok"] and rounds < max_rounds:
+        tasks = build_repair_tasks(article, data, report, plan_repairs(report, data))
+        if not tasks:
+            break
+        rounds += 1
+        try:
+            parts = run_section_tasks(data, tasks, max_workers=max_workers, force_refresh=force_refresh, stage="repair")
+        except Exception as e:
+            print(f"خطأ في إصلاح المقال: {e}")
+            break
+        article = apply_repairs(article, parts)
+        repaired.extend(part for part in parts if part not in repaired)
+        report = validate_article(article, data)
+    return dict(article, validation=summarize_validation(report, repaired, rounds))
@@ -1,91 +1,281 @@
-import pandas as pd
-from docx import Document
-from docx.shared import Pt, RGBColor, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+import asyncio
 import os
+import re
+import zipfile
 from datetime import datetime
-from bs4 import BeautifulSoup
+from xml.sax.saxutils import escape, quoteattr
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from article_ledger import export_ledger_to_excel
+from metrics import instrumented
 
-def save_to_excel(article, keyword, metadata=None):
+_HEADING_LEVELS = {"h1": 1, "h2": 2, "h3": 3, "h4": 3, "h5": 3, "h6": 3}
+_BLOCK_TAGS = set(_HEADING_LEVELS) | {"p", "li", "blockquote", "pre", "td", "th", "dt", "dd", "figcaption"}
+_CONTAINER_TAGS = {"div", "section", "article", "nav", "ul", "ol", "table", "tr", "body", "header", "footer", "main", "aside"}
+_BOLD_TAGS = {"strong", "b"}
+_ITALIC_TAGS = {"em", "i"}
+_SKIP_TAGS = {"script", "style", "head", "title"}
+
+class _DocumentBuilder:
     """
-    يحفظ بيانات المقال والمنافسين في ملف Excel.
+    يبني نموذج المستند من أحداث التحليل المتدفقة (start / end / data / close).
+    نفس الواجهة تعمل كـ parser target في lxml وتُغذّى من html.parser كبديل.
+    كل عنصر يُنتج مرة واحدة فقط: الرابط داخل فقرة يصبح جزءاً (run) من الفقرة نفسها.
     """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    data = {
-        "الكلمة المفتاحية": [keyword],
-        "العنوان": [article.get("title", keyword)],
-        "عدد الكلمات": [article.get("word_count", 0)],
-        "التاريخ": [timestamp],
-        "الحالة": ["تم التوليد"],
-        "الدومين المستهدف": [metadata.get("target_domain", "") if metadata else ""],
-        "اللغة": [metadata.get("language", "العربية") if metadata else "العربية"]
-    }
+    def __init__(self):
+        self.blocks = []
+        self._block = None
+        self._lists = []
+        self._links = []
+        self._bold = 0
+        self._italic = 0
+        self._skip = 0
+    
+    def _open_block(self, tag, implicit=False):
+        self._close_block()
+        if tag in _HEADING_LEVELS:
+            block = {"type": "heading", "level": _HEADING_LEVELS[tag]}
+        elif tag == "li":
+            block = {"type": "list_item", "ordered": bool(self._lists and self._lists[-1] == "ol")}
+        else:
+            block = {"type": "paragraph"}
+        block["runs"] = []
+        block["_tag"] = tag
+        block["_implicit"] = implicit
+        self._block = block
+    
+    def _close_block(self):
+        block = self._block
+        self._block = None
+        if not block:
+            return
+        runs = block["runs"]
+        if runs:
+            runs[0]["text"] = runs[0]["text"].lstrip()
+            runs[-1]["text"] = runs[-1]["text"].rstrip()
+        block["runs"] = [r for r in runs if r["text"]]
+        block["text"] = "".join(r["text"] for r in block["runs"])
+        del block["_tag"], block["_implicit"]
+        if block["text"]:
+            self.blocks.append(block)
+    
+    def start(self, tag, attrib):
+        tag = tag.lower()
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _BLOCK_TAGS:
+            # الفقرة داخل عنصر قائمة تبقى جزءاً منه
+            if not (tag == "p" and self._block and self._block["_tag"] == "li"):
+                self._open_block(tag)
+        elif tag in ("ul", "ol"):
+            self._close_block()
+            self._lists.append(tag)
+        elif tag in _CONTAINER_TAGS:
+            if self._block and self._block["_implicit"]:
+                self._close_block()
+        elif tag == "br":
+            self.data("\n")
+        elif tag == "a":
+            self._links.append(dict(attrib).get("href", ""))
+        elif tag in _BOLD_TAGS:
+            self._bold += 1
+        elif tag in _ITALIC_TAGS:
+            self._italic += 1
+    
+    def end(self, tag):
+        tag = tag.lower()
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK_TAGS:
+            if self._block and self._block["_tag"] == tag:
+                self._close_block()
+        elif tag in ("ul", "ol"):
+            self._close_block()
+            if self._lists:
+                self._lists.pop()
+        elif tag in _CONTAINER_TAGS:
+            if self._block and self._block["_implicit"]:
+                self._close_block()
+        elif tag == "a" and self._links:
+            self._links.pop()
+        elif tag in _BOLD_TAGS:
+            self._bold = max(0, self._bold - 1)
+        elif tag in _ITALIC_TAGS:
+            self._italic = max(0, self._italic - 1)
+    
+    def data(self, text):
+        if self._skip:
+            return
+        if text != "\n":
+            collapsed = " ".join(text.split())
+            if not collapsed:
+                # مسافة بين عنصرين داخل السطر (مثل رابط يليه نص)
+                if self._block and self._block["runs"] and not self._block["runs"][-1]["text"].endswith(" "):
+                    self._block["runs"][-1]["text"] += " "
+                return
+            if text[0].isspace():
+                collapsed = " " + collapsed
+            if text[-1].isspace():
+                collapsed += " "
+            text = collapsed
+        if self._block is None:
+            if not text.strip():
+                return
+            self._open_block("p", implicit=True)
+        runs = self._block["runs"]
+        if runs and runs[-1]["text"].endswith((" ", "\n")) and text.startswith(" "):
+            text = text[1:]
+        run = {
+            "text": text,
+            "bold": bool(self._bold),
+            "italic": bool(self._italic),
+            "href": self._links[-1] if self._links else None,
+        }
+        if runs and all(runs[-1][k] == run[k] for k in ("bold", "italic", "href")):
+            runs[-1]["text"] += text
+        else:
+            runs.append(run)
+    
+    def close(self):
+        self._close_block()
+        return self.blocks
+
+class _StdlibHTMLAdapter(HTMLParser):
+    """تغذية _DocumentBuilder من html.parser عند عدم توفر lxml."""
     
-    df = pd.DataFrame(data)
-    file_path = f"/tmp/{keyword.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
     
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, attrs)
+    
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, attrs)
+        self.target.end(tag)
+    
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+    
+    def handle_data(self, data):
+        self.target.data(data)
+
+def _lxml_parser(target):
+    """محلل HTML من lxml يغذّي target، أو None إذا لم تكن lxml مثبتة. تُستورد lxml عند أول تصدير فقط."""
     try:
-        df.to_excel(file_path, index=False, sheet_name="المقالات")
-        return file_path
-    except Exception as e:
-        print(f"خطأ في حفظ Excel: {e}")
+        from lxml import etree
+    except ImportError:
         return None
+    return etree.HTMLParser(target=target, encoding="utf-8")
+
+def parse_article_blocks(html):
+    """
+    تحليل HTML المقال مرة واحدة بشكل متدفق إلى قائمة كتل (عناوين، فقرات، عناصر قوائم)،
+    كل كتلة تحتوي على أجزاء نصية (runs) بتنسيقها وروابطها.
+    يستخدم lxml إذا كان متاحاً (أسرع)، وإلا html.parser.
+    """
+    builder = _DocumentBuilder()
+    if not html:
+        return builder.close()
+    parser = _lxml_parser(builder)
+    if parser is not None:
+        parser.feed(html.encode("utf-8"))
+        return parser.close()
+    adapter = _StdlibHTMLAdapter(builder)
+    adapter.feed(html)
+    adapter.close()
+    return builder.close()
 
-def save_to_docx(article, keyword, metadata=None):
+def build_article_document(article, keyword, metadata=None):
+    """
+    نموذج وسيط للمقال يُبنى مرة واحدة ويُستخدم في كل صيغ التصدير:
+    العنوان والبيانات الوصفية وتوقيت موحد واسم ملف مشترك وكتل المحتوى المحللة.
+    """
+    created_at = datetime.now()
+    return {
+        "keyword": keyword,
+        "title": article.get("title", keyword),
+        "word_count": article.get("word_count", 0),
+        "meta_description": article.get("meta_description", ""),
+        "html": article.get("html", ""),
+        "metadata": metadata or {},
+        "created_at": created_at,
+        "timestamp": created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "file_stem": f"/tmp/{keyword.replace(' ', '_')}_{created_at.strftime('%Y%m%d_%H%M%S')}",
+        "blocks": parse_article_blocks(article.get("html", "")),
+    }
+
+@instrumented("export_excel")
+def save_to_excel(article, keyword, metadata=None, document=None):
+    """
+    يصدّر من سجل المقالات الدائم (article_ledger) مصنف Excel يضم كل مقالات هذه
+    الكلمة المفتاحية بدلاً من ملف منفصل لكل مقال. المقال يُسجَّل مرة واحدة عند توليده
+    (خط الإنتاج أو طابور المهام)، فلا يضيف تكرار الحفظ صفوفاً مكررة.
+    """
+    document = document or build_article_document(article, keyword, metadata)
+    return export_ledger_to_excel(f"{document['file_stem']}.xlsx", keyword=keyword)
+
+def _add_docx_runs(para, runs):
+    from docx.shared import RGBColor
+    
+    for part in runs:
+        run = para.add_run(part["text"])
+        run.bold = part["bold"] or None
+        run.italic = part["italic"] or None
+        if part["href"]:
+            run.font.color.rgb = RGBColor(0, 0, 255)
+            run.underline = True
+
+@instrumented("export_docx")
+def save_to_docx(article, keyword, metadata=None, document=None):
     """
     يحفظ محتوى المقال في ملف Word مع تنسيق احترافي.
     """
+    # python-docx يُستورد عند أول تصدير فقط؛ معظم تشغيلات الواجهة لا تصل إلى المصدّرات
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    
+    document = document or build_article_document(article, keyword, metadata)
     doc = Document()
     
     # إضافة العنوان الرئيسي
-    title = doc.add_heading(article.get("title", keyword), 0)
+    title = doc.add_heading(document["title"], 0)
     title.alignment = WD_ALIGN_PARAGRAPH.CENTER
     
     # إضافة معلومات المقال
-    if metadata:
+    if document["metadata"]:
         info_para = doc.add_paragraph()
         info_para.add_run(f"الكلمة المفتاحية: ").bold = True
-        info_para.add_run(metadata.get("main_keyword", ""))
+        info_para.add_run(document["metadata"].get("main_keyword", ""))
         
         info_para.add_run("\n")
         info_para.add_run(f"تاريخ الإنشاء: ").bold = True
-        info_para.add_run(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    
-    # تحويل HTML إلى نص منسق
-    html_content = article.get("html", "")
-    if html_content:
-        try:
-            soup = BeautifulSoup(html_content, "html.parser")
-            
-            for element in soup.find_all(['h1', 'h2', 'h3', 'p', 'li', 'a']):
-                if element.name == 'h1':
-                    heading = doc.add_heading(element.get_text(), level=1)
-                elif element.name == 'h2':
-                    heading = doc.add_heading(element.get_text(), level=2)
-                elif element.name == 'h3':
-                    heading = doc.add_heading(element.get_text(), level=3)
-                elif element.name == 'p':
-                    para = doc.add_paragraph(element.get_text())
-                    para.paragraph_format.line_spacing = 1.5
-                elif element.name == 'li':
-                    doc.add_paragraph(element.get_text(), style='List Bullet')
-                elif element.name == 'a':
-                    para = doc.add_paragraph()
-                    run = para.add_run(element.get_text())
-                    run.font.color.rgb = RGBColor(0, 0, 255)
-                    run.underline = True
-                    
-        except Exception as e:
-            print(f"خطأ في تحويل HTML: {e}")
-            doc.add_paragraph(html_content)
+        info_para.add_run(document["timestamp"])
+    
+    # تحويل كتل المستند (المحللة مرة واحدة) إلى فقرات Word
+    try:
+        for block in document["blocks"]:
+            if block["type"] == "heading":
+                doc.add_heading(block["text"], level=block["level"])
+            elif block["type"] == "list_item":
+                para = doc.add_paragraph(style='List Number' if block["ordered"] else 'List Bullet')
+                _add_docx_runs(para, block["runs"])
+            else:
+                para = doc.add_paragraph()
+                para.paragraph_format.line_spacing = 1.5
+                _add_docx_runs(para, block["runs"])
+    except Exception as e:
+        print(f"خطأ في تحويل HTML: {e}")
+        doc.add_paragraph(document["html"])
     
     # إضافة Meta Description في النهاية
     if "meta_description" in article:
         doc.add_heading("وصف الميتا", level=2)
-        doc.add_paragraph(article["meta_description"])
+        doc.add_paragraph(document["meta_description"])
     
-    file_path = f"/tmp/{keyword.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
+    file_path = f"{document['file_stem']}.docx"
     
     try:
         doc.save(file_path)
@@ -94,18 +284,16 @@ def save_to_docx(article, keyword, metadata=None):
         print(f"خطأ في حفظ Docx: {e}")
         return None
 
-def save_to_html(article, keyword):
-    """
-    يحفظ المقال كملف HTML مستقل.
-    """
-    html_template = f"""
+def render_article_html(document):
+    """صفحة HTML مستقلة للمقال من النموذج الوسيط (مشتركة بين الملف المفرد وأرشيف الحملة)."""
+    return f"""
     <!DOCTYPE html>
     <html dir="rtl" lang="ar">
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>{article.get('title', keyword)}</title>
-        <meta name="description" content="{article.get('meta_description', '')}">
+        <title>{document['title']}</title>
+        <meta name="description" content="{document['meta_description']}">
         <style>
             body {{
                 font-family: 'Cairo', Arial, sans-serif;
@@ -137,26 +325,252 @@ def save_to_html(article, keyword):
         </style>
     </head>
     <body>
-        <h1>{article.get('title', keyword)}</h1>
+        <h1>{document['title']}</h1>
         <div class="meta-info">
-            <p><strong>عدد الكلمات:</strong> {article.get('word_count', 0)}</p>
-            <p><strong>تاريخ الإنشاء:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+            <p><strong>عدد الكلمات:</strong> {document['word_count']}</p>
+            <p><strong>تاريخ الإنشاء:</strong> {document['timestamp']}</p>
         </div>
-        {article.get('html', '')}
+        {document['html']}
     </body>
     </html>
     """
-    
-    file_path = f"/tmp/{keyword.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
+
+@instrumented("export_html")
+def save_to_html(article, keyword, document=None):
+    """
+    يحفظ المقال كملف HTML مستقل.
+    """
+    document = document or build_article_document(article, keyword)
+    file_path = f"{document['file_stem']}.html"
     
     try:
         with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(html_template)
+            f.write(render_article_html(document))
         return file_path
     except Exception as e:
         print(f"خطأ في حفظ HTML: {e}")
         return None
 
+def save_all_formats(article, keyword, metadata=None, include_excel=True):
+    """
+    يحفظ المقال بصيغ Excel وDocx وHTML معاً: تحليل HTML مرة واحدة إلى نموذج مشترك،
+    ثم كتابة الملفات بالتوازي. يعيد {"excel", "docx", "html"} بمسارات الملفات.
+    include_excel=False يتخطى Excel (مثلاً في الحملات التي تسجل في السجل دفعة واحدة).
+    """
+    document = build_article_document(article, keyword, metadata)
+    tasks = {
+        "docx": (save_to_docx, article, keyword, metadata, document),
+        "html": (save_to_html, article, keyword, document),
+    }
+    if include_excel:
+        tasks["excel"] = (save_to_excel, article, keyword, metadata, document)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        # نسخ السياق حتى تُنسب مقاييس التصدير إلى نفس المقال
+        futures = {
+            name: pool.submit(contextvars.copy_context().run, *task)
+            for name, task in tasks.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+# تصدير الحملات: كل مقال يُكتب في الأرشيف فور تجهيزه ثم يُحرَّر من الذاكرة،
+# فيبقى الاستهلاك ثابتاً مهما كان عدد المقالات بدلاً من آلاف الملفات المتفرقة في /tmp
+
+def _archive_name(index, keyword):
+    slug = re.sub(r'[^\w\s-]', '', keyword.lower())
+    slug = re.sub(r'[\s_-]+', '-', slug).strip('-')[:80] or "article"
+    return f"{index:05d}_{slug}"
+
+class HtmlZipExporter:
+    """
+    أرشيف ZIP لحملة كاملة: ملف HTML مستقل لكل مقال (بنفس قالب save_to_html)
+    وصفحة index.html بروابط كل المقالات تُكتب عند الإغلاق.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self._index = []
+    
+    def add(self, article, keyword, metadata=None):
+        document = build_article_document(article, keyword, metadata)
+        self.count += 1
+        name = f"{_archive_name(self.count, keyword)}.html"
+        self._zip.writestr(name, render_article_html(document))
+        self._index.append((name, document["title"]))
+        return name
+    
+    def close(self):
+        if self._zip is None:
+            return self.path
+        links = "\n".join(
+            f'<li><a href={quoteattr(name)}>{escape(title)}</a></li>' for name, title in self._index
+        )
+        self._zip.writestr("index.html", (
+            '<!DOCTYPE html>\n<html dir="rtl" lang="ar"><head><meta charset="UTF-8">'
+            f'<title>مقالات الحملة ({self.count})</title></head><body><ol>\n{links}\n</ol></body></html>'
+        ))
+        self._zip.close()
+        self._zip = None
+        return self.path
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+_W_NS = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+)
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+_DOCX_PACKAGE_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/></Relationships>'
+)
+_DOCX_HEADING_SIZES = {0: 52, 1: 36, 2: 30, 3: 26}
+
+def _docx_styles():
+    headings = "".join(
+        f'<w:style w:type="paragraph" w:styleId="{"Title" if level == 0 else f"Heading{level}"}">'
+        f'<w:name w:val="{"Title" if level == 0 else f"heading {level}"}"/><w:basedOn w:val="Normal"/>'
+        f'<w:next w:val="Normal"/><w:qFormat/><w:pPr><w:keepNext/><w:spacing w:before="240" w:after="120"/>'
+        + ('' if level == 0 else f'<w:outlineLvl w:val="{level - 1}"/>')
+        + f'</w:pPr><w:rPr><w:b/><w:bCs/><w:color w:val="2C3E50"/><w:sz w:val="{size}"/><w:szCs w:val="{size}"/></w:rPr>'
+        '</w:style>'
+        for level, size in _DOCX_HEADING_SIZES.items()
+    )
+    return (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:styles {_W_NS}>'
+        '<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:ascii="Arial" w:hAnsi="Arial" w:cs="Arial"/>'
+        '<w:sz w:val="24"/><w:szCs w:val="24"/><w:rtl/></w:rPr></w:rPrDefault>'
+        '<w:pPrDefault><w:pPr><w:bidi/><w:spacing w:after="160" w:line="360" w:lineRule="auto"/></w:pPr>'
+        '</w:pPrDefault></w:docDefaults>'
+        '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/></w:style>'
+        f'{headings}'
+        '<w:style w:type="paragraph" w:styleId="ListParagraph"><w:name w:val="List Paragraph"/>'
+        '<w:basedOn w:val="Normal"/><w:pPr><w:ind w:start="720"/></w:pPr></w:style>'
+        '<w:style w:type="character" w:styleId="Hyperlink"><w:name w:val="Hyperlink"/>'
+        '<w:rPr><w:color w:val="0000FF"/><w:u w:val="single"/></w:rPr></w:style>'
+        '</w:styles>'
+    )
+
+# محارف التحكم غير مسموحة في XML 1.0
+_XML_INVALID_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _xml_text(text):
+    return escape(_XML_INVALID_RE.sub('', text))
+
+class DocxStreamExporter:
+    """
+    مستند Word واحد لكل مقالات الحملة يُكتب كـ WordprocessingML مباشرة داخل الحزمة (ZIP)
+    أثناء التوليد: كل مقال يبدأ بصفحة جديدة، ولا يُحتفظ في الذاكرة إلا بقائمة الروابط
+    (علاقات الـ hyperlinks تُكتب بعد انتهاء المستند). بخلاف save_to_docx لا يُبنى Document كامل.
+    """
+    
+    def __init__(self, path, title=None):
+        self.path = path
+        self.count = 0
+        self._links = []
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self._zip.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        self._zip.writestr("_rels/.rels", _DOCX_PACKAGE_RELS)
+        self._zip.writestr("word/styles.xml", _docx_styles())
+        self._body = self._zip.open("word/document.xml", "w", force_zip64=True)
+        self._write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document {_W_NS}><w:body>')
+        if title:
+            self._paragraph([{"text": title, "bold": False, "italic": False, "href": None}], style="Title")
+    
+    def _write(self, xml):
+        self._body.write(xml.encode("utf-8"))
+    
+    def _runs(self, runs, prefix=""):
+        parts = []
+        for i, run in enumerate(runs):
+            # ترتيب خصائص الـ run يفرضه مخطط WordprocessingML: (rStyle)، b/bCs، i/iCs، ثم rtl
+            props = ("<w:b/><w:bCs/>" if run["bold"] else "") + ("<w:i/><w:iCs/>" if run["italic"] else "") + "<w:rtl/>"
+            text = (prefix if i == 0 else "") + run["text"]
+            xml = f'<w:r><w:rPr>{props}</w:rPr><w:t xml:space="preserve">{_xml_text(text)}</w:t></w:r>'
+            if run["href"]:
+                self._links.append(run["href"])
+                rel_id = f"rId{len(self._links) + 1}"
+                xml = (
+                    f'<w:hyperlink r:id="{rel_id}"><w:r><w:rPr><w:rStyle w:val="Hyperlink"/>{props}</w:rPr>'
+                    f'<w:t xml:space="preserve">{_xml_text(text)}</w:t></w:r></w:hyperlink>'
+                )
+            parts.append(xml)
+        return "".join(parts)
+    
+    def _paragraph(self, runs, style=None, prefix="", page_break=False):
+        style_xml = f'<w:pStyle w:val="{style}"/>' if style else ""
+        before = '<w:pageBreakBefore/>' if page_break else ""
+        self._write(f'<w:p><w:pPr>{style_xml}{before}<w:bidi/></w:pPr>{self._runs(runs, prefix)}</w:p>')
+    
+    def add(self, article, keyword, metadata=None):
+        document = build_article_document(article, keyword, metadata)
+        self.count += 1
+        plain = lambda text, bold=False: {"text": text, "bold": bold, "italic": False, "href": None}
+        self._paragraph([plain(document["title"])], style="Heading1", page_break=self.count > 1)
+        self._paragraph([
+            plain("الكلمة المفتاحية: ", True), plain(keyword),
+            plain(" — تاريخ الإنشاء: ", True), plain(document["timestamp"]),
+        ])
+        number = 0
+        for block in document["blocks"]:
+            if block["type"] == "heading":
+                # عنوان المقال (H1) صار عنوان قسمه في المستند المجمّع، فتنزل باقي العناوين مستوى
+                self._paragraph(block["runs"], style=f"Heading{min(3, block['level'] + 1)}")
+            elif block["type"] == "list_item":
+                number = number + 1 if block["ordered"] else 0
+                self._paragraph(block["runs"], style="ListParagraph", prefix=f"{number}. " if block["ordered"] else "• ")
+            else:
+                number = 0
+                self._paragraph(block["runs"])
+        if document["meta_description"]:
+            self._paragraph([plain("وصف الميتا")], style="Heading3")
+            self._paragraph([plain(document["meta_description"])])
+        return self.count
+    
+    def close(self):
+        if self._zip is None:
+            return self.path
+        self._write('<w:sectPr><w:bidi/></w:sectPr></w:body></w:document>')
+        self._body.close()
+        relationships = "".join(
+            f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink" '
+            f'Target={quoteattr(_XML_INVALID_RE.sub("", url))} TargetMode="External"/>'
+            for i, url in enumerate(self._links, 2)
+        )
+        self._zip.writestr("word/_rels/document.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            f'Target="styles.xml"/>{relationships}</Relationships>'
+        ))
+        self._zip.close()
+        self._zip = None
+        return self.path
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
 def upload_to_google_drive(file_path, folder_id=None):
     """
     يرفع الملف إلى Google Drive.
@@ -180,3 +594,10 @@ def upload_to_google_drive(file_path, folder_id=None):
         return f"تم الرفع بنجاح! معرف الملف: {file.get('id')}"
     except Exception as e:
         return f"خطأ في الرفع إلى Google Drive: {str(e)}"
+
+async def aupload_to_google_drive(file_path, folder_id=None):
+    """
+    نسخة upload_to_google_drive للكود غير المتزامن.
+    عميل Google (googleapiclient) متزامن فقط، لذا يُنفَّذ الرفع في thread دون إيقاف الحلقة المشتركة.
+    """
+    return await asyncio.to_thread(upload_to_google_drive, file_path, folder_id)
@@ -1,9 +1,23 @@
 import streamlit as st
-import pandas as pd
-from competitor_analysis import analyze_competitors
-from content_generator import generate_outline, generate_content, count_keyword_density
-from wordpress_handler import upload_to_wordpress
-from storage_handler import save_to_excel, save_to_docx, save_to_html
+import time
+from datetime import datetime
+from seo_metrics import analyze_seo_metrics
+from wordpress_handler import publish_to_wordpress, describe_upload, register_site_credentials
+from article_ledger import ledger_summary, export_ledger_to_excel, STATUS_LABELS
+from metrics import article_context, summarize_metrics
+from cache_handler import cache_stats, clear_cache
+from semantic_cache import clear_semantic_cache
+from rate_limiter import limiter_stats
+from article_refresh import has_versions, load_latest_version
+from link_planner import suggest_anchors, index_article
+from page_snapshots import snapshot_stats, page_history
+from seo_validator import validate_article
+from job_queue import submit_job, get_job, cancel_job, list_jobs, start_workers, JOB_STATUS_LABELS
+from workspace import (
+    create_project, default_project, list_projects, list_keywords, get_keyword, get_keyword_by_id,
+    ensure_keyword, load_artifact, discard_artifact, reserve_job, forget_job, set_publish_status,
+    KEYWORD_STATUS_LABELS,
+)
 import os
 
 # إعدادات الصفحة
@@ -52,30 +66,197 @@ st.markdown("""
 st.title("🚀 نظام أتمتة المحتوى الذكي (SEO AI Automation)")
 st.markdown("---")
 
-# تهيئة Session State
-if 'analysis_results' not in st.session_state:
-    st.session_state.analysis_results = None
-if 'outline' not in st.session_state:
-    st.session_state.outline = None
-if 'article' not in st.session_state:
-    st.session_state.article = None
+# تهيئة Session State: الجلسة لا تحتفظ إلا بالمشروع والمدخلات، والنتائج (التحليل، المخطط،
+# المقال، الملفات) تُقرأ من مساحة العمل المشتركة بأرقامها فيراها كل المحررين دون إعادة حساب
 if 'anchors' not in st.session_state:
     st.session_state.anchors = [{"text": "", "url": ""}]
+if 'project_id' not in st.session_state:
+    # استعادة المشروع والكلمة من الرابط حتى لا يضيع العمل عند تحديث الصفحة
+    project_param = st.query_params.get("project", "")
+    st.session_state.project_id = int(project_param) if project_param.isdigit() else default_project()
+    keyword_param = st.query_params.get("keyword", "")
+    st.session_state.open_keyword = int(keyword_param) if keyword_param.isdigit() else None
+    st.session_state.job_states = {}
+
+JOB_MESSAGES = {
+    "analysis": "جاري تحليل المنافسين...",
+    "outline": "جاري إنشاء المخطط...",
+    "article": "جاري كتابة المقال (قد يستغرق ذلك بضع دقائق)...",
+    "refresh": "جاري تحديث الأقسام المتغيرة فقط...",
+    "repair": "جاري إصلاح الأجزاء المخالفة لقواعد SEO فقط...",
+    "export": "جاري حفظ الملفات...",
+}
+
+# عمال الخلفية داخل عملية الخادم؛ اضبطه على 0 عند تشغيل job_queue.py كعملية مستقلة
+EMBEDDED_WORKERS = int(os.environ.get("SEO_EMBEDDED_WORKERS", "2"))
+
+
+@st.cache_resource
+def _embedded_workers(count):
+    return start_workers(count) if count > 0 else None
+
+
+_embedded_workers(EMBEDDED_WORKERS)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def cached_artifact(artifact_id):
+    # النسخ المحفوظة لا تتغير بعد كتابتها، فتُخزَّن مرة واحدة لكل الجلسات بدلاً من نسخة لكل تبويب
+    return load_artifact(artifact_id)
+
+
+def _job_is_active(job_id):
+    job = get_job(job_id)
+    return job is not None and job["status"] in ("queued", "running")
+
+
+def open_keyword(keyword_id):
+    st.session_state.open_keyword = keyword_id
+    if keyword_id:
+        st.query_params["keyword"] = str(keyword_id)
+    else:
+        st.query_params.pop("keyword", None)
+
+
+def switch_project(project_id):
+    st.session_state.project_id = project_id
+    st.query_params["project"] = str(project_id)
+    open_keyword(None)
+
+
+def load_keyword_inputs(keyword_id):
+    """ملء حقول الإدخال بمدخلات كلمة محفوظة في المشروع (قبل رسم الحقول)."""
+    item = get_keyword_by_id(keyword_id)
+    if item is None:
+        return
+    inputs = item["inputs"]
+    st.session_state.main_kw = item["keyword"]
+    st.session_state.related_kw = inputs.get("related_keywords", "")
+    st.session_state.target_dom = inputs.get("target_domain", "")
+    if inputs.get("language"):
+        st.session_state.lang_choice = inputs["language"]
+    st.session_state.anchors = [dict(a) for a in inputs.get("anchors") or []] or [{"text": "", "url": ""}]
+    for key in [k for k in st.session_state if k.startswith(("at_", "au_"))]:
+        del st.session_state[key]
+    open_keyword(keyword_id)
+
+
+def _on_keyword_picked():
+    if st.session_state.keyword_picker:
+        load_keyword_inputs(st.session_state.keyword_picker)
+
+
+def current_inputs():
+    return {
+        "related_keywords": related_keywords,
+        "anchors": [a for a in st.session_state.anchors if a['text'] and a['url']],
+        "target_domain": target_domain,
+        "language": target_language,
+    }
+
+
+def submit_background_job(kind, payload):
+    """
+    إرسال مهمة للكلمة المفتوحة في المشروع. إن كان محرر آخر قد أرسل نفس المهمة لنفس الكلمة
+    ولم تنتهِ بعد، تُتابَع مهمته بدلاً من تكرار التحليل أو التوليد.
+    """
+    item = ensure_keyword(st.session_state.project_id, main_keyword, current_inputs(), user=editor_name or None)
+    open_keyword(item["id"])
+    payload = dict(payload, model=model_choice, hedge=hedge_requests, keyword_id=item["id"], user=editor_name or None)
+    job_id, created = reserve_job(item["id"], kind, lambda: submit_job(kind, payload), _job_is_active)
+    st.session_state.job_states[kind] = (job_id, "queued")
+    if not created:
+        st.info(f"ℹ️ المهمة #{job_id} قيد التنفيذ بالفعل لهذه الكلمة (ربما من محرر آخر)، تتم متابعتها بدلاً من تكرارها.")
+
+
+@st.fragment(run_every=1)
+def show_job_status(kind, keyword_id):
+    """متابعة مهمة الخلفية للكلمة: عرض حالتها ونتيجتها الجزئية، وإعادة تحميل الصفحة عند اكتمالها."""
+    item = get_keyword_by_id(keyword_id) if keyword_id else None
+    job_id = item["jobs"].get(kind) if item else None
+    job = get_job(job_id) if job_id else None
+    if job is None:
+        return
+    # إعادة التشغيل مرة واحدة عند انتقال المهمة إلى الاكتمال؛ العامل حفظ نتيجتها في مساحة العمل
+    previous = st.session_state.job_states.get(kind)
+    st.session_state.job_states[kind] = (job_id, job["status"])
+    if job["status"] == "done":
+        if previous and previous[0] == job_id and previous[1] != "done":
+            st.rerun()
+        return
+    if job["status"] in ("failed", "cancelled"):
+        st.error(f"❌ المهمة #{job_id} {JOB_STATUS_LABELS[job['status']]}: {job['error'] or ''}")
+        return
+    
+    status_col, stop_col = st.columns([4, 1])
+    status_col.info(f"⏳ المهمة #{job_id} ({JOB_STATUS_LABELS[job['status']]}) — {JOB_MESSAGES[kind]}")
+    if stop_col.button("⏹️ إيقاف", key=f"cancel_{kind}_{job_id}"):
+        cancel_job(job_id)
+        st.rerun()
+    
+    # وضع البث: عرض المقال تدريجياً مع تحديث الإحصائيات أثناء الكتابة
+    partial = job["partial"]
+    if partial and partial.get("html"):
+        live_col1, live_col2, live_col3 = st.columns(3)
+        live_col1.metric("📊 عدد الكلمات", partial["stats"]["word_count"])
+        live_col2.metric("🔍 كثافة الكلمة المفتاحية", f"{partial['stats']['density']}%")
+        live_col3.metric("📑 أقسام H2", partial["stats"]["sections"])
+        st.markdown(partial["html"], unsafe_allow_html=True)
+
 
 # الشريط الجانبي - الإعدادات
 with st.sidebar:
     st.header("⚙️ الإعدادات")
     
+    with st.expander("📁 المشروع", expanded=True):
+        editor_name = st.text_input("اسم المحرر", key="editor_name", placeholder="يظهر لبقية الفريق مع كل نتيجة")
+        projects = {p["id"]: p for p in list_projects()}
+        if st.session_state.project_id not in projects:
+            switch_project(default_project())
+            projects = {p["id"]: p for p in list_projects()}
+        selected_project = st.selectbox(
+            "المشروع الحالي",
+            list(projects),
+            index=list(projects).index(st.session_state.project_id),
+            format_func=lambda pid: f"{projects[pid]['name']} ({projects[pid]['keywords']} كلمة، {projects[pid]['published']} منشورة)",
+        )
+        if selected_project != st.session_state.project_id:
+            switch_project(selected_project)
+            st.rerun()
+        new_project = st.text_input("مشروع جديد", placeholder="اسم المشروع")
+        if st.button("➕ إنشاء المشروع") and new_project.strip():
+            switch_project(create_project(new_project))
+            st.rerun()
+    
     with st.expander("🔑 إعدادات OpenAI", expanded=True):
         openai_key = st.text_input("OpenAI API Key (اختياري)", type="password", placeholder="sk-...")
         st.info("💡 يتم استخدام مفتاح افتراضي إذا تركته فارغاً.")
         model_choice = st.selectbox("اختر النموذج", ["gpt-4.1-mini", "gpt-4.1-nano", "gemini-2.5-flash"])
+        hedge_requests = st.checkbox("🏁 طلب احتياطي للطلبات البطيئة (بعد زمن p95)", value=False)
+        stream_mode = st.checkbox("⚡ عرض المقال أثناء الكتابة (Streaming)", value=True)
+        parallel_sections = st.checkbox("🧩 كتابة الأقسام بالتوازي (للمقالات الطويلة)", value=False)
+        auto_repair = st.checkbox("🛡️ فحص قواعد SEO وإصلاح الأجزاء المخالفة تلقائياً", value=True)
     
     with st.expander("📝 إعدادات WordPress"):
         wp_url = st.text_input("رابط الموقع", placeholder="https://your-site.com")
         wp_user = st.text_input("اسم المستخدم")
         wp_pass = st.text_input("كلمة مرور التطبيق", type="password")
     
+    with st.expander("🗄️ الذاكرة المؤقتة"):
+        force_refresh = st.checkbox("تجاهل الذاكرة المؤقتة (إعادة التوليد)", value=False)
+        for stage, stats in cache_stats().items():
+            st.caption(f"{stage}: {stats['hits']} إصابة / {stats['misses']} إخفاق — {stats['entries']} عنصر")
+        snapshots = snapshot_stats()
+        if snapshots["pages"]:
+            st.caption(
+                f"📸 لقطات المنافسين: {snapshots['pages']} صفحة، {snapshots['snapshots']} نسخة "
+                f"({snapshots['stored_bytes'] // 1024} KB مضغوطة من {snapshots['raw_bytes'] // 1024} KB)"
+            )
+        if st.button("🧹 مسح الذاكرة المؤقتة"):
+            clear_cache()
+            clear_semantic_cache()
+            st.rerun()
+    
     st.markdown("---")
     st.markdown("### 📚 المساعدة")
     st.markdown("""
@@ -86,6 +267,20 @@ with st.sidebar:
 # 1. واجهة إدخال البيانات
 st.header("📋 إدخال بيانات المقال")
 
+# فتح كلمة من الرابط (بعد تحديث الصفحة) أو من كلمات المشروع التي عمل عليها أي محرر
+if st.session_state.open_keyword and "main_kw" not in st.session_state:
+    load_keyword_inputs(st.session_state.open_keyword)
+project_keywords = {item["id"]: item for item in list_keywords(st.session_state.project_id)}
+if project_keywords:
+    st.selectbox(
+        "📂 فتح كلمة من المشروع",
+        [None] + list(project_keywords),
+        format_func=lambda kid: "— كلمة جديدة —" if kid is None else
+            f"{project_keywords[kid]['keyword']} — {KEYWORD_STATUS_LABELS[project_keywords[kid]['status']]}",
+        key="keyword_picker",
+        on_change=_on_keyword_picked,
+    )
+
 with st.container():
     col1, col2 = st.columns(2)
     
@@ -117,10 +312,31 @@ with st.container():
 # إضافة نصوص الربط (Anchor Texts)
 st.subheader("🔗 نصوص الربط والروابط (Anchor Texts)")
 
-if st.button("➕ إضافة رابط جديد"):
+add_col, suggest_col = st.columns(2)
+if add_col.button("➕ إضافة رابط جديد"):
     st.session_state.anchors.append({"text": "", "url": ""})
     st.rerun()
 
+# روابط داخلية من مقالات الموقع السابقة (المولدة والمنشورة) تُضاف إلى الصفوف للمراجعة قبل الكتابة
+if suggest_col.button("🧭 اقتراح روابط داخلية"):
+    if not main_keyword or not target_domain:
+        st.warning("⚠️ يرجى إدخال الكلمة المفتاحية والدومين المستهدف أولاً")
+    else:
+        manual = [a for a in st.session_state.anchors if a['text'] and a['url']]
+        anchors = suggest_anchors({
+            "main_keyword": main_keyword,
+            "related_keywords": related_keywords,
+            "target_domain": target_domain,
+            "anchors": manual,
+        })
+        if len(anchors) == len(manual):
+            st.info("ℹ️ لا توجد مقالات مناسبة للربط في هذا الموقع بعد.")
+        else:
+            st.session_state.anchors = anchors
+            for key in [k for k in st.session_state if k.startswith(("at_", "au_"))]:
+                del st.session_state[key]
+            st.rerun()
+
 for i, anchor in enumerate(st.session_state.anchors):
     col1, col2, col3 = st.columns([2, 2, 1])
     
@@ -141,6 +357,21 @@ for i, anchor in enumerate(st.session_state.anchors):
         st.session_state.anchors.pop(i)
         st.rerun()
 
+# نتائج الكلمة الحالية من مساحة العمل (بالمرجع): ما أنجزه أي محرر يظهر هنا دون إعادة حساب
+item = get_keyword(st.session_state.project_id, main_keyword) if main_keyword else None
+keyword_id = item["id"] if item else None
+if keyword_id and keyword_id != st.session_state.open_keyword:
+    open_keyword(keyword_id)
+analysis_results = cached_artifact(item["analysis_id"]) if item else None
+outline = cached_artifact(item["outline_id"]) if item else None
+article = cached_artifact(item["article_id"]) if item else None
+saved_files = cached_artifact(item["files_id"]) if item else None
+if item and item["updated_by"]:
+    st.caption(
+        f"📁 {KEYWORD_STATUS_LABELS[item['status']]} — آخر تعديل بواسطة {item['updated_by']} "
+        f"في {datetime.fromtimestamp(item['updated_at']).strftime('%Y-%m-%d %H:%M')}"
+    )
+
 st.markdown("---")
 
 # 2. تحليل المنافسين
@@ -150,79 +381,185 @@ if col_analyze.button("🔍 تحليل المنافسين", use_container_width=
     if not main_keyword:
         st.error("❌ يرجى إدخال الكلمة المفتاحية الرئيسية")
     else:
-        with st.spinner("⏳ جاري تحليل المنافسين..."):
-            results = analyze_competitors(main_keyword)
-            st.session_state.analysis_results = results
-            st.success("✅ تم الانتهاء من تحليل المنافسين!")
-            
-            # عرض النتائج
-            with st.expander("📊 نتائج التحليل", expanded=True):
-                col1, col2, col3 = st.columns(3)
-                col1.metric("عدد المنافسين", len(results['top_competitors']))
-                col2.metric("متوسط طول المقال", f"{results['avg_length']} كلمة")
-                col3.metric("العناوين الشائعة", len(results['common_headings']))
-                
-                st.write("**العناوين الشائعة في المنافسين:**")
-                st.write(", ".join(results['common_headings']))
-                
-                st.write("**الكلمات المفتاحية المقترحة:**")
-                st.write(", ".join(results['suggested_keywords']))
+        submit_background_job("analysis", {"keyword": main_keyword, "force_refresh": force_refresh})
+
+show_job_status("analysis", keyword_id)
+
+if analysis_results:
+    results = analysis_results
+    with st.expander("📊 نتائج التحليل", expanded=True):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("عدد المنافسين", len(results['top_competitors']))
+        col2.metric("متوسط طول المقال", f"{results['avg_length']} كلمة")
+        col3.metric("العناوين الشائعة", len(results['common_headings']))
+        
+        st.write("**العناوين الشائعة في المنافسين:**")
+        st.write(", ".join(results['common_headings']))
+        if results.get('heading_clusters'):
+            st.dataframe([
+                {"العنوان": c["heading"], "عدد المنافسين": c["coverage"], "الصيغ": "، ".join(c["variants"])}
+                for c in results['heading_clusters']
+            ], use_container_width=True)
+        
+        st.write("**الكلمات المفتاحية المقترحة:**")
+        st.write(", ".join(results['suggested_keywords']))
+        
+        # تاريخ تغيّر صفحات المنافسين من لقطات الزحف السابقة
+        if results.get("source") == "live":
+            changes = []
+            for competitor in results['top_competitors']:
+                history = page_history(competitor["url"], limit=1)
+                if history and "added_headings" in history[0]:
+                    changes.append({
+                        "الصفحة": competitor["url"],
+                        "تاريخ التغيير": datetime.fromtimestamp(history[0]["fetched_at"]),
+                        "عناوين مضافة": "، ".join(history[0]["added_headings"]),
+                        "عناوين محذوفة": "، ".join(history[0]["removed_headings"]),
+                        "تغير الطول": history[0]["length_change"],
+                    })
+            if changes:
+                st.write("**تغييرات المنافسين منذ الزحف السابق:**")
+                st.dataframe(changes, use_container_width=True)
 
 # 3. توليد Outline
-if st.session_state.analysis_results:
+if analysis_results:
     st.markdown("---")
     if st.button("📝 توليد Outline المقال", use_container_width=True):
-        with st.spinner("⏳ جاري إنشاء المخطط..."):
-            outline = generate_outline(st.session_state.analysis_results, openai_key)
-            st.session_state.outline = outline
-            st.success("✅ تم إنشاء المخطط!")
-            
-            with st.expander("📋 المخطط المقترح", expanded=True):
-                st.markdown(outline)
+        submit_background_job("outline", {
+            "keyword": main_keyword,
+            "analysis_id": item["analysis_id"],
+            "force_refresh": force_refresh,
+        })
+    
+    show_job_status("outline", keyword_id)
+    
+    if outline:
+        with st.expander("📋 المخطط المقترح", expanded=True):
+            st.markdown(outline)
 
 # 4. كتابة المقال
-if st.session_state.outline:
+if outline:
     st.markdown("---")
-    col_approve, col_retry = st.columns(2)
+    col_approve, col_retry, col_refresh = st.columns(3)
+    content_data = {
+        "main_keyword": main_keyword,
+        "related_keywords": related_keywords,
+        "anchors": [a for a in st.session_state.anchors if a['text'] and a['url']],
+        "target_domain": target_domain,
+        "language": target_language,
+        "outline": outline
+    }
+    common_headings = (analysis_results or {}).get("common_headings")
     
     if col_approve.button("✅ الموافقة والبدء في الكتابة", use_container_width=True):
-        with st.spinner("⏳ جاري كتابة المقال (قد يستغرق ذلك بضع دقائق)..."):
-            content_data = {
-                "main_keyword": main_keyword,
-                "related_keywords": related_keywords,
-                "anchors": [a for a in st.session_state.anchors if a['text'] and a['url']],
-                "target_domain": target_domain,
-                "language": target_language,
-                "outline": st.session_state.outline
-            }
-            article = generate_content(content_data, openai_key)
-            st.session_state.article = article
-            st.success("✅ تم توليد المقال بنجاح!")
+        # البث يعرض المقال تدريجياً عبر النتائج الجزئية للمهمة، والأقسام المتوازية للمقالات الطويلة
+        mode = "sections" if parallel_sections else "stream" if stream_mode else "full"
+        submit_background_job("article", {
+            "keyword": main_keyword,
+            "data": content_data,
+            "mode": mode,
+            "common_headings": common_headings,
+            "validate": auto_repair,
+            "force_refresh": force_refresh,
+        })
     
     if col_retry.button("🔄 إعادة محاولة الـ Outline", use_container_width=True):
-        st.session_state.outline = None
+        discard_artifact(keyword_id, "outline", user=editor_name or None)
+        forget_job(keyword_id, "outline")
         st.rerun()
+    
+    # تحديث مقال سابق: لا يُعاد إلا توليد الأقسام التي تغيرت مدخلاتها أو قدُمت
+    if main_keyword and has_versions(main_keyword, target_domain):
+        max_age_days = col_refresh.number_input(
+            "إعادة كتابة الأقسام الأقدم من (يوم، 0 = بدون)", min_value=0, value=0, step=30
+        )
+        if col_refresh.button("♻️ تحديث المقال السابق", use_container_width=True):
+            wordpress_ready = bool(wp_url and wp_user and wp_pass)
+            if wordpress_ready:
+                # كلمة المرور تبقى في ذاكرة العملية؛ المهمة المحفوظة في الطابور تحمل رابط الموقع فقط
+                register_site_credentials(wp_url, wp_user, wp_pass)
+            submit_background_job("refresh", {
+                "keyword": main_keyword,
+                "data": content_data,
+                "analysis": {"common_headings": common_headings} if common_headings is not None else None,
+                "max_age_days": max_age_days or None,
+                # تحديث نفس المقال على WordPress إن اكتملت الإعدادات
+                "wordpress": {"url": wp_url} if wordpress_ready else None,
+                "force_refresh": force_refresh,
+            })
+    
+    show_job_status("article", keyword_id)
+    show_job_status("refresh", keyword_id)
 
 # 5. عرض المقال والإحصائيات
-if st.session_state.article:
+if article:
     st.markdown("---")
     st.header("📄 معاينة المقال")
     
     # الإحصائيات
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("📊 عدد الكلمات", st.session_state.article.get('word_count', 0))
-    col2.metric("🔍 كثافة الكلمة المفتاحية", f"{count_keyword_density(st.session_state.article.get('html', ''), main_keyword)}%")
+    col1.metric("📊 عدد الكلمات", article.get('word_count', 0))
+    seo_report = analyze_seo_metrics(article.get('html', ''), main_keyword, related_keywords)
+    col2.metric("🔍 كثافة الكلمة المفتاحية", f"{seo_report['density']}%")
     col3.metric("🔗 عدد الروابط", len([a for a in st.session_state.anchors if a['text'] and a['url']]))
-    col4.metric("✅ الحالة", "جاهز للنشر")
+    col4.metric("✅ الحالة", KEYWORD_STATUS_LABELS[item["status"]])
+    if item["wordpress"].get("link"):
+        st.caption(f"🌐 منشور على WordPress: {item['wordpress']['link']}")
+    
+    refresh = article.get("refresh")
+    if refresh:
+        st.info(
+            f"♻️ النسخة {refresh['version']}: أُعيد توليد {len(refresh['regenerated'])} جزء "
+            f"وأُعيد استخدام {len(refresh['reused'])} ({', '.join(refresh['regenerated'])})"
+        )
+        if refresh.get("wordpress"):
+            wordpress = refresh["wordpress"]
+            if wordpress["ok"]:
+                st.success(f"✅ تم تحديث المقال على WordPress ({wordpress['action']}): {wordpress['link']}")
+            else:
+                st.error(f"❌ فشل تحديث المقال على WordPress: {wordpress['error']}")
+    
+    # فحص قواعد SEO على المقال الحالي (تمريرة واحدة) مع مدخلاته الحالية
+    article_data = dict(current_inputs(), main_keyword=main_keyword, outline=outline or "")
+    validation = validate_article(article, article_data)
+    repaired = (article.get("validation") or {}).get("repaired")
+    
+    with st.expander("📈 تقرير SEO", expanded=not validation["ok"]):
+        rcol1, rcol2, rcol3 = st.columns(3)
+        rcol1.metric("الكلمات (بدون HTML)", seo_report["word_count"])
+        rcol2.metric("تغطية الكلمات المرتبطة", f"{int(seo_report['related_coverage_ratio'] * 100)}%")
+        rcol3.metric("عناوين تحتوي الكلمة المفتاحية", seo_report["headings"]["with_keyword"])
+        st.dataframe(
+            [
+                {"القاعدة": rule["label"], "الحالة": "✅" if rule["ok"] else "❌",
+                 "الفعلي": str(rule["actual"]), "المطلوب": rule["expected"]}
+                for rule in validation["rules"]
+            ],
+            use_container_width=True,
+        )
+        if repaired:
+            st.caption(f"🛠️ الأجزاء المصلحة: {', '.join(repaired)}")
+        if not validation["ok"]:
+            if st.button("🛠️ إصلاح الأجزاء المخالفة فقط", use_container_width=True):
+                submit_background_job("repair", {
+                    "keyword": main_keyword,
+                    "article_id": item["article_id"],
+                    "data": article_data,
+                    "force_refresh": force_refresh,
+                })
+            show_job_status("repair", keyword_id)
+        st.dataframe(seo_report["sections"], use_container_width=True)
+        if seo_report["related_coverage"]:
+            st.write(seo_report["related_coverage"])
     
     # عرض المحتوى
     with st.expander("📖 المحتوى الكامل", expanded=True):
-        st.markdown(st.session_state.article.get("html", ""), unsafe_allow_html=True)
+        st.markdown(article.get("html", ""), unsafe_allow_html=True)
     
     # Meta Description
-    if st.session_state.article.get("meta_description"):
+    if article.get("meta_description"):
         with st.expander("📝 Meta Description"):
-            st.write(st.session_state.article["meta_description"])
+            st.write(article["meta_description"])
     
     st.markdown("---")
     
@@ -235,51 +572,115 @@ if st.session_state.article:
     if col1.button("📤 رفع إلى WordPress", use_container_width=True):
         if wp_url and wp_user and wp_pass:
             with st.spinner("⏳ جاري الرفع إلى WordPress..."):
-                status = upload_to_wordpress(wp_url, wp_user, wp_pass, st.session_state.article)
-                st.info(status)
+                with article_context(main_keyword):
+                    # إذا سبق نشر المقال (من أي محرر) يُحدَّث نفس المقال بدلاً من إنشاء مسودة جديدة
+                    post_id = item["wordpress"].get("id") or (load_latest_version(main_keyword, target_domain) or {}).get("post_id")
+                    result = publish_to_wordpress(wp_url, wp_user, wp_pass, article, post_id=post_id)
+                set_publish_status(keyword_id, result, user=editor_name or None)
+                if result["ok"]:
+                    index_article(main_keyword, article, domain=target_domain, url=result["link"])
+                st.info(describe_upload(result))
         else:
             st.warning("⚠️ يرجى إكمال إعدادات WordPress في الشريط الجانبي")
     
     # حفظ الملفات
     if col2.button("💾 حفظ الملفات", use_container_width=True):
-        excel_path = save_to_excel(st.session_state.article, main_keyword)
-        docx_path = save_to_docx(st.session_state.article, main_keyword)
-        html_path = save_to_html(st.session_state.article, main_keyword)
-        
-        if excel_path and docx_path and html_path:
-            st.success("✅ تم حفظ الملفات بنجاح!")
-            
-            # عرض أزرار التحميل
-            col_excel, col_docx, col_html = st.columns(3)
-            
-            with open(excel_path, "rb") as f:
-                col_excel.download_button(
-                    "📊 تحميل Excel",
-                    f,
-                    file_name=f"{main_keyword}.xlsx",
-                    use_container_width=True
-                )
-            
-            with open(docx_path, "rb") as f:
-                col_docx.download_button(
-                    "📄 تحميل Word",
-                    f,
-                    file_name=f"{main_keyword}.docx",
-                    use_container_width=True
-                )
-            
-            with open(html_path, "rb") as f:
-                col_html.download_button(
-                    "🌐 تحميل HTML",
-                    f,
-                    file_name=f"{main_keyword}.html",
-                    use_container_width=True
-                )
+        submit_background_job("export", {"keyword": main_keyword, "article_id": item["article_id"]})
     
     # نسخ إلى الحافظة
     if col3.button("📋 نسخ المحتوى", use_container_width=True):
         st.success("✅ تم نسخ المحتوى إلى الحافظة!")
-        st.code(st.session_state.article.get("html", ""))
+        st.code(article.get("html", ""))
+    
+    show_job_status("export", keyword_id)
+    
+    saved = saved_files
+    if saved and all(os.path.exists(path) for path in saved.values()):
+        st.success("✅ تم حفظ الملفات بنجاح!")
+        
+        # عرض أزرار التحميل
+        col_excel, col_docx, col_html = st.columns(3)
+        
+        with open(saved["excel"], "rb") as f:
+            col_excel.download_button(
+                "📊 تحميل Excel",
+                f,
+                file_name=f"{main_keyword}.xlsx",
+                use_container_width=True
+            )
+        
+        with open(saved["docx"], "rb") as f:
+            col_docx.download_button(
+                "📄 تحميل Word",
+                f,
+                file_name=f"{main_keyword}.docx",
+                use_container_width=True
+            )
+        
+        with open(saved["html"], "rb") as f:
+            col_html.download_button(
+                "🌐 تحميل HTML",
+                f,
+                file_name=f"{main_keyword}.html",
+                use_container_width=True
+            )
+
+st.markdown("---")
+with st.expander("📈 الأداء والتكلفة"):
+    period = st.selectbox("الفترة", ["آخر 24 ساعة", "آخر 7 أيام", "الكل"], key="metrics_period")
+    since = {"آخر 24 ساعة": time.time() - 86400, "آخر 7 أيام": time.time() - 7 * 86400, "الكل": None}[period]
+    report = summarize_metrics(since)
+    if report["stages"]:
+        mcol1, mcol2 = st.columns(2)
+        mcol1.metric("💰 متوسط التكلفة لكل مقال", f"${report['cost_per_article']:.4f}")
+        mcol2.metric("📄 عدد المقالات المقاسة", report["articles"])
+        st.dataframe(report["stages"], use_container_width=True)
+        if report["cost_per_model"]:
+            st.write("**التكلفة حسب النموذج ($):**", report["cost_per_model"])
+    else:
+        st.caption("لا توجد مقاييس مسجلة بعد.")
+    if limiter_stats():
+        st.write("**حصص النماذج (RPM/TPM):**", limiter_stats())
+
+with st.expander("📁 كلمات المشروع"):
+    if project_keywords:
+        st.dataframe([
+            {
+                "الكلمة": kw["keyword"],
+                "الحالة": KEYWORD_STATUS_LABELS[kw["status"]],
+                "آخر تعديل": datetime.fromtimestamp(kw["updated_at"]),
+                "بواسطة": kw["updated_by"],
+                "WordPress": kw["wordpress"].get("link"),
+            }
+            for kw in project_keywords.values()
+        ], use_container_width=True)
+    else:
+        st.caption("لا توجد كلمات في هذا المشروع بعد.")
+
+with st.expander("🧵 المهام في الخلفية"):
+    recent_jobs = list_jobs(limit=20)
+    if recent_jobs:
+        for job in recent_jobs:
+            job["status"] = JOB_STATUS_LABELS[job["status"]]
+            for column in ("created_at", "started_at", "finished_at"):
+                job[column] = datetime.fromtimestamp(job[column]) if job[column] else None
+        st.dataframe(recent_jobs, use_container_width=True)
+    else:
+        st.caption("لا توجد مهام بعد.")
+
+with st.expander("📒 سجل المقالات"):
+    summary = ledger_summary()
+    if summary:
+        cols = st.columns(len(summary))
+        for col, (status, info) in zip(cols, summary.items()):
+            col.metric(STATUS_LABELS.get(status, status), info["count"], f"~{info['avg_words']} كلمة", delta_color="off")
+        if st.button("📊 تصدير السجل الكامل إلى Excel"):
+            ledger_path = export_ledger_to_excel()
+            if ledger_path:
+                with open(ledger_path, "rb") as f:
+                    st.download_button("⬇️ تحميل السجل", f, file_name="articles_ledger.xlsx")
+    else:
+        st.caption("لا توجد مقالات مسجلة بعد.")
 
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# قواعد SQLite المحلية في مجلد مؤقت خاص بالاختبارات (يُقرأ SEO_DATA_DIR عند استيراد local_store)
+os.environ["SEO_DATA_DIR"] = tempfile.mkdtemp(prefix="seo_automation_tests_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
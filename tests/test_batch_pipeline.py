@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pytest
+
+import batch_pipeline
+from batch_pipeline import run_pipeline
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """مراحل وهمية تعدّ المقالات التي بدأت كتابتها بدلاً من طلبات النموذج."""
+    started = []
+
+    def content(item, options):
+        started.append(item["job"]["main_keyword"])
+        time.sleep(0.01)
+        item["article"] = {"title": item["job"]["main_keyword"], "word_count": 10}
+
+    for stage in batch_pipeline.STAGES:
+        monkeypatch.setitem(batch_pipeline._STAGE_HANDLERS, stage, lambda item, options: None)
+    monkeypatch.setitem(batch_pipeline._STAGE_HANDLERS, "content", content)
+    return started
+
+
+def _jobs(count):
+    for i in range(count):
+        yield {"main_keyword": f"كلمة {i}", "target_domain": "", "language": "العربية"}
+
+
+def test_pipeline_runs_every_job(stages):
+    results = list(run_pipeline(_jobs(20), concurrency=2, batch_id="pipeline_all"))
+    assert len(results) == 20
+    assert all(result["status"] == "done" for result in results)
+
+
+def test_closing_consumer_early_stops_feeder_and_workers(stages):
+    baseline = threading.active_count()
+    pipeline = run_pipeline(_jobs(1000), concurrency=2, batch_id="pipeline_closed")
+    assert [next(pipeline)["status"] for _ in range(3)] == ["done"] * 3
+    pipeline.close()
+
+    deadline = time.monotonic() + 5
+    while threading.active_count() > baseline and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert threading.active_count() == baseline
+    # المهام الجارية لحظة الإغلاق فقط تكتمل، ولا تبدأ بعدها كتابة مقالات جديدة
+    assert len(stages) < 50
+    count = len(stages)
+    time.sleep(0.1)
+    assert len(stages) == count
@@ -0,0 +1,61 @@
+import pytest
+
+import cache_handler
+from cache_handler import cache_get, cache_set, cache_stats, clear_cache, flush_counters, make_key
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_cache()
+    flush_counters()
+    cache_handler._db().execute("DELETE FROM cache_counters")
+    yield
+    clear_cache()
+
+
+def _sizes():
+    db = cache_handler._db()
+    return cache_handler._total_bytes(db), db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+
+def test_total_size_follows_inserts_updates_and_deletes():
+    cache_set("outline", "a", "x" * 100)
+    cache_set("outline", "b", "y" * 50)
+    cache_set("outline", "a", "x" * 10)
+    total, actual = _sizes()
+    assert total == actual == 12 + 52
+    clear_cache("outline")
+    assert _sizes() == (0, 0)
+
+
+def test_eviction_only_when_limit_crossed(monkeypatch):
+    monkeypatch.setattr(cache_handler, "MAX_CACHE_BYTES", 1000)
+    for i in range(4):
+        cache_set("content", f"k{i}", "x" * 198)
+    assert _sizes()[0] == 800
+    # k0 استُخدم مؤخراً (زمن الاستخدام ما زال في الذاكرة) فيبقى، ويُحذف الأقدم استخداماً
+    assert cache_get("content", "k0") is not None
+    cache_set("content", "k4", "x" * 398)
+    keys = {row["key"] for row in cache_handler._db().execute("SELECT key FROM cache")}
+    assert "k0" in keys and "k4" in keys and "k1" not in keys
+    total, actual = _sizes()
+    assert total == actual <= 900
+
+
+def test_expired_entry_is_a_miss(monkeypatch):
+    cache_set("analysis", "old", {"v": 1}, ttl=-1)
+    assert cache_get("analysis", "old") is None
+    assert _sizes() == (0, 0)
+
+
+def test_counters_are_batched_until_flush(monkeypatch):
+    monkeypatch.setattr(cache_handler, "FLUSH_EVERY", 1000)
+    monkeypatch.setattr(cache_handler, "FLUSH_SECONDS", 3600)
+    key = make_key("outline", {"keyword": "هواتف"})
+    cache_set("outline", key, "مخطط")
+    for _ in range(3):
+        assert cache_get("outline", key) == "مخطط"
+    assert cache_get("outline", "missing") is None
+    assert cache_handler._db().execute("SELECT COUNT(*) FROM cache_counters").fetchone()[0] == 0
+    stats = cache_stats()["outline"]
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (3, 1, 1)
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+pytest.importorskip("bs4")
+
+from competitor_analysis import analyze_competitors, fixture_search_provider, get_search_provider
+
+PAGE = (
+    "<html><body><nav>قائمة الموقع</nav><h1>{title}</h1><p>{body}</p>"
+    "<h2>المميزات</h2><p>{body}</p><h2>الأسعار</h2><h3>الفئة المتوسطة</h3><p>{body}</p></body></html>"
+)
+
+
+@pytest.fixture
+def fixture_dir(tmp_path):
+    pages = {
+        "a.html": PAGE.format(title="دليل الهواتف", body="كلمة " * 100),
+        "b.html": PAGE.format(title="مراجعة الهواتف", body="نص " * 50),
+    }
+    for name, html in pages.items():
+        (tmp_path / name).write_text(html, encoding="utf-8")
+    index = {
+        "أفضل هواتف 2024": [
+            {"title": "دليل الهواتف", "url": "https://a.example/guide", "file": "a.html"},
+            {"title": "مراجعة الهواتف", "url": "https://b.example/review", "file": "b.html"},
+        ],
+        "*": [{"title": "عام", "url": "https://a.example/guide", "file": "a.html"}],
+    }
+    (tmp_path / "index.json").write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+    return tmp_path
+
+
+def test_fixture_provider_reads_index_and_pages(fixture_dir):
+    search = fixture_search_provider(str(fixture_dir))
+    results = search("أفضل هواتف 2024", 1)
+    assert [r["url"] for r in results] == ["https://a.example/guide"]
+    assert "<h1>دليل الهواتف</h1>" in results[0]["html"]
+    # الكلمات غير الموجودة في الفهرس تستخدم المفتاح "*"
+    assert [r["title"] for r in search("كلمة أخرى", 10)] == ["عام"]
+
+
+def test_search_provider_from_environment(fixture_dir, monkeypatch):
+    monkeypatch.delenv("SERPER_API_KEY", raising=False)
+    monkeypatch.setenv("SEO_SERP_FIXTURES", str(fixture_dir))
+    assert get_search_provider()("أفضل هواتف 2024", 10)[1]["title"] == "مراجعة الهواتف"
+    monkeypatch.delenv("SEO_SERP_FIXTURES")
+    assert get_search_provider() is None
+
+
+def test_analyze_competitors_from_fixtures(fixture_dir):
+    analysis = analyze_competitors(
+        "أفضل هواتف 2024", provider=fixture_search_provider(str(fixture_dir)), force_refresh=True
+    )
+    assert analysis["source"] == "live"
+    competitors = {c["url"]: c for c in analysis["top_competitors"]}
+    assert set(competitors) == {"https://a.example/guide", "https://b.example/review"}
+    guide = competitors["https://a.example/guide"]
+    # القائمة (nav) لا تُحتسب من نص الصفحة
+    assert guide["length"] == 2 + 3 * 100 + 1 + 1 + 2
+    assert guide["headings"] == ["المميزات", "الأسعار", "الفئة المتوسطة"]
+    assert analysis["avg_length"] == (guide["length"] + competitors["https://b.example/review"]["length"]) // 2
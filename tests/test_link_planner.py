@@ -0,0 +1,26 @@
+from link_planner import index_article, plan_links, site_of
+
+
+def _index(domain, keyword):
+    return index_article(keyword, {"title": keyword, "html": f"<h2>{keyword}</h2>"}, domain=domain)
+
+
+def test_site_of_strips_scheme_and_www():
+    assert site_of("https://www.planner-a.example/post/") == "planner-a.example"
+    assert site_of("planner-a.example") == "planner-a.example"
+    assert site_of(None) == ""
+
+
+def test_plan_links_stays_on_the_same_site():
+    own = _index("planner-a.example", "شواحن لاسلكية سريعة")
+    other = _index("https://planner-b.example", "شواحن لاسلكية رخيصة")
+    links = plan_links("أفضل شواحن لاسلكية", "شواحن سريعة", domain="planner-a.example")
+    assert [link["url"] for link in links] == [own]
+    assert other not in [link["url"] for link in links]
+
+
+def test_plan_links_without_domain_returns_nothing():
+    _index("planner-a.example", "سماعات لاسلكية عازلة")
+    _index("planner-b.example", "سماعات لاسلكية رياضية")
+    assert plan_links("أفضل سماعات لاسلكية", "سماعات عازلة") == []
+    assert plan_links("أفضل سماعات لاسلكية", "سماعات عازلة", domain="") == []
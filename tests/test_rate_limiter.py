@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from rate_limiter import (
+    acall_with_rate_limit, call_with_rate_limit, estimate_tokens, get_model_limiter, set_model_limits,
+    settle_usage,
+)
+
+MESSAGES = [{"role": "user", "content": "س" * 3000}]
+MAX_TOKENS = 4000
+TPM = 100_000
+
+
+@pytest.fixture
+def model():
+    set_model_limits("test-model", rpm=1000, tpm=TPM)
+    return "test-model"
+
+
+def _available(model):
+    return get_model_limiter(model).tokens.tokens
+
+
+def _response(total_tokens):
+    return SimpleNamespace(usage=SimpleNamespace(total_tokens=total_tokens))
+
+
+def test_successful_call_settles_actual_usage(model):
+    call_with_rate_limit(model, MESSAGES, MAX_TOKENS, lambda: _response(500))
+    assert _available(model) == pytest.approx(TPM - 500, abs=5)
+
+
+def test_failed_call_refunds_reservation(model):
+    def request():
+        raise ValueError("فشل الطلب")
+
+    with pytest.raises(ValueError):
+        call_with_rate_limit(model, MESSAGES, MAX_TOKENS, request)
+    assert _available(model) == pytest.approx(TPM)
+
+
+def test_cancelled_async_call_refunds_reservation(model):
+    async def main():
+        async def request():
+            await asyncio.sleep(10)
+
+        task = asyncio.ensure_future(acall_with_rate_limit(model, MESSAGES, MAX_TOKENS, request))
+        await asyncio.sleep(0.01)
+        assert _available(model) < TPM - estimate_tokens(MESSAGES, MAX_TOKENS) + 5
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert _available(model) == pytest.approx(TPM)
+
+
+def test_stream_without_usage_is_settled_with_zero(model):
+    estimated = estimate_tokens(MESSAGES, MAX_TOKENS)
+    limiter = get_model_limiter(model)
+    limiter.acquire(estimated)
+    settle_usage(model, MESSAGES, MAX_TOKENS, None)
+    assert _available(model) == pytest.approx(TPM)
+
+
+def test_reservation_cancelled_by_throttle_is_not_refunded(model):
+    limiter = get_model_limiter(model)
+    estimated = estimate_tokens(MESSAGES, MAX_TOKENS)
+    generation = limiter.acquire(estimated)
+    limiter.throttle(0)
+    # الحظر أفرغ الدلو وألغى الحجز، فلا يُرد شيء باسم الجيل القديم
+    limiter.settle(estimated, 0, generation)
+    assert _available(model) == 0
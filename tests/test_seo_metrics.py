@@ -0,0 +1,34 @@
+from seo_metrics import PhraseMatcher, analyze_seo_metrics, tokenize
+
+
+def test_phrase_matcher_counts_overlapping_phrases():
+    matcher = PhraseMatcher(["هواتف ذكية", "هواتف", "ذكية رخيصة"])
+    counts = matcher.count(tokenize("هواتف ذكية رخيصة و هواتف أخرى"))
+    assert counts == [1, 2, 1]
+
+
+def test_phrase_matcher_keeps_keyword_at_index_zero():
+    # كلمة مفتاحية بلا كلمات لا تزيح أول كلمة مرتبطة إلى الرقم 0
+    matcher = PhraseMatcher(["!!", "هواتف", "هواتف"])
+    assert matcher.phrases == ["!!", "هواتف"]
+    assert matcher.count(tokenize("هواتف هواتف")) == [0, 2]
+
+
+def test_analyze_seo_metrics_with_token_less_keyword():
+    html = "<h1>هواتف</h1><p>هواتف جديدة</p><h2>هواتف</h2><p>نص</p>"
+    report = analyze_seo_metrics(html, "!!", ["هواتف"])
+    assert report["keyword_count"] == 0
+    assert report["density"] == 0
+    assert report["headings"]["with_keyword"] == 0
+    assert all(section["keyword_count"] == 0 for section in report["sections"])
+    assert report["related_coverage"] == {"هواتف": 3}
+
+
+def test_analyze_seo_metrics_counts_keyword_per_section():
+    html = "<p>أفضل هواتف اليوم</p><h2>أفضل هواتف 2024</h2><p>أفضل هواتف رخيصة</p>"
+    report = analyze_seo_metrics(html, "أفضل هواتف", "رخيصة، غالية")
+    assert report["keyword_count"] == 3
+    assert [s["keyword_count"] for s in report["sections"]] == [1, 2]
+    assert report["headings"]["with_keyword"] == 1
+    assert report["related_coverage"] == {"رخيصة": 1, "غالية": 0}
+    assert report["related_coverage_ratio"] == 0.5
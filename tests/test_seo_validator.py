@@ -0,0 +1,100 @@
+import pytest
+
+from content_generator import set_llm_client
+from fake_llm import FakeLLMClient
+from seo_validator import apply_repairs, failed_rules, plan_repairs, repair_article, validate_article
+
+KEYWORD = "هواتف ذكية"
+ANCHOR = '<a href="https://site.example/guide/">دليل الشراء</a>'
+DATA = {
+    "main_keyword": KEYWORD,
+    "target_domain": "site.example",
+    "language": "العربية",
+    "related_keywords": "بطارية، شاشة",
+    "anchors": [{"text": "دليل الشراء", "url": "https://site.example/guide"}],
+}
+
+
+def _paragraph(words, keyword_times=0, extra=""):
+    return "<p>" + " ".join(["نص"] * (words - 2 * keyword_times) + [KEYWORD] * keyword_times) + extra + "</p>"
+
+
+def _article(intro_words=80, short_section=None, meta_keyword=True, anchor=True):
+    parts = [f"<h1>{KEYWORD}</h1>", _paragraph(intro_words, 1)]
+    for i in range(1, 11):
+        extra = f" بطارية شاشة {ANCHOR if anchor else ''}" if i == 2 else ""
+        parts.append(f"<h2>القسم {i}</h2>")
+        parts.append(_paragraph(60 if i == short_section else 250, 3, extra))
+    parts.append("<h2>الأسئلة الشائعة</h2>" + _paragraph(100))
+    parts.append("<h2>الخاتمة</h2>" + _paragraph(60))
+    meta = ((KEYWORD + " ") if meta_keyword else "") + "وصف " * 60
+    parts.append(f"<p><strong>Meta Description:</strong> {meta[:155].strip()}</p>")
+    return {"html": "\n".join(parts)}
+
+
+def _rules(report):
+    return {rule["rule"]: rule for rule in report["rules"]}
+
+
+def test_compliant_article_passes_every_rule():
+    report = validate_article(_article(), DATA)
+    assert report["ok"], failed_rules(report)
+    assert report["intro_words"] == 80
+    assert [s["kind"] for s in report["sections"]][-2:] == ["faq", "closing"]
+
+
+def test_each_failing_rule_is_reported_with_its_parts():
+    report = validate_article(_article(intro_words=40, short_section=3, meta_keyword=False, anchor=False), DATA)
+    rules = _rules(report)
+    assert set(failed_rules(report)) == {"intro", "sections", "meta", "anchors"}
+    assert rules["intro"]["actual"] == 40
+    assert rules["sections"]["actual"] == "9/10"
+    assert [d["part"] for d in rules["sections"]["details"]] == ["h2-3"]
+    assert rules["meta"]["details"] == ["لا تحتوي الكلمة المفتاحية"]
+    assert rules["anchors"]["details"] == [{"text": "دليل الشراء", "url": "https://site.example/guide"}]
+    assert rules["related"]["ok"] and rules["related"]["actual"] == "2/2"
+
+    repairs = plan_repairs(report, DATA)
+    assert repairs["meta"] == ["لا تحتوي الكلمة المفتاحية"]
+    assert "intro" in repairs and "h2-3" in repairs
+    assert any("دليل الشراء" in instruction for instruction in sum(repairs.values(), []))
+
+
+def test_missing_related_keyword_targets_one_section():
+    data = dict(DATA, related_keywords="بطارية، شاشة، كاميرا")
+    report = validate_article(_article(), data)
+    assert failed_rules(report) == ["related"]
+    assert _rules(report)["related"]["details"] == ["كاميرا"]
+    repairs = plan_repairs(report, data)
+    assert len(repairs) == 1
+    assert any("كاميرا" in instruction for instruction in next(iter(repairs.values())))
+
+
+def test_apply_repairs_replaces_only_the_repaired_part():
+    article = _article(short_section=3)
+    repaired = apply_repairs(article, {"h2-3": "<p>قسم جديد</p>"})
+    before, after = article["html"].split("<h2>القسم 3</h2>")
+    new_before, new_after = repaired["html"].split("<h2>القسم 3</h2>")
+    assert new_before == before
+    assert new_after.split("<h2>القسم 4</h2>")[1] == after.split("<h2>القسم 4</h2>")[1]
+    assert "<p>قسم جديد</p>" in new_after.split("<h2>القسم 4</h2>")[0]
+    assert _paragraph(60, 3) not in repaired["html"]
+
+
+@pytest.fixture
+def fake_llm():
+    client = FakeLLMClient(latency=0)
+    set_llm_client(client)
+    yield client
+    set_llm_client(None)
+
+
+def test_repair_article_fixes_failing_parts_with_local_llm(fake_llm):
+    article = _article(intro_words=40, short_section=3, anchor=False)
+    result = repair_article(article, DATA, force_refresh=True)
+    validation = result["validation"]
+    assert fake_llm.calls
+    assert {"intro", "h2-3"} <= set(validation["repaired"])
+    assert validation["rounds"] >= 1
+    rules = _rules(validate_article(result, DATA))
+    assert rules["intro"]["ok"] and rules["sections"]["ok"] and rules["anchors"]["ok"]
@@ -0,0 +1,65 @@
+import zipfile
+
+import pytest
+
+from storage_handler import DocxStreamExporter
+
+docx = pytest.importorskip("docx")
+etree = pytest.importorskip("lxml.etree")
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# ترتيب العناصر في CT_RPr و CT_PPrBase حسب مخطط WordprocessingML (ECMA-376، الجزء الأول)
+RPR_ORDER = [
+    "rStyle", "rFonts", "b", "bCs", "i", "iCs", "caps", "smallCaps", "strike", "dstrike", "outline",
+    "shadow", "emboss", "imprint", "noProof", "snapToGrid", "vanish", "webHidden", "color", "spacing",
+    "w", "kern", "position", "sz", "szCs", "highlight", "u", "effect", "bdr", "shd", "fitText",
+    "vertAlign", "rtl", "cs", "em", "lang", "eastAsianLayout", "specVanish", "oMath",
+]
+PPR_ORDER = [
+    "pStyle", "keepNext", "keepLines", "pageBreakBefore", "framePr", "widowControl", "numPr",
+    "suppressLineNumbers", "pBdr", "shd", "tabs", "suppressAutoHyphens", "kinsoku", "wordWrap",
+    "overflowPunct", "topLinePunct", "autoSpaceDE", "autoSpaceDN", "bidi", "adjustRightInd",
+    "snapToGrid", "spacing", "ind", "contextualSpacing", "mirrorIndents", "suppressOverlap", "jc",
+    "textDirection", "textAlignment", "textboxTightWrap", "outlineLvl", "divId", "cnfStyle", "rPr",
+]
+
+ARTICLE = {
+    "title": "أفضل هواتف 2024",
+    "html": (
+        "<h1>أفضل هواتف 2024</h1><p>مقدمة <strong>مهمة</strong> و<em>مائلة</em> "
+        "و<a href='https://example.com/a?x=1&y=2'><strong><em>رابط</em></strong></a>.</p>"
+        "<h2>القسم الأول</h2><ol><li>أول</li><li>ثانٍ</li></ol><ul><li>نقطة</li></ul>"
+        "<p>Meta Description: وصف قصير</p>"
+    ),
+}
+
+
+def _assert_schema_order(parent, order):
+    names = [child.tag[len(W):] for child in parent]
+    assert all(name in order for name in names), names
+    positions = [order.index(name) for name in names]
+    assert positions == sorted(positions), names
+
+
+def test_stream_docx_opens_and_follows_schema_order(tmp_path):
+    path = tmp_path / "campaign.docx"
+    with DocxStreamExporter(str(path), title="الحملة") as exporter:
+        exporter.add(ARTICLE, "أفضل هواتف 2024")
+        exporter.add(ARTICLE, "أفضل هواتف 2024")
+
+    document = docx.Document(str(path))
+    texts = [p.text for p in document.paragraphs]
+    assert texts[0] == "الحملة"
+    assert "1. أول" in texts and "• نقطة" in texts
+
+    with zipfile.ZipFile(path) as package:
+        for part in ("word/document.xml", "word/styles.xml"):
+            root = etree.fromstring(package.read(part))
+            for props in root.iter(f"{W}rPr"):
+                _assert_schema_order(props, RPR_ORDER)
+            for props in root.iter(f"{W}pPr"):
+                _assert_schema_order(props, PPR_ORDER)
+        body = etree.fromstring(package.read("word/document.xml"))
+        hyperlink_props = body.find(f".//{W}hyperlink/{W}r/{W}rPr")
+        assert [child.tag[len(W):] for child in hyperlink_props] == ["rStyle", "b", "bCs", "i", "iCs", "rtl"]
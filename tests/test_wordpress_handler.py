@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip("httpx")
+
+from wordpress_handler import publish_to_wordpress, bulk_upload_to_wordpress, set_site_rate_limit
+from wordpress_stub import start_stub_server
+
+ARTICLE = {"title": "أفضل هواتف 2024", "html": "<p>المحتوى</p>"}
+
+
+@pytest.fixture
+def stub():
+    server, url = start_stub_server()
+    set_site_rate_limit(url, 0)
+    yield server, url
+    server.shutdown()
+
+
+def test_create_skip_and_update_keep_status(stub):
+    server, url = stub
+    created = publish_to_wordpress(url, "user", "pass", ARTICLE)
+    assert created["ok"] and created["action"] == "created"
+    assert server.state.posts[created["id"]]["status"] == "draft"
+
+    # المقال نُشر يدوياً على الموقع؛ إعادة الرفع لا تعيده مسودة
+    server.state.posts[created["id"]]["status"] = "publish"
+    assert publish_to_wordpress(url, "user", "pass", ARTICLE)["action"] == "skipped"
+    updated = publish_to_wordpress(url, "user", "pass", dict(ARTICLE, html="<p>محتوى جديد</p>"))
+    assert updated["action"] == "updated" and updated["id"] == created["id"]
+    assert len(server.state.posts) == 1
+    assert server.state.posts[created["id"]]["status"] == "publish"
+    assert server.state.posts[created["id"]]["content"] == "<p>محتوى جديد</p>"
+
+
+def test_dedupe_lookup_failure_does_not_create(stub):
+    server, url = stub
+    server.state.fail_every, server.state.fail_status = 1, 500
+    result = publish_to_wordpress(url, "user", "pass", ARTICLE)
+    assert not result["ok"]
+    assert "HTTP 500" in result["error"]
+    assert server.state.posts == {}
+
+
+def test_create_retry_finds_post_from_lost_response(stub):
+    server, url = stub
+    server.state.lost_creates = 1
+    result = publish_to_wordpress(url, "user", "pass", ARTICLE)
+    assert result["ok"] and result["action"] == "created"
+    assert list(server.state.posts) == [result["id"]]
+
+
+def test_create_without_dedupe_is_sent_once(stub):
+    server, url = stub
+    server.state.lost_creates = 1
+    result = publish_to_wordpress(url, "user", "pass", ARTICLE, dedupe=False)
+    assert not result["ok"] and result["status_code"] == 503
+    assert len(server.state.posts) == 1
+
+
+def test_bulk_upload_with_transient_errors_has_no_duplicates(stub):
+    server, url = stub
+    server.state.fail_every, server.state.fail_status = 3, 503
+    jobs = [
+        {"url": url, "user": "user", "password": "pass", "article": {"title": f"مقال {i}", "html": "<p>نص</p>"}}
+        for i in range(12)
+    ]
+    results = bulk_upload_to_wordpress(jobs)
+    assert [r["title"] for r in results] == [job["article"]["title"] for job in jobs]
+    assert all(r["ok"] for r in results)
+    slugs = [post["slug"] for post in server.state.posts.values()]
+    assert len(slugs) == len(set(slugs)) == 12
@@ -1,32 +1,257 @@
-import requests
+import asyncio
 import base64
+import hashlib
+import os
+import re
+import threading
+import time
+from async_network import run_sync, request, host_slot, retry_delay, RETRY_STATUSES
+from metrics import atimed, note_retry, note_error
 
-def upload_to_wordpress(url, user, password, article):
+# إعدادات الاتصال بـ WordPress
+REQUEST_TIMEOUT = (5, 60)  # (الاتصال، القراءة) بالثواني
+MAX_RETRIES = 4
+REQUESTS_PER_SECOND = 2.0  # الحد الافتراضي لكل موقع
+CONNECTIONS_PER_SITE = 4
+
+_limiters = {}
+_credentials = {}
+_lock = threading.Lock()
+
+class _SiteRateLimiter:
+    """تحديد معدل الطلبات لموقع واحد: فاصل زمني أدنى بين الطلبات المتتالية."""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    async def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+def _site_key(url):
+    return url.rstrip('/').lower()
+
+def _auth_headers(user, password):
+    # تشفير بيانات الاعتماد (Application Password)
+    token = base64.b64encode(f"{user}:{password}".encode()).decode()
+    return {"Authorization": f"Basic {token}"}
+
+def _get_limiter(url):
+    key = _site_key(url)
+    with _lock:
+        if key not in _limiters:
+            _limiters[key] = _SiteRateLimiter(REQUESTS_PER_SECOND)
+        return _limiters[key]
+
+def set_site_rate_limit(url, requests_per_second):
+    """تغيير حد الطلبات في الثانية لموقع معين."""
+    with _lock:
+        _limiters[_site_key(url)] = _SiteRateLimiter(requests_per_second)
+
+def register_site_credentials(url, user, password):
+    """
+    حفظ بيانات اعتماد موقع في ذاكرة العملية فقط (مثل إدخالها في الواجهة للعمال المدمجين).
+    المهام تحمل رابط الموقع فقط، فلا تُكتب كلمة المرور في قاعدة الطابور.
+    """
+    with _lock:
+        _credentials[_site_key(url)] = (user, password)
+
+def site_credentials(url):
+    """
+    بيانات اعتماد موقع عند التنفيذ: المسجلة في هذه العملية، وإلا من البيئة
+    (WP_URL/WP_USER/WP_APP_PASSWORD) إذا طابق WP_URL الموقع. يعيد (user, password).
+    """
+    with _lock:
+        credentials = _credentials.get(_site_key(url))
+    if credentials:
+        return credentials
+    env_url = os.environ.get("WP_URL")
+    if env_url and _site_key(env_url) == _site_key(url) and os.environ.get("WP_USER") and os.environ.get("WP_APP_PASSWORD"):
+        return os.environ["WP_USER"], os.environ["WP_APP_PASSWORD"]
+    raise RuntimeError(f"لا توجد بيانات اعتماد WordPress للموقع {url} (أدخلها في الواجهة أو عيّن WP_URL/WP_USER/WP_APP_PASSWORD)")
+
+def make_slug(title):
+    """توليد slug ثابت من العنوان (يدعم الحروف العربية كما يفعل WordPress)."""
+    slug = re.sub(r'[^\w\s-]', '', title.lower())
+    return re.sub(r'[\s_-]+', '-', slug).strip('-')
+
+def content_hash(article):
+    """بصمة محتوى المقال لاكتشاف إعادة الرفع دون تغيير."""
+    payload = f"{article.get('title', '')}\n{article.get('html', '')}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def _arequest(url, user, password, method, endpoint, max_retries=MAX_RETRIES, **kwargs):
+    """
+    طلب واحد عبر عميل HTTP المشترك (async_network) مع تحديد المعدل وإعادة المحاولة عند 429/5xx.
+    الاتصالات المتزامنة لكل موقع محدودة بـ CONNECTIONS_PER_SITE.
+    """
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    async with host_slot(url, CONNECTIONS_PER_SITE):
+        return await request(
+            method, endpoint, max_retries=max_retries, on_retry=note_retry,
+            throttle=_get_limiter(url).wait, headers=_auth_headers(user, password), **kwargs
+        )
+
+def find_existing_post(url, user, password, slug):
+    """النسخة المتزامنة من afind_existing_post."""
+    return run_sync(afind_existing_post(url, user, password, slug))
+
+async def afind_existing_post(url, user, password, slug):
     """
-    يرفع المقال إلى WordPress كمسودة.
+    البحث عن مقال بنفس الـ slug بأي حالة (مسودة، منشور، ...). يعيد بياناته أو None.
+    يرفع RuntimeError إذا تعذر البحث (401، أو 429/5xx بعد استنفاد المحاولات) حتى لا يُنشأ مقال مكرر.
     """
     endpoint = f"{url.rstrip('/')}/wp-json/wp/v2/posts"
-    
-    # تشفير بيانات الاعتماد (Application Password)
-    credentials = f"{user}:{password}"
-    token = base64.b64encode(credentials.encode()).decode()
-    
-    headers = {
-        "Authorization": f"Basic {token}",
-        "Content-Type": "application/json"
-    }
-    
+    response = await _arequest(url, user, password, "GET", endpoint, params={
+        "slug": slug,
+        "status": "draft,publish,pending,private,future",
+        "context": "edit",
+    })
+    if response.status_code != 200:
+        raise RuntimeError(f"تعذر البحث عن المقال بالـ slug (HTTP {response.status_code}): {response.text[:300]}")
+    posts = response.json()
+    return posts[0] if posts else None
+
+def publish_to_wordpress(url, user, password, article, status=None, post_id=None, dedupe=True):
+    """النسخة المتزامنة من apublish_to_wordpress (للواجهة والعمال)."""
+    return run_sync(apublish_to_wordpress(url, user, password, article, status, post_id, dedupe))
+
+async def apublish_to_wordpress(url, user, password, article, status=None, post_id=None, dedupe=True):
+    """
+    ينشئ المقال أو يحدّثه على WordPress ويعيد نتيجة منظمة:
+    {"ok", "action": created/updated/skipped, "id", "link", "error"}.
+    عند dedupe=True يُبحث عن مقال بنفس الـ slug: إذا كان المحتوى مطابقاً يُتخطى الرفع،
+    وإلا يُحدَّث نفس المقال بدلاً من إنشاء مسودة مكررة.
+    status: حالة المقال الجديد (الافتراضي مسودة)؛ عند التحديث تبقى حالة المقال الموجود ما لم تُحدَّد.
+    """
+    async with atimed("wordpress_upload"):
+        result = await _apublish(url, user, password, article, status, post_id, dedupe)
+        if not result["ok"]:
+            note_error(result["error"])
+        return result
+
+async def _apublish(url, user, password, article, status=None, post_id=None, dedupe=True):
+    base = f"{url.rstrip('/')}/wp-json/wp/v2/posts"
+    slug = article.get("slug") or make_slug(article["title"])
     payload = {
         "title": article["title"],
         "content": article["html"],
-        "status": "draft"
+        "slug": slug
     }
-    
+    if status:
+        payload["status"] = status
+
     try:
-        response = requests.post(endpoint, json=payload, headers=headers)
-        if response.status_code == 201:
-            return f"✅ تم رفع المقال بنجاح كمسودة! رابط المقال: {response.json().get('link')}"
+        if post_id is None and dedupe:
+            existing = await afind_existing_post(url, user, password, slug)
+            if existing:
+                post_id = existing["id"]
+                current = {
+                    "title": (existing.get("title") or {}).get("raw", ""),
+                    "html": (existing.get("content") or {}).get("raw", ""),
+                }
+                if content_hash(current) == content_hash(article):
+                    return {"ok": True, "action": "skipped", "id": post_id, "link": existing.get("link"), "error": None}
+
+        if post_id:
+            # تحديث مقال بمعرفه: تكرار نفس الطلب لا ينشئ مقالاً جديداً فتُسمح إعادة المحاولة
+            response = await _arequest(url, user, password, "POST", f"{base}/{post_id}", retry_unsafe=True, json=payload)
         else:
-            return f"❌ فشل الرفع: {response.text}"
+            retries = MAX_RETRIES if dedupe else 0
+            response = await _acreate(url, user, password, base, dict(payload, status=status or "draft"), retries)
+            if isinstance(response, dict):
+                # طلب إنشاء سابق وصل إلى الموقع رغم فقد استجابته
+                return {"ok": True, "action": "created", "id": response["id"], "link": response.get("link"), "error": None}
+        if response.status_code in (200, 201):
+            data = response.json()
+            return {
+                "ok": True,
+                "action": "updated" if post_id else "created",
+                "id": data.get("id"),
+                "link": data.get("link"),
+                "error": None
+            }
+        return {
+            "ok": False,
+            "action": None,
+            "id": post_id,
+            "link": None,
+            "error": response.text,
+            "status_code": response.status_code
+        }
     except Exception as e:
-        return f"❌ خطأ في الاتصال: {str(e)}"
+        return {"ok": False, "action": None, "id": post_id, "link": None, "error": str(e)}
+
+async def _acreate(url, user, password, base, payload, max_retries=MAX_RETRIES):
+    """
+    إنشاء مقال جديد. POST الإنشاء لا يُعاد تلقائياً: قبل كل إعادة محاولة (خطأ اتصال أو 429/5xx)
+    يُبحث عن الـ slug مجدداً، فإذا كان الطلب السابق قد أنشأ المقال يُعاد المقال الموجود (dict)
+    بدلاً من إنشاء نسخة مكررة. يعيد استجابة HTTP الأخيرة في غير ذلك.
+    """
+    for attempt in range(max_retries + 1):
+        if attempt:
+            existing = await afind_existing_post(url, user, password, payload["slug"])
+            if existing:
+                return existing
+        response = None
+        try:
+            response = await _arequest(url, user, password, "POST", base, max_retries=0, json=payload)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+        except Exception:
+            if attempt == max_retries:
+                raise
+        if attempt == max_retries:
+            return response
+        note_retry()
+        await asyncio.sleep(retry_delay(response, attempt))
+
+def upload_to_wordpress(url, user, password, article, post_id=None):
+    """
+    يرفع المقال إلى WordPress كمسودة، أو يحدّث المقال الموجود بنفس الـ slug مع إبقاء حالته.
+    post_id يحدّث مقالاً محدداً (مثل نسخة محدّثة تدريجياً من مقال سابق).
+    """
+    return describe_upload(publish_to_wordpress(url, user, password, article, post_id=post_id))
+
+def describe_upload(result):
+    """رسالة للمستخدم من نتيجة publish_to_wordpress."""
+    if result["ok"]:
+        if result["action"] == "skipped":
+            return f"✅ المقال موجود مسبقاً بنفس المحتوى، لم يتم إنشاء نسخة مكررة. رابط المقال: {result['link']}"
+        if result["action"] == "updated":
+            return f"✅ تم تحديث المقال الموجود بنجاح! رابط المقال: {result['link']}"
+        return f"✅ تم رفع المقال بنجاح كمسودة! رابط المقال: {result['link']}"
+    if result.get("status_code"):
+        return f"❌ فشل الرفع: {result['error']}"
+    return f"❌ خطأ في الاتصال: {result['error']}"
+
+def bulk_upload_to_wordpress(jobs, max_concurrency_per_site=CONNECTIONS_PER_SITE, status=None):
+    """النسخة المتزامنة من abulk_upload_to_wordpress."""
+    return run_sync(abulk_upload_to_wordpress(jobs, max_concurrency_per_site, status))
+
+async def abulk_upload_to_wordpress(jobs, max_concurrency_per_site=CONNECTIONS_PER_SITE, status=None):
+    """
+    رفع عدد كبير من المقالات إلى مواقع متعددة معاً على حلقة الأحداث المشتركة.
+    jobs: قائمة {"url", "user", "password", "article"}.
+    لكل موقع حد أقصى للمقالات المتزامنة وحد للمعدل، مع إعادة المحاولة
+    عند 429/5xx ومنع التكرار بالـ slug. تعيد النتائج بنفس ترتيب jobs.
+    """
+    jobs = list(jobs)
+    site_slots = {}
+    for job in jobs:
+        site_slots.setdefault(_site_key(job["url"]), asyncio.Semaphore(max_concurrency_per_site))
+
+    async def run(job):
+        async with site_slots[_site_key(job["url"])]:
+            result = await apublish_to_wordpress(job["url"], job["user"], job["password"], job["article"], status=status)
+        result["url"] = job["url"]
+        result["title"] = job["article"].get("title")
+        return result
+
+    return list(await asyncio.gather(*(run(job) for job in jobs)))
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+_POSTS_PATH = "/wp-json/wp/v2/posts"
+
+
+class _StubState:
+    def __init__(self, latency=0.0, fail_every=0, fail_status=429, lost_creates=0):
+        self.posts = {}
+        self.next_id = 1
+        self.requests = 0
+        self.latency = latency
+        self.fail_every = fail_every
+        self.fail_status = fail_status
+        self.lost_creates = lost_creates
+        self.lock = threading.Lock()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    خادم WordPress REST محلي مبسط للاختبارات وقياس الأداء:
+    يدعم إنشاء المقالات وتحديثها والبحث بالـ slug، ويمكنه محاكاة التأخير وأخطاء 429/5xx،
+    وإنشاء مقال مع فقد استجابته (lost_creates) لاختبار منع التكرار عند إعادة المحاولة.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        data = json.dumps(body if body is not None else {}, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _check(self):
+        """تطبيق التأخير والأخطاء المحاكاة والتحقق من المصادقة. يعيد False إذا أُرسل رد."""
+        state = self.server.state
+        with state.lock:
+            state.requests += 1
+            count = state.requests
+        if state.latency:
+            time.sleep(state.latency)
+        if state.fail_every and count % state.fail_every == 0:
+            self._send(state.fail_status, {"code": "rest_stub_error"}, {"Retry-After": "0"})
+            return False
+        if not self.headers.get("Authorization", "").startswith("Basic "):
+            self._send(401, {"code": "rest_not_logged_in"})
+            return False
+        return True
+
+    def _post_body(self, post):
+        return {
+            "id": post["id"],
+            "slug": post["slug"],
+            "status": post["status"],
+            "link": f"http://{self.headers.get('Host')}/?p={post['id']}",
+            "title": {"raw": post["title"], "rendered": post["title"]},
+            "content": {"raw": post["content"], "rendered": post["content"]},
+        }
+
+    def do_GET(self):
+        if not self._check():
+            return
+        parsed = urlparse(self.path)
+        if parsed.path.rstrip("/") != _POSTS_PATH:
+            self._send(404, {"code": "rest_no_route"})
+            return
+        slug = parse_qs(parsed.query).get("slug", [None])[0]
+        state = self.server.state
+        with state.lock:
+            posts = [p for p in state.posts.values() if slug is None or p["slug"] == slug]
+        self._send(200, [self._post_body(p) for p in posts])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if not self._check():
+            return
+        path = urlparse(self.path).path.rstrip("/")
+        state = self.server.state
+        with state.lock:
+            if path == _POSTS_PATH:
+                post = {"id": state.next_id, "slug": "", "status": "draft", "title": "", "content": ""}
+                state.next_id += 1
+                status = 201
+            elif path.startswith(_POSTS_PATH + "/") and path.rsplit("/", 1)[-1].isdigit():
+                post = state.posts.get(int(path.rsplit("/", 1)[-1]))
+                status = 200
+            else:
+                post, status = None, 404
+            if post is not None:
+                post.update({k: payload[k] for k in ("title", "content", "status", "slug") if k in payload})
+                state.posts[post["id"]] = post
+            lost = status == 201 and state.lost_creates > 0
+            if lost:
+                state.lost_creates -= 1
+        if lost:
+            # المقال أُنشئ لكن الاستجابة لم تصل (مثل انقطاع الاتصال أو خطأ من الوسيط)
+            self._send(503, {"code": "rest_stub_lost_response"}, {"Retry-After": "0"})
+        elif post is None:
+            self._send(404, {"code": "rest_post_invalid_id"})
+        else:
+            self._send(status, self._post_body(post))
+
+
+def start_stub_server(port=0, latency=0.0, fail_every=0, fail_status=429, lost_creates=0):
+    """
+    تشغيل الخادم المحلي في thread خلفي. يعيد (server, base_url)؛
+    المقالات المخزنة متاحة في server.state.posts، والإيقاف بـ server.shutdown().
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StubHandler)
+    server.daemon_threads = True
+    server.state = _StubState(latency, fail_every, fail_status, lost_creates)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="خادم WordPress REST محلي للاختبار")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0, help="تأخير كل طلب بالثواني")
+    parser.add_argument("--fail-every", type=int, default=0, help="إرجاع خطأ 429 كل N طلب")
+    args = parser.parse_args()
+    server, url = start_stub_server(args.port, args.latency, args.fail_every)
+    print(f"WordPress stub: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
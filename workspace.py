@@ -0,0 +1,305 @@
+"""
+مساحة عمل مشتركة لعدة محررين ومشاريع (SQLite على الخادم).
+
+كل مشروع يضم كلماته المفتاحية، ولكل كلمة مدخلاتها (الكلمات المرتبطة، نصوص الربط، الدومين،
+اللغة) ومؤشرات إلى أحدث نتائجها: التحليل والمخطط والمقال والملفات المحفوظة، وحالة النشر
+على WordPress. النتائج نفسها تُحفظ كنسخ ثابتة في جدول artifacts ولا تُعدَّل بعد كتابتها،
+فتحمّلها الجلسات بالمرجع (رقم النسخة) عند الحاجة بدلاً من الاحتفاظ بها في st.session_state
+أو إعادة حسابها. الكلمة الموحدة (normalize_arabic) مفتاح الكلمة داخل المشروع، فـ"أفضل هواتف"
+و"افضل هواتف" عمل واحد. كل كتابة معاملة BEGIN IMMEDIATE حتى لا يُضيّع محرر تعديل آخر،
+وreserve_job يمنع محررين من إرسال نفس المهمة لنفس الكلمة في آن واحد.
+"""
+import json
+import time
+
+from local_store import connect
+from seo_metrics import tokenize
+
+WORKSPACE_DB = "workspace.sqlite3"
+DEFAULT_PROJECT = "المشروع العام"
+
+# أنواع النتائج المحفوظة لكل كلمة، وحالة الكلمة بعد حفظ كل نوع
+ARTIFACT_KINDS = ("analysis", "outline", "article", "files")
+_ARTIFACT_STATUS = {"analysis": "analyzed", "outline": "outlined", "article": "written"}
+
+# مراحل الكلمة المفتاحية بالترتيب؛ الحالة لا تتراجع عند إعادة توليد مرحلة سابقة
+KEYWORD_STATUS_LABELS = {
+    "new": "جديدة",
+    "analyzed": "تم التحليل",
+    "outlined": "تم المخطط",
+    "written": "تمت الكتابة",
+    "published": "تم النشر",
+}
+_STATUS_ORDER = list(KEYWORD_STATUS_LABELS)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    domain TEXT,
+    language TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS keywords (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id INTEGER NOT NULL REFERENCES projects(id),
+    keyword TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    inputs TEXT,
+    status TEXT NOT NULL DEFAULT 'new',
+    analysis_id INTEGER,
+    outline_id INTEGER,
+    article_id INTEGER,
+    files_id INTEGER,
+    jobs TEXT,
+    wordpress TEXT,
+    revision INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    updated_by TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_keywords_project ON keywords(project_id, normalized);
+CREATE INDEX IF NOT EXISTS idx_keywords_updated ON keywords(project_id, updated_at);
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    keyword_id INTEGER NOT NULL REFERENCES keywords(id),
+    kind TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    created_by TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_keyword ON artifacts(keyword_id, kind, id);
+"""
+
+
+def _db():
+    return connect(WORKSPACE_DB, _SCHEMA)
+
+
+def _transaction(work):
+    """تنفيذ work(db) في معاملة كتابة واحدة تحجز القاعدة من البداية (BEGIN IMMEDIATE)."""
+    db = _db()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        result = work(db)
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+    return result
+
+
+def normalize_keyword(keyword):
+    return " ".join(tokenize(keyword or ""))
+
+
+def _row_to_keyword(row):
+    item = dict(row)
+    for field in ("inputs", "jobs", "wordpress"):
+        item[field] = json.loads(item[field]) if item[field] else {}
+    return item
+
+
+# المشاريع
+
+def create_project(name, domain="", language="العربية"):
+    """إنشاء مشروع (أو إرجاع المشروع الموجود بنفس الاسم). يعيد رقمه."""
+    name = name.strip()
+    if not name:
+        raise ValueError("اسم المشروع مطلوب")
+    db = _db()
+    db.execute(
+        "INSERT OR IGNORE INTO projects (name, domain, language, created_at) VALUES (?, ?, ?, ?)",
+        (name, domain, language, time.time()),
+    )
+    return db.execute("SELECT id FROM projects WHERE name = ?", (name,)).fetchone()["id"]
+
+
+def get_project(project_id):
+    row = _db().execute("SELECT * FROM projects WHERE id = ?", (project_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_projects():
+    """كل المشاريع مع عدد كلماتها وعدد المنشور منها."""
+    rows = _db().execute(
+        "SELECT p.*, COUNT(k.id) AS keywords, COALESCE(SUM(k.status = 'published'), 0) AS published "
+        "FROM projects p LEFT JOIN keywords k ON k.project_id = p.id GROUP BY p.id ORDER BY p.name"
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def default_project():
+    return create_project(DEFAULT_PROJECT)
+
+
+# الكلمات المفتاحية
+
+def get_keyword(project_id, keyword):
+    """الكلمة المفتاحية في المشروع (بصيغتها الموحدة) أو None."""
+    row = _db().execute(
+        "SELECT * FROM keywords WHERE project_id = ? AND normalized = ?", (project_id, normalize_keyword(keyword))
+    ).fetchone()
+    return _row_to_keyword(row) if row else None
+
+
+def get_keyword_by_id(keyword_id):
+    row = _db().execute("SELECT * FROM keywords WHERE id = ?", (keyword_id,)).fetchone()
+    return _row_to_keyword(row) if row else None
+
+
+def ensure_keyword(project_id, keyword, inputs=None, user=None):
+    """
+    إضافة الكلمة إلى المشروع إن لم تكن موجودة، وتحديث مدخلاتها إن مُررت inputs.
+    يعيد صف الكلمة.
+    """
+    normalized = normalize_keyword(keyword)
+    if not normalized:
+        raise ValueError("الكلمة المفتاحية مطلوبة")
+    now = time.time()
+    encoded = json.dumps(inputs, ensure_ascii=False) if inputs is not None else None
+
+    def work(db):
+        db.execute(
+            "INSERT INTO keywords (project_id, keyword, normalized, inputs, updated_at, updated_by) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(project_id, normalized) DO UPDATE SET "
+            "inputs = COALESCE(excluded.inputs, inputs), "
+            "revision = revision + (excluded.inputs IS NOT NULL AND excluded.inputs IS NOT inputs), "
+            "updated_at = CASE WHEN excluded.inputs IS NOT NULL AND excluded.inputs IS NOT inputs "
+            "THEN excluded.updated_at ELSE updated_at END",
+            (project_id, keyword.strip(), normalized, encoded, now, user),
+        )
+        return db.execute(
+            "SELECT * FROM keywords WHERE project_id = ? AND normalized = ?", (project_id, normalized)
+        ).fetchone()
+
+    return _row_to_keyword(_transaction(work))
+
+
+def list_keywords(project_id, status=None, limit=500):
+    """كلمات المشروع (الأحدث تعديلاً أولاً) دون محتوى النتائج."""
+    sql = "SELECT * FROM keywords WHERE project_id = ?"
+    params = [project_id]
+    if status:
+        sql += " AND status = ?"
+        params.append(status)
+    sql += " ORDER BY updated_at DESC LIMIT ?"
+    params.append(limit)
+    return [_row_to_keyword(row) for row in _db().execute(sql, params)]
+
+
+# النتائج (artifacts)
+
+def save_artifact(keyword_id, kind, content, user=None):
+    """حفظ نتيجة جديدة للكلمة وجعلها الأحدث؛ يعيد رقم النسخة."""
+    if kind not in ARTIFACT_KINDS:
+        raise ValueError(f"نوع نتيجة غير معروف: {kind}")
+    now = time.time()
+    encoded = json.dumps(content, ensure_ascii=False)
+
+    def work(db):
+        row = db.execute("SELECT status FROM keywords WHERE id = ?", (keyword_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"كلمة مفتاحية غير موجودة: {keyword_id}")
+        artifact_id = db.execute(
+            "INSERT INTO artifacts (keyword_id, kind, content, created_at, created_by) VALUES (?, ?, ?, ?, ?)",
+            (keyword_id, kind, encoded, now, user),
+        ).lastrowid
+        status = row["status"]
+        new_status = _ARTIFACT_STATUS.get(kind, status)
+        if _STATUS_ORDER.index(new_status) > _STATUS_ORDER.index(status):
+            status = new_status
+        db.execute(
+            f"UPDATE keywords SET {kind}_id = ?, status = ?, revision = revision + 1, updated_at = ?, "
+            "updated_by = COALESCE(?, updated_by) WHERE id = ?",
+            (artifact_id, status, now, user, keyword_id),
+        )
+        return artifact_id
+
+    return _transaction(work)
+
+
+def load_artifact(artifact_id):
+    """محتوى نسخة محفوظة (ثابت لا يتغير، فيمكن تخزينه مؤقتاً بالرقم) أو None."""
+    if not artifact_id:
+        return None
+    row = _db().execute("SELECT content FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+    return json.loads(row["content"]) if row else None
+
+
+def discard_artifact(keyword_id, kind, user=None):
+    """إزالة مؤشر أحدث نتيجة من نوع kind (تبقى النسخة في السجل)."""
+    if kind not in ARTIFACT_KINDS:
+        raise ValueError(f"نوع نتيجة غير معروف: {kind}")
+    _db().execute(
+        f"UPDATE keywords SET {kind}_id = NULL, revision = revision + 1, updated_at = ?, "
+        "updated_by = COALESCE(?, updated_by) WHERE id = ?",
+        (time.time(), user, keyword_id),
+    )
+
+
+def artifact_history(keyword_id, kind, limit=20):
+    """النسخ السابقة من نوع معين (دون المحتوى)."""
+    rows = _db().execute(
+        "SELECT id, kind, created_at, created_by, LENGTH(content) AS size FROM artifacts "
+        "WHERE keyword_id = ? AND kind = ? ORDER BY id DESC LIMIT ?",
+        (keyword_id, kind, limit),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+# المهام والنشر
+
+def reserve_job(keyword_id, kind, submit, is_active):
+    """
+    رقم المهمة الجارية من نوع kind لهذه الكلمة إن كانت is_active(رقمها) (أرسلها محرر آخر)،
+    وإلا تُرسل مهمة جديدة عبر submit() ويُسجَّل رقمها. يعيد (رقم المهمة، هل هي جديدة).
+    """
+    def work(db):
+        row = db.execute("SELECT jobs FROM keywords WHERE id = ?", (keyword_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"كلمة مفتاحية غير موجودة: {keyword_id}")
+        jobs = json.loads(row["jobs"]) if row["jobs"] else {}
+        if jobs.get(kind) and is_active(jobs[kind]):
+            return jobs[kind], False
+        jobs[kind] = submit()
+        db.execute(
+            "UPDATE keywords SET jobs = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(jobs), time.time(), keyword_id),
+        )
+        return jobs[kind], True
+
+    return _transaction(work)
+
+
+def forget_job(keyword_id, kind):
+    def work(db):
+        row = db.execute("SELECT jobs FROM keywords WHERE id = ?", (keyword_id,)).fetchone()
+        jobs = json.loads(row["jobs"]) if row and row["jobs"] else {}
+        if jobs.pop(kind, None) is not None:
+            db.execute("UPDATE keywords SET jobs = ? WHERE id = ?", (json.dumps(jobs), keyword_id))
+
+    _transaction(work)
+
+
+def set_publish_status(keyword_id, result, user=None):
+    """حفظ نتيجة الرفع إلى WordPress (من publish_to_wordpress)؛ النجاح ينقل الكلمة إلى "تم النشر"."""
+    wordpress = {key: result.get(key) for key in ("ok", "action", "id", "link", "error")}
+    wordpress["at"] = time.time()
+
+    def work(db):
+        row = db.execute("SELECT wordpress FROM keywords WHERE id = ?", (keyword_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"كلمة مفتاحية غير موجودة: {keyword_id}")
+        previous = json.loads(row["wordpress"]) if row["wordpress"] else {}
+        if not wordpress["ok"]:
+            # فشل التحديث لا يُضيّع رقم المقال المنشور سابقاً
+            wordpress["id"] = wordpress["id"] or previous.get("id")
+            wordpress["link"] = previous.get("link")
+        db.execute(
+            "UPDATE keywords SET wordpress = ?, status = CASE WHEN ? THEN 'published' ELSE status END, "
+            "revision = revision + 1, updated_at = ?, updated_by = COALESCE(?, updated_by) WHERE id = ?",
+            (json.dumps(wordpress, ensure_ascii=False), bool(wordpress["ok"]), wordpress["at"], user, keyword_id),
+        )
+
+    _transaction(work)